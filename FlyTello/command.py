@@ -0,0 +1,132 @@
+"""
+Tello SDK 2.0 / 3.0 argument range, ref Doc/DJI-Official/SDK.
+validate() checks a command string before it is queued, so a bad argument fails on the ground instead of in a show.
+Command is the checked command, encoded once. build() / parse() return the same object for the same command.
+"""
+import functools  # Command cache
+
+DISTANCE = (20, 500)  # up / down / left / right / forward / back(cm)
+COORDINATE = (-500, 500)  # go / curve / jump(cm)
+DEADZONE = 20  # x, y, z of go / curve can't all be within -20 ~ 20
+PAD = ("m1", "m2", "m3", "m4", "m5", "m6", "m7", "m8", "m-1", "m-2")
+# Command -> Argument spec. Each spec is (low, high) for a number or a tuple of choice.
+SPEC = {
+    "command": (), "takeoff": (), "land": (), "stop": (), "emergency": (), "reboot": (), "throwfly": (),
+    "streamon": (), "streamoff": (), "motoron": (), "motoroff": (), "mon": (), "moff": (),
+    "up": (DISTANCE,), "down": (DISTANCE,), "left": (DISTANCE,), "right": (DISTANCE,),
+    "forward": (DISTANCE,), "back": (DISTANCE,),
+    "cw": ((1, 3600),), "ccw": ((1, 3600),),
+    "flip": (("l", "r", "f", "b"),),
+    "speed": ((10, 100),),
+    "rc": ((-100, 100),) * 4,
+    "mdirection": (("0", "1", "2"),),
+    "downvision": (("0", "1"),),  # SDK 3.0, 1 for the downward camera
+    "port": ((1025, 65535),) * 2,
+    "setfps": (("high", "middle", "low"),),
+    "setbitrate": (("0", "1", "2", "3", "4", "5"),),
+    "setresolution": (("high", "low"),),
+    "wifisetchannel": ((1, 165),)
+}
+# Command with more than one form. Argument count -> Spec.
+FORM = {
+    "go": {
+        4: (COORDINATE,) * 3 + ((10, 100),),
+        5: (COORDINATE,) * 3 + ((10, 100), PAD)
+    },
+    "curve": {
+        7: (COORDINATE,) * 6 + ((10, 60),),
+        8: (COORDINATE,) * 6 + ((10, 60), PAD)
+    },
+    "jump": {
+        7: (COORDINATE,) * 3 + ((10, 100), (-360, 360), PAD, PAD)
+    }
+}
+
+
+def validate(cmd: str):
+    """
+    Check command against SDK range. Query(ending with "?"), wifi / ap setting & EXT command pass as is.
+
+    :param cmd: SDK command. e.g. "go 100 0 80 50 m1"
+    :return: cmd, stripped.
+    :raise ValueError: Unknown command, wrong argument count or argument out of range.
+    """
+    cmd = cmd.strip()
+    word = cmd.split()
+    if not word:
+        raise ValueError("Command - Empty command.")
+    name, argument = word[0], word[1:]
+    if name.endswith("?") or (name in ("wifi", "ap", "multiwifi", "EXT")):
+        return cmd
+    if name in FORM:
+        spec = FORM[name].get(len(argument))
+        if spec is None:
+            raise ValueError(f"Command - Takes {' / '.join(str(n) for n in FORM[name])} argument. - {cmd}")
+    else:
+        spec = SPEC.get(name)
+        if spec is None:
+            raise ValueError(f"Command - Unknown command. - {cmd}")
+        if len(argument) != len(spec):
+            raise ValueError(f"Command - Takes {len(spec)} argument. - {cmd}")
+    for no, (value, rule) in enumerate(zip(argument, spec)):
+        if isinstance(rule[0], str):
+            if value not in rule:
+                raise ValueError(f"Command - Argument {no + 1} not in {rule}. - {cmd}")
+            continue
+        try:
+            number = int(value)
+        except ValueError:
+            raise ValueError(f"Command - Argument {no + 1} is not an integer. - {cmd}") from None
+        if not rule[0] <= number <= rule[1]:
+            raise ValueError(f"Command - Argument {no + 1} not in {rule[0]} ~ {rule[1]}. - {cmd}")
+    if name in ("go", "curve"):
+        # Target too close to tello, mission pad form included
+        points = [argument[0:3]] if name == "go" else [argument[0:3], argument[3:6]]
+        for point in points:
+            if all(-DEADZONE <= int(value) <= DEADZONE for value in point):
+                raise ValueError(f"Command - x, y, z can't all be within -{DEADZONE} ~ {DEADZONE}. - {cmd}")
+    return cmd
+
+
+class Command:
+    __slots__ = ("name", "text", "payload")
+
+    def __init__(self, text: str, check: bool = True):
+        """
+        A command encoded once. Shared through the cache, don't modify.
+        Equal & hashed by payload, so identical command is found by dict / set.
+
+        :param text: SDK command. e.g. "go 100 0 80 50 m1"
+        :param check: Validate against SDK range. ValueError if out of range.
+        """
+        text = validate(text) if check else text.strip()
+        self.name = text.partition(" ")[0]
+        self.text = text
+        self.payload = text.encode("utf-8", errors="ignore")
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f"Command({self.text!r})"
+
+    def __eq__(self, other):
+        return isinstance(other, Command) and (other.payload == self.payload)
+
+    def __hash__(self):
+        return hash(self.payload)
+
+    def __reduce__(self):
+        return parse, (self.text, False)
+
+
+@functools.lru_cache(maxsize=4096, typed=True)
+def build(name: str, *argument):
+    """Command from name & argument, checked. e.g. build("go", 100, 0, 80, 50) -> Command("go 100 0 80 50")"""
+    return Command(" ".join([name] + [str(item) for item in argument]))
+
+
+@functools.lru_cache(maxsize=4096)
+def parse(text: str, check: bool = True):
+    """Command from text. check=False for a command this module doesn't know, sent as is."""
+    return Command(text, check)
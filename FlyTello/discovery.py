@@ -0,0 +1,173 @@
+from FlyTello import quicklog, udp
+import asyncio  # scan_async
+import ipaddress
+import json  # Cache file
+import os
+import time
+import typing
+
+
+class Discovery:
+    def __init__(
+            self,
+            server: udp.Server,
+            network: str = None,
+            cache: str = "Log//discovery.json",
+            port: int = 8889,
+            debug: bool = False
+    ):
+        """
+        Find tello in lan and ask their SN.
+
+        Every tello answering "command" is asked "sn?" right away, the scan returns once every SN wanted answered.
+        Later sweeps only probe address that hasn't answered. Last known IP per SN is cached on disk and probed
+        first, so restart with the same fleet doesn't need a sweep.
+
+        :param server: Command server. Discovery reads it, don't run alongside another reader.
+        :param network: Network to sweep. e.g. "192.168.10.0/24". None for network of NIC.
+        :param cache: Path of SN -> IP cache file. None to disable.
+        :param port: Command port of tello.
+        :param debug: Enter debug mode.
+        """
+        "Log"
+        if not debug:
+            self.__log = quicklog.create_log(f"Discovery", 30, False)
+        else:
+            self.__log = quicklog.create_log(f"Discovery", 10, True)
+        "Basic"
+        self.__server = server
+        self.__port = port
+        if network is None:
+            self.__network = udp.interface_network(server.ip)
+        else:
+            self.__network = ipaddress.IPv4Network(network, strict=False)
+        "Cache"
+        self.__cache_path = cache
+        self.__cache = {}  # SN -> IP
+        if cache is not None and os.path.isfile(cache):
+            try:
+                with open(cache, "r", encoding="utf-8") as file:
+                    self.__cache = json.load(file)
+            except (OSError, ValueError):
+                self.__log.error(f"Discovery - Can't read cache. - {cache}")
+        self.__log.warning(f"Discovery - Initiated. - [{self.__network}, {cache}, {port}, {debug}]")
+
+    def __probe(self, ips: typing.Iterable, message: bytes):
+        self.__server.send_batch([(message, (ip, self.__port)) for ip in ips])
+
+    def scan(
+            self,
+            sn_list: typing.Iterable,
+            on_found: typing.Callable = None,
+            timeout: float = None,
+            interval: float = 1
+    ):
+        """
+        Scan until every SN in sn_list answered.
+
+        :param sn_list: SN wanted.
+        :param on_found: Called with (ip, sn) once a tello answered its SN. Unknown SN is reported too.
+        :param timeout: Give up after this(second). None for never.
+        :param interval: Resend probe to the address that hasn't answered after this(second).
+        :return: SN -> IP of tello found.
+        """
+        scan = self.__begin(sn_list, timeout, interval)
+        while True:
+            wait = self.__probe_due(scan, interval)
+            if wait is None:
+                break
+            datagram = self.__server.read(timeout=wait)
+            if datagram is not None:
+                self.__answer(scan, datagram, on_found)
+        self.save()
+        return scan["found"]
+
+    async def scan_async(
+            self,
+            sn_list: typing.Iterable,
+            inbox: asyncio.Queue,
+            on_found: typing.Callable = None,
+            timeout: float = None,
+            interval: float = 1
+    ):
+        """
+        scan() on an event loop. Answer is read from inbox instead of the server.
+
+        :param inbox: Queue the command endpoint puts [data, (ip, port)] into while scanning.
+        """
+        scan = self.__begin(sn_list, timeout, interval)
+        while True:
+            wait = self.__probe_due(scan, interval)
+            if wait is None:
+                break
+            try:
+                datagram = await asyncio.wait_for(inbox.get(), wait)
+            except asyncio.TimeoutError:
+                continue
+            self.__answer(scan, datagram, on_found)
+        self.save()
+        return scan["found"]
+
+    def __begin(self, sn_list: typing.Iterable, timeout: float, interval: float):
+        """State of a scan."""
+        wanted = set(sn_list)
+        own = {self.__server.ip, str(self.__network.network_address), str(self.__network.broadcast_address)}
+        sweep = [str(host) for host in self.__network.hosts() if str(host) not in own]
+        # Try cache first. Sweep after a short grace, right away if some SN isn't cached.
+        targets = [self.__cache[sn] for sn in wanted if sn in self.__cache]
+        return {
+            "wanted": wanted,
+            "found": {},  # SN -> IP
+            "sweep": sweep,
+            "targets": targets or sweep,
+            "grace": min(interval, 0.3) if len(targets) == len(wanted) else 0,
+            "deadline": None if timeout is None else time.time() + timeout,
+            "next_probe": time.time()
+        }
+
+    def __probe_due(self, scan: dict, interval: float):
+        """Probe if it's time. Return second to wait for an answer, None once the scan is over."""
+        found = scan["found"]
+        if scan["wanted"].issubset(found):
+            return None
+        now = time.time()
+        if (scan["deadline"] is not None) and (now >= scan["deadline"]):
+            self.__log.error(f"Scan - Timeout. - Missing {scan['wanted'].difference(found)}")
+            return None
+        # Probe the address that hasn't answered its SN
+        if now >= scan["next_probe"]:
+            known = set(found.values())
+            targets = scan["targets"]
+            self.__probe([ip for ip in targets if ip not in known], b"command")
+            self.__log.info(f"Scan - Probed. - [{len(targets)}, {len(found)}]")
+            scan["next_probe"] = now + (scan["grace"] if targets is not scan["sweep"] else interval)
+            scan["targets"] = scan["sweep"]
+        if scan["deadline"] is None:
+            return max(scan["next_probe"] - now, 0)
+        return max(min(scan["next_probe"], scan["deadline"]) - now, 0)
+
+    def __answer(self, scan: dict, datagram: list, on_found: typing.Callable):
+        """Handle an answer to the probe."""
+        found = scan["found"]
+        message = datagram[0].strip()
+        ip = datagram[1][0]
+        if (not message) or message.startswith("error") or (ip in found.values()):
+            return
+        if message == "ok":
+            self.__probe([ip], b"sn?")  # In command mode now, ask SN right away.
+        else:
+            found[message] = ip
+            self.__cache[message] = ip
+            self.__log.info(f"Scan - Found. - ['{ip}', '{message}']")
+            if on_found is not None:
+                on_found(ip, message)
+
+    def save(self):
+        """Write SN -> IP cache to disk."""
+        if self.__cache_path is None:
+            return
+        try:
+            with open(self.__cache_path, "w", encoding="utf-8") as file:
+                json.dump(self.__cache, file)
+        except OSError:
+            self.__log.error(f"Save - Can't write cache. - {self.__cache_path}")
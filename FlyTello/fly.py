@@ -1,335 +1,738 @@
-from FlyTello import quicklog, tello, udp
+from FlyTello import command, discovery, future, planner, quicklog, rc, recorder, tello, udp
+import abc  # CommandSet hook
+import asyncio  # AsyncControl event loop
+import socket
 import threading
 import time
 
 
-class Control:
-    def __init__(self, sn_map: dict, debug: bool = False):
-        """A class for easy tello control."""
-        "Log"
-        if not debug:
-            self.__log = quicklog.create_log(f"Control", 30, False)
-        else:
-            self.__log = quicklog.create_log(f"Control", 10, True)
-        "Init UDP servers"
-        self.CommandServer = udp.Server(recv_port=8889, recv_decode=True, send_independent=False, debug=debug)
-        self.StatusServer = udp.Server(recv_port=8890, recv_decode=True, send_independent=False, debug=debug)
-        self.VideoServer = udp.Server(recv_port=11111, recv_decode=False, send_independent=False, debug=debug)
-        self.__log.info("Control: UDP Servers initiated.")
-        "Init TelloDB"
-        self.TelloDB = tello.TelloDB(sn_map=sn_map, debug=debug)
-        self.__log.info("Control: TelloDB initiated.")
-        """Scan Tello"""
-        self.scan_tello()
-        "Init Threads"
-        self.__CronJobThread = threading.Thread(target=self.__cronjob)
-        self.__CronJobThread.daemon = True
-        self.__CronJobThread.start()
-        self.__log.info("Control: Cronjob thread initiated.")
-        self.__CommandUpdateThread = threading.Thread(target=self.__command_update)
-        self.__CommandUpdateThread.daemon = True
-        self.__CommandUpdateThread.start()
-        self.__log.info("Control: Command update thread initiated.")
-        self.__StatusUpdateThread = threading.Thread(target=self.__status_update)
-        self.__StatusUpdateThread.daemon = True
-        self.__StatusUpdateThread.start()
-        self.__log.info("Control: Status update thread initiated.")
-        self.__VideoUpdateThread = threading.Thread(target=self.__video_update)
-        self.__VideoUpdateThread.daemon = True
-        self.__VideoUpdateThread.start()
-        self.__log.info("Control: Video update thread initiated.")
-        "Exec"
-        self.__exec_queue = []
-        self.__exec_id = 0
-        self.__log.warning(f"Control: Initiated. - [{sn_map}, {debug}]")
+class CommandSet(abc.ABC):
+    """
+    Tello SDK command set. Every command is queued with _cmd2datagram(cmd, index).
+    Command is built & checked against SDK range on call, ValueError if out of range.
+    Subclass gives the exec queue & which tello can take command.
+    """
+    @abc.abstractmethod
+    def _exec_queue(self):
+        """Exec queue of the caller, list of (cmd, index)."""
 
-    # Basic Functions
-    def scan_tello(self):
-        """Scan tello in lan."""
-        # While haven't found all. Search.
-        while not self.TelloDB.query_scan_status():
-            # Broadcast to ap mode.
-            self.CommandServer.broadcast("command", 8889)
-            time.sleep(1)
-            while self.CommandServer.read_new:
-                self.CommandServer.read()
-            # Broadcast to ask sn
-            self.CommandServer.broadcast("sn?", 8889)
-            time.sleep(1)
-            while self.CommandServer.read_new:
-                datagram = self.CommandServer.read()
-                self.TelloDB.add_tello(datagram[1][0], datagram[0])
-                self.__log.info(f"scan_tello: Passed datagram to TelloDB - {datagram}")
-            # Start motor prevent overheat
-            self.CommandServer.broadcast("motoron", 8889)
-            time.sleep(0.5)
-            while self.CommandServer.read_new:
-                self.CommandServer.read()
-            # List details of tello found.
-            print(self.TelloDB.query_object_info())
+    @abc.abstractmethod
+    def _has_tello(self, index: int):
+        """True if tello[index] can take command. Log the unknown one."""
 
-    def declare_emergency(self):
-        """Declare emergency!"""
-        self.CommandServer.broadcast("emergency", 8889)  # Prevent drop package
-        self.CommandServer.broadcast("emergency", 8889)
-        self.CommandServer.broadcast("emergency", 8889)
-        self.__log.critical(f"Declared emergency.")
-
-    # Threads
-    def __cronjob(self):
-        while True:
-            datagrams = self.TelloDB.cronjob()
-            # Send datagram
-            for datagram in datagrams:
-                self.CommandServer.send(datagram)
-            # Log
-            if datagrams:
-                self.__log.info(f"Cronjob - Done - {datagrams}")
-            time.sleep(0.05)
+    def _cmd2datagram(self, cmd, index):
+        """Add cmd to exec queue, once per tello of index(int or list). Unknown tello is skipped."""
+        self._exec_queue().extend((cmd, i) for i in self._valid_index(index))
 
-    def __command_update(self):
-        while True:
-            while self.CommandServer.read_new:
-                self.TelloDB.update_command(self.CommandServer.read())
-            time.sleep(0.01)  # Don't hurt my CPU.
-
-    def __status_update(self):
-        while True:
-            while self.StatusServer.read_new:
-                self.TelloDB.update_status(self.StatusServer.read())
-            time.sleep(0.01)  # Don't hurt my CPU.
-
-    def __video_update(self):
-        while True:
-            while self.VideoServer.read_new:
-                self.TelloDB.update_video(self.VideoServer.read())
-            time.sleep(0.01)  # Don't hurt my CPU.
-
-    # Command Process
-    def __cmd2datagram(self, cmd, index):
-        """Compose cmd and index into datagram and add to cmd queue."""
-        if type(index) == int:
-            # Filter invalid index.
-            if self.TelloDB.info2info(index=index) is not None:
-                self.__exec_queue.append(
-                    (cmd, index)
-                )
-            else:
-                self.__log.error(f"cmd2datagram - Can't find tello[{index}]")
-        else:
-            # Process per command
-            for i in index:
-                self.__cmd2datagram(cmd, i)
-
-    def exec(self, blocking: bool = True, sync: bool = False, repeat: bool = True, id_fulfil: list = ()):
-        """
-        Execute cmd in exec queue & print result when finished.
-
-        :param repeat: Will send the datagram twice to compensate drop packet.
-        :param blocking: Func exit when task finish.
-        :param sync: Ensure all the drones exec the task at the same time.
-        :param id_fulfil: If this exist. The task will start when all the task in given list is done.
-        :return task_id, a id that can trace is the task finished yet.
-        """
-        self.__exec_id += 1
-        # Pass task to TelloDB
-        self.TelloDB.task_add(self.__exec_id, self.__exec_queue, blocking, sync, repeat, id_fulfil)
-        self.__log.info(f"Exec - Called TelloDB add task[{self.__exec_id}]. - {self.__exec_queue}, {blocking},"
-                        f"{sync}, {id_fulfil}.")
-        self.__exec_queue = []
-        if not blocking:
-            return self.__exec_id
-        else:
-            while not self.TelloDB.task_status(self.__exec_id):
-                time.sleep(0.01)
-            return self.__exec_id
+    def _valid_index(self, index):
+        """Tello of index(int or list) that can take command."""
+        return [i for i in ([index] if type(index) == int else index) if self._has_tello(i)]
 
     "Basic Control"
     def reboot(self, index):
-        self.__cmd2datagram("reboot", index)
+        self._cmd2datagram(command.build("reboot"), index)
 
     def takeoff(self, index):
-        self.__cmd2datagram("takeoff", index)
+        self._cmd2datagram(command.build("takeoff"), index)
 
     def land(self, index):
-        self.__cmd2datagram("land", index)
+        self._cmd2datagram(command.build("land"), index)
 
     def stop(self, index):
-        self.__cmd2datagram("stop", index)
+        self._cmd2datagram(command.build("stop"), index)
 
     def emergency(self, index):
-        self.__cmd2datagram("emergency", index)
+        self._cmd2datagram(command.build("emergency"), index)
 
     def up(self, cm: int, index):
-        self.__cmd2datagram(f"up {cm}", index)
+        self._cmd2datagram(command.build("up", cm), index)
 
     def down(self, cm: int, index):
-        self.__cmd2datagram(f"down {cm}", index)
+        self._cmd2datagram(command.build("down", cm), index)
 
     def left(self, cm: int, index):
-        self.__cmd2datagram(f"left {cm}", index)
+        self._cmd2datagram(command.build("left", cm), index)
 
     def right(self, cm: int, index):
-        self.__cmd2datagram(f"right {cm}", index)
+        self._cmd2datagram(command.build("right", cm), index)
 
     def forward(self, cm: int, index):
-        self.__cmd2datagram(f"forward {cm}", index)
+        self._cmd2datagram(command.build("forward", cm), index)
 
     def back(self, cm: int, index):
-        self.__cmd2datagram(f"back {cm}", index)
+        self._cmd2datagram(command.build("back", cm), index)
 
     def clockwise(self, degree: int, index):
-        self.__cmd2datagram(f"cw {degree}", index)
+        self._cmd2datagram(command.build("cw", degree), index)
 
     def anti_clockwise(self, degree: int, index):
-        self.__cmd2datagram(f"ccw {degree}", index)
+        self._cmd2datagram(command.build("ccw", degree), index)
 
     def throwfly(self, index):
-        self.__cmd2datagram("throwfly", index)
+        self._cmd2datagram(command.build("throwfly"), index)
 
     def flip(self, direction: str, index):
-        self.__cmd2datagram(f"flip {direction}", index)
+        self._cmd2datagram(command.build("flip", direction), index)
 
     "Complex"
 
     def go(self, x: int, y: int, z: int, speed: int, index):
-        self.__cmd2datagram(f"go {x} {y} {z} {speed}", index)
+        self._cmd2datagram(command.build("go", x, y, z, speed), index)
 
     def curve(self, x1: int, y1: int, z1: int, x2: int, y2: int, z2: int, speed: int, index):
-        self.__cmd2datagram(f"curve {x1} {y1} {z1} {x2} {y2} {z2} {speed}", index)
+        self._cmd2datagram(command.build("curve", x1, y1, z1, x2, y2, z2, speed), index)
 
     "Pad Related"
 
     def pad_go(self, x: int, y: int, z: int, speed: int, pad: str, index):
-        self.__cmd2datagram(f"go {x} {y} {z} {speed} {pad}", index)
+        self._cmd2datagram(command.build("go", x, y, z, speed, pad), index)
 
     def pad_curve(self, x1: int, y1: int, z1: int, x2: int, y2: int, z2: int, speed: int, pad: str, index):
-        self.__cmd2datagram(f"curve {x1} {y1} {z1} {x2} {y2} {z2} {speed} {pad}", index)
+        self._cmd2datagram(command.build("curve", x1, y1, z1, x2, y2, z2, speed, pad), index)
 
     def pad_jump(self, x: int, y: int, z: int, speed: int, yaw: int, pad1: str, pad2: str, index):
-        self.__cmd2datagram(f"jump {x} {y} {z} {speed} {yaw} {pad1} {pad2}", index)
+        self._cmd2datagram(command.build("jump", x, y, z, speed, yaw, pad1, pad2), index)
 
     "Setting"
 
     def set_speed(self, speed: int, index):
-        self.__cmd2datagram(f"speed {speed}", index)
+        self._cmd2datagram(command.build("speed", speed), index)
 
     def set_rc(self, roll: int, pitch: int, throttle: int, yaw: int, index):
-        self.__cmd2datagram(f"rc {roll} {pitch} {throttle} {yaw}", index)
+        """Single rc through the task system, it's never answered. Use Control.stream_rc for continuous control."""
+        self._cmd2datagram(command.build("rc", roll, pitch, throttle, yaw), index)
 
     def set_wifi(self, ssid: str, password: str, index):
-        self.__cmd2datagram(f"wifi {ssid} {password}", index)
+        self._cmd2datagram(command.build("wifi", ssid, password), index)
 
     def set_ap(self, ssid: str, password: str, index):
-        self.__cmd2datagram(f"ap {ssid} {password}", index)
+        self._cmd2datagram(command.build("ap", ssid, password), index)
 
     def set_wifi_channel(self, channel: int, index):
-        self.__cmd2datagram(f"wifisetchannel {channel}", index)
+        self._cmd2datagram(command.build("wifisetchannel", channel), index)
 
     def set_report_port(self, status_port: int, video_port: int, index):
-        self.__cmd2datagram(f"port {status_port} {video_port}", index)
+        self._cmd2datagram(command.build("port", status_port, video_port), index)
 
     def set_video_fps(self, quality: str, index):
-        self.__cmd2datagram(f"setfps {quality}", index)
+        self._cmd2datagram(command.build("setfps", quality), index)
 
     def set_video_bitrate(self, bitrate: int, index):
-        self.__cmd2datagram(f"setbitrate {bitrate}", index)
+        self._cmd2datagram(command.build("setbitrate", bitrate), index)
 
     def set_video_resolution(self, resolution: str, index):
-        self.__cmd2datagram(f"setresolution {resolution}", index)
+        self._cmd2datagram(command.build("setresolution", resolution), index)
 
     def set_as_ap(self, ssid: str, password: str, index):
-        self.__cmd2datagram(f"multiwifi {ssid} {password}", index)
+        self._cmd2datagram(command.build("multiwifi", ssid, password), index)
 
     "Query"
 
     def ask_speed(self, index):
-        self.__cmd2datagram("speed?", index)
+        self._cmd2datagram(command.build("speed?"), index)
 
     def ask_battery(self, index):
-        self.__cmd2datagram("battery?", index)
+        self._cmd2datagram(command.build("battery?"), index)
 
     def ask_time(self, index):
-        self.__cmd2datagram("time?", index)
+        self._cmd2datagram(command.build("time?"), index)
 
     def ask_wifi(self, index):
-        self.__cmd2datagram("wifi?", index)
+        self._cmd2datagram(command.build("wifi?"), index)
 
     def ask_sdk(self, index):
-        self.__cmd2datagram("sdk?", index)
+        self._cmd2datagram(command.build("sdk?"), index)
 
     def ask_sn(self, index):
-        self.__cmd2datagram("sn?", index)
+        self._cmd2datagram(command.build("sn?"), index)
 
     def ask_hardware(self, index):
-        self.__cmd2datagram("hardware?", index)
+        self._cmd2datagram(command.build("hardware?"), index)
 
     def ask_wifiversion(self, index):
-        self.__cmd2datagram("wifiversion?", index)
+        self._cmd2datagram(command.build("wifiversion?"), index)
 
     def ask_ap(self, index):
-        self.__cmd2datagram("ap?", index)
+        self._cmd2datagram(command.build("ap?"), index)
 
     def ask_ssid(self, index):
-        self.__cmd2datagram("ssid?", index)
+        self._cmd2datagram(command.build("ssid?"), index)
 
     "Functionality"
 
     def on_video(self, index):
-        self.__cmd2datagram("streamon", index)
+        self._cmd2datagram(command.build("streamon"), index)
 
     def off_video(self, index):
-        self.__cmd2datagram("streamoff", index)
+        self._cmd2datagram(command.build("streamoff"), index)
 
     def on_motor(self, index):
-        self.__cmd2datagram("motoron", index)
+        self._cmd2datagram(command.build("motoron"), index)
 
     def off_motor(self, index):
-        self.__cmd2datagram("motoroff", index)
+        self._cmd2datagram(command.build("motoroff"), index)
 
     def on_pad(self, index):
-        self.__cmd2datagram("mon", index)
+        self._cmd2datagram(command.build("mon"), index)
 
     def off_pad(self, index):
-        self.__cmd2datagram("moff", index)
+        self._cmd2datagram(command.build("moff"), index)
 
     def on_front_pad_detection(self, index):
-        self.__cmd2datagram("mdirection 2", index)
+        self._cmd2datagram(command.build("mdirection", "2"), index)
 
     "EXT"
     def ext_top_led_static(self, r: int, g: int, b: int, index):
-        self.__cmd2datagram(f"EXT led {r} {g} {b}", index)
+        self._cmd2datagram(command.build("EXT", "led", r, g, b), index)
 
     def ext_top_led_breath(self, r: int, g: int, b: int, freq: float, index):
-        self.__cmd2datagram(f"EXT led br {freq} {r} {g} {b}", index)
+        self._cmd2datagram(command.build("EXT", "led", "br", freq, r, g, b), index)
 
     def ext_top_led_switch(self, r1: int, g1: int, b1: int, r2: int, g2: int, b2: int, freq: float, index):
-        self.__cmd2datagram(f"EXT led bl {freq} {r1} {g1} {b1} {r2} {g2} {b2}", index)
+        self._cmd2datagram(command.build("EXT", "led", "bl", freq, r1, g1, b1, r2, g2, b2), index)
 
     def ext_mon_graph(self, graph: str, index):
-        self.__cmd2datagram(f"EXT mled g {graph}", index)
+        self._cmd2datagram(command.build("EXT", "mled", "g", graph), index)
 
     def ext_mon_word_banner(self, msg: str, direction: str, color: str, freq: float, index):
-        self.__cmd2datagram(f"EXT mled {direction} {color} {freq} {msg}", index)
+        self._cmd2datagram(command.build("EXT", "mled", direction, color, freq, msg), index)
 
     def ext_mon_graph_banner(self, graph: str, direction: str, color: str, freq: float, index):
-        self.__cmd2datagram(f"EXT mled g {direction} {color} {freq} {graph}", index)
+        self._cmd2datagram(command.build("EXT", "mled", "g", direction, color, freq, graph), index)
 
     def ext_mon_char(self, char: str, color: str, index):
         # P.S. if char == "heart" ==> display heart ^ w ^
-        self.__cmd2datagram(f"EXT mled s {color} {char}", index)
+        self._cmd2datagram(command.build("EXT", "mled", "s", color, char), index)
 
     def ext_mon_default(self, graph: str, index):
-        self.__cmd2datagram(f"EXT mled sg {graph}", index)
+        self._cmd2datagram(command.build("EXT", "mled", "sg", graph), index)
 
     def ext_mon_reset(self, index):
-        self.__cmd2datagram("EXT mled sc", index)
+        self._cmd2datagram(command.build("EXT", "mled", "sc"), index)
 
     def ext_mon_brightness(self, brightness: int, index):
-        self.__cmd2datagram(f"EXT mled sl {brightness}", index)
+        self._cmd2datagram(command.build("EXT", "mled", "sl", brightness), index)
 
     def ext_read_tof(self, index):
-        self.__cmd2datagram("EXT tof?", index)
+        self._cmd2datagram(command.build("EXT", "tof?"), index)
 
     def ext_read_version(self, index):
-        self.__cmd2datagram("EXT version?", index)
+        self._cmd2datagram(command.build("EXT", "version?"), index)
+
+
+class Control(CommandSet):
+    def __init__(
+            self,
+            sn_map: dict,
+            debug: bool = False,
+            network: str = None,
+            cache: str = "Log//discovery.json",
+            port: tuple = (8889, 8890, 11111),
+            rc_rate: float = 50,
+            record: str = None,
+            safety_rules: tuple = None,
+            planner: "planner.Planner" = None,
+            interface: str = None,
+            publish=None
+    ):
+        """
+        A class for easy tello control.
+
+        Threads & ownership:
+            UDP recv(x3) - Only writer of its server storage.
+            Command update - Only reader of CommandServer once scanned. Feed response to TelloDB scheduler.
+            Status update - Only writer of tello status & TelloDB.Telemetry. Send safety action right away.
+            Video update - Only writer of VideoStream.
+            Cronjob - Fire TelloDB timer.
+            RC sender - Only reader of RCStream setpoint, send them every tick.
+            Caller - Exec queue is per thread, so each thread compose its own task.
+        TelloDB scheduler is guarded by its own lock. Datagram is sent outside the lock.
+
+        :param sn_map: SN to index dictionary.
+        :param debug: Enter debug mode.
+        :param network: Network to scan tello. e.g. "192.168.10.0/24". None for network of NIC.
+        :param cache: Path of SN -> IP cache for fast restart. None to disable.
+        :param port: Local port of command / status / video server. Tello report to 8890 / 11111 by default.
+        :param rc_rate: Tick per second(Hz) of rc stream.
+        :param record: Path of flight recording of every datagram, replay with recorder.Replay. None to disable.
+        :param safety_rules: Rule checked on status stream, e.g. safety.DEFAULT_RULES. None to disable.
+        :param planner: Collision precheck of task before it is sent, e.g. planner.Planner(mode=planner.STAGGER).
+        None to disable. Tello must see a mission pad(on_pad) to be checked.
+        :param interface: IP of the NIC to talk to tello through, e.g. one per access point. None for all NIC.
+        :param publish: Publish status to shared memory, name in TelloDB.State.name. See TelloDB. None to disable.
+        """
+        "Log"
+        if not debug:
+            self.__log = quicklog.create_log(f"Control", 30, False)
+        else:
+            self.__log = quicklog.create_log(f"Control", 10, True)
+        "Init UDP servers"
+        bind = "0.0.0.0" if interface is None else interface
+        self.CommandServer = udp.Server(recv_port=port[0], recv_decode=True, send_independent=False, bind=bind,
+                                        debug=debug)
+        self.StatusServer = udp.Server(recv_port=port[1], recv_decode=True, send_independent=False, recv_into=True,
+                                       bind=bind, debug=debug)
+        self.VideoServer = udp.Server(recv_port=port[2], recv_decode=False, send_independent=False, recv_into=True,
+                                      recv_pool=512, bind=bind, debug=debug)
+        self.CommandServer.network = network
+        self.__log.info("Control: UDP Servers initiated.")
+        "Init Recorder"
+        self.Recorder = None if record is None else recorder.Recorder(record, debug=debug)
+        if self.Recorder is not None:
+            self.CommandServer.record(self.Recorder, recorder.COMMAND)
+            self.StatusServer.record(self.Recorder, recorder.STATUS)
+            self.VideoServer.record(self.Recorder, recorder.VIDEO)
+            self.__log.info("Control: Recorder initiated.")
+        "Init TelloDB"
+        self.__sn_map = sn_map
+        self.TelloDB = tello.TelloDB(sn_map=sn_map, debug=debug, safety_rules=safety_rules, planner=planner,
+                                     publish=publish)
+        self.__log.info("Control: TelloDB initiated.")
+        self.Discovery = discovery.Discovery(self.CommandServer, network=network, cache=cache, debug=debug)
+        self.RCStream = rc.RCStream(self.CommandServer, rate=rc_rate, debug=debug)
+        "Exec"
+        self.__exec_local = threading.local()  # Exec queue per thread
+        self.__exec_lock = threading.RLock()  # Guard exec id, held until the task is added to keep id in order
+        self.__exec_id = 0
+        self.__future = {}  # Task id -> TaskFuture not done
+        self.TelloDB.task_subscribe(self.__task_done)
+        """Scan Tello"""
+        self.scan_tello()
+        "Init Threads"
+        self.__cronjob_event = threading.Event()  # Wake cronjob when a timer may be added
+        self.__CronJobThread = threading.Thread(target=self.__cronjob)
+        self.__CronJobThread.daemon = True
+        self.__CronJobThread.start()
+        self.__log.info("Control: Cronjob thread initiated.")
+        self.__CommandUpdateThread = threading.Thread(target=self.__command_update)
+        self.__CommandUpdateThread.daemon = True
+        self.__CommandUpdateThread.start()
+        self.__log.info("Control: Command update thread initiated.")
+        self.__StatusUpdateThread = threading.Thread(target=self.__status_update)
+        self.__StatusUpdateThread.daemon = True
+        self.__StatusUpdateThread.start()
+        self.__log.info("Control: Status update thread initiated.")
+        self.__VideoUpdateThread = threading.Thread(target=self.__video_update)
+        self.__VideoUpdateThread.daemon = True
+        self.__VideoUpdateThread.start()
+        self.__log.info("Control: Video update thread initiated.")
+        self.__log.warning(f"Control: Initiated. - [{sn_map}, {debug}, {network}, {cache}, {port}, {rc_rate}, "
+                           f"{record}, {safety_rules}, {planner}, {interface}, {publish}]")
+
+    # Basic Functions
+    def scan_tello(self, timeout: float = None):
+        """
+        Scan tello in lan until every SN in sn_map is found. Called by __init__, before command update starts.
+        Tello not in sn_map(e.g. of another Control) is left alone.
+        """
+        def on_found(ip: str, sn: str):
+            if sn in self.__sn_map:
+                self.TelloDB.add_tello(ip, sn)
+            else:
+                self.__log.warning(f"scan_tello - SN not in sn_map, ignored. - ['{ip}', '{sn}']")
+
+        found = self.Discovery.scan(self.__sn_map, on_found=on_found, timeout=timeout)
+        found = {sn: ip for sn, ip in found.items() if sn in self.__sn_map}
+        # Start motor prevent overheat
+        self.CommandServer.send_batch([(b"motoron", (ip, 8889)) for ip in found.values()])
+        time.sleep(0.1)
+        while self.CommandServer.read_new:
+            self.CommandServer.read()
+        # List details of tello found.
+        print(self.TelloDB.query_object_info())
+
+    def declare_emergency(self):
+        """Declare emergency!"""
+        self.CommandServer.broadcast("emergency", 8889)  # Prevent drop package
+        self.CommandServer.broadcast("emergency", 8889)
+        self.CommandServer.broadcast("emergency", 8889)
+        self.__log.critical(f"Declared emergency.")
+
+    # RC Stream
+    def stream_rc(self, roll: int, pitch: int, throttle: int, yaw: int, index):
+        """
+        Stream rc setpoint at rc_rate until replaced. Bypass task system, return right away.
+        Setpoint not refreshed within RCStream expire(1 second) is replaced by a hover, call again to keep streaming.
+        """
+        if type(index) != int:
+            for i in index:
+                self.stream_rc(roll, pitch, throttle, yaw, i)
+            return
+        info = self.TelloDB.info2info(index=index)
+        if info is None:
+            self.__log.error(f"stream_rc - Can't find tello[{index}]")
+            return
+        self.RCStream.set(info["ip"], roll, pitch, throttle, yaw)
+
+    def stop_rc(self, index=None):
+        """Hover tello and stop its rc stream. Every tello if index is None."""
+        if index is None:
+            self.RCStream.clear()
+            return
+        for i in ([index] if type(index) == int else index):
+            info = self.TelloDB.info2info(index=i)
+            if info is not None:
+                self.RCStream.clear(info["ip"])
+
+    # Threads
+    def __send(self, datagrams: list, wake: bool = True):
+        """Send datagram from TelloDB and wake cronjob for the new timer. Timer may be added without datagram."""
+        if datagrams:
+            skew = self.CommandServer.send_batch(datagrams)
+            self.__log.info(f"Send - Done - [{skew * 1000:.3f}ms] {datagrams}")
+        if wake:
+            self.__cronjob_event.set()
+
+    def __cronjob(self):
+        # Sleep until the next timer(timeout / release) instead of polling.
+        while True:
+            deadline = self.TelloDB.next_deadline()
+            self.__cronjob_event.wait(None if deadline is None else max(deadline - time.time(), 0))
+            self.__cronjob_event.clear()
+            self.__send(self.TelloDB.cronjob(), wake=False)  # Deadline is read again right above
+
+    def __command_update(self):
+        while True:
+            datagram = self.CommandServer.read()  # Block until datagram arrived.
+            self.__send(self.TelloDB.update_command(datagram))  # Next task goes out right away.
+
+    def __status_update(self):
+        while True:
+            datagrams = self.TelloDB.update_status(self.StatusServer.read())  # Block until datagram arrived.
+            if datagrams:  # Safety action, skip the task queue
+                self.__send(datagrams)
+
+    def __video_update(self):
+        while True:
+            datagram = self.VideoServer.read()  # Block until datagram arrived.
+            self.TelloDB.update_video(datagram)
+            self.VideoServer.release(datagram)  # Frame is copied into VideoStream, recycle the buffer.
+
+    # Command Process
+    @property
+    def __exec_queue(self):
+        """Exec queue of calling thread."""
+        try:
+            return self.__exec_local.queue
+        except AttributeError:
+            self.__exec_local.queue = []
+            return self.__exec_local.queue
+
+    def _exec_queue(self):
+        return self.__exec_queue
+
+    def _has_tello(self, index: int):
+        if self.TelloDB.info2info(index=index) is not None:
+            return True
+        self.__log.error(f"Index - Can't find tello[{index}]")
+        return False
+
+    def exec(self, blocking: bool = True, sync: bool = False, repeat: bool = True, id_fulfil: list = (),
+             at: float = None):
+        """
+        Execute cmd in exec queue & print result when finished.
+
+        :param repeat: Retransmit unanswered command after the RTO of tello to compensate drop packet.
+        :param blocking: Func exit when task finish.
+        :param sync: Ensure all the drones exec the task at the same time.
+        :param id_fulfil: If this exist. The task will start when all the task in given list is done. Task id or
+            future.
+        :param at: The task will not start before this time(time.time()).
+        :return future.TaskFuture of the task, usable as its task id.
+        """
+        task_list = self.__exec_queue
+        self.__exec_local.queue = []
+        id_fulfil = [int(item) for item in id_fulfil]
+        # Pass task to TelloDB
+        with self.__exec_lock:
+            task_future = self.__task_new()
+            datagrams = self.TelloDB.task_add(task_future.id, task_list, blocking, sync, repeat, id_fulfil, at)
+        self.__send(datagrams)
+        self.__log.info(f"Exec - Called TelloDB add task[{task_future.id}]. - {task_list}, {blocking},"
+                        f"{sync}, {id_fulfil}, {at}.")
+        if blocking:
+            task_future.result()
+        return task_future
+
+    def exec_group(self, cmd, index, blocking: bool = True, repeat: bool = True, id_fulfil: list = (),
+                   at: float = None):
+        """
+        Execute one command on many tello as one task & print result when finished. e.g. exec_group("land", group)
+
+        Same as queueing cmd for every tello & exec(sync=True), with one payload, one timer and one result record
+        for the whole group instead of per tello.
+
+        :param cmd: command.Command, or SDK command checked by command.parse.
+        :param index: Tello index list.
+        :return future.TaskFuture of the task, usable as its task id.
+        """
+        cmd = command.parse(cmd) if isinstance(cmd, str) else cmd
+        indexes = self._valid_index(index)
+        id_fulfil = [int(item) for item in id_fulfil]
+        # Pass task to TelloDB
+        with self.__exec_lock:
+            task_future = self.__task_new()
+            datagrams = self.TelloDB.group_add(task_future.id, cmd, indexes, blocking, repeat, id_fulfil, at)
+        self.__send(datagrams)
+        self.__log.info(f"Exec Group - Called TelloDB add task[{task_future.id}]. - {cmd}, {indexes}, {blocking},"
+                        f"{id_fulfil}, {at}.")
+        if blocking:
+            task_future.result()
+        return task_future
+
+    def __task_new(self):
+        """
+        Future of a new task id, registered before the task may finish. Call with __exec_lock held until the task is
+        added: TelloDB takes a lower id that is no longer active as done.
+        """
+        self.__exec_id += 1
+        task_future = future.TaskFuture(self.__exec_id)
+        self.__future[task_future.id] = task_future
+        return task_future
+
+    def __task_done(self, task_id: int):
+        """Complete the future of a task. Called from the thread that finished it."""
+        task_future = self.__future.pop(task_id, None)
+        if task_future is not None:
+            task_future.set_result(self.TelloDB.task_detail(task_id))
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, handler, decode: bool, ip: str, log):
+        """Pass datagram in format [data, (ip, port)] to handler, filter blank and self datagram."""
+        self.__handler = handler
+        self.__decode = decode
+        self.__ip = ip
+        self.__log = log
+
+    def datagram_received(self, data: bytes, addr: tuple):
+        if (data != b"") and (addr[0] != self.__ip):
+            if self.__decode:
+                data = data.decode("utf-8", errors="ignore")
+            self.__handler([data, addr])
+
+    def error_received(self, exc: Exception):
+        self.__log.warning(f"Recv - {exc!r}(Maybe due to ICMP report from broadcast failure.)")
+
+
+class _TransportServer:
+    def __init__(self, transport: asyncio.DatagramTransport, ip: str):
+        """What Discovery needs of udp.Server, on an asyncio transport."""
+        self.ip = ip
+        self.__transport = transport
+
+    def send_batch(self, datagrams: list):
+        for datagram in datagrams:
+            self.__transport.sendto(datagram[0], datagram[1])
+        return 0
+
+
+class AsyncControl(CommandSet):
+    def __init__(
+            self,
+            sn_map: dict,
+            debug: bool = False,
+            network: str = None,
+            cache: str = "Log//discovery.json",
+            port: tuple = (8889, 8890, 11111),
+            safety_rules: tuple = None
+    ):
+        """
+        Tello control on a single asyncio event loop. Same command API as Control.
+
+        Usage:
+            async with AsyncControl(sn_map) as control:
+                control.takeoff(index=1)
+                await control.exec()
+
+        :param network: Network to scan tello. e.g. "192.168.10.0/24". None for network of NIC.
+        :param cache: Path of SN -> IP cache of discovery. None to disable.
+        :param port: Local port of command / status / video endpoint. Tello report to 8890 / 11111 by default.
+        :param safety_rules: Rule checked on status stream, e.g. safety.DEFAULT_RULES. None to disable.
+        """
+        "Log"
+        if not debug:
+            self.__log = quicklog.create_log(f"AsyncControl", 30, False)
+        else:
+            self.__log = quicklog.create_log(f"AsyncControl", 10, True)
+        "Init TelloDB"
+        self.__sn_map = sn_map
+        self.__debug = debug
+        self.TelloDB = tello.TelloDB(sn_map=sn_map, debug=debug, safety_rules=safety_rules)
+        self.__log.info("AsyncControl: TelloDB initiated.")
+        "Transport - Created in start()"
+        self.__ip = socket.gethostbyname(socket.gethostname())
+        self.__command = None
+        self.__status = None
+        self.__video = None
+        self.__port = port
+        self.__cronjob_handle = None  # Timer for the next TelloDB cronjob
+        "Scan - Discovery is created in start()"
+        self.__network = network
+        self.__cache = cache
+        self.Discovery = None
+        self.__scan_inbox = None  # Command answer goes here while scanning
+        "Exec"
+        self.__exec_queue = []
+        self.__exec_id = 0
+        self.__waiter = {}  # Task id -> Future
+        self.TelloDB.task_subscribe(self.__task_done)  # Everything runs on the loop, so called from loop.
+        self.__log.warning(f"AsyncControl: Initiated. - [{sn_map}, {debug}, {network}, {cache}, {port}, "
+                           f"{safety_rules}]")
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args):
+        self.close()
+
+    async def start(self):
+        """Bind command / status / video port on running loop and scan tello."""
+        loop = asyncio.get_running_loop()
+        self.__command, _ = await loop.create_datagram_endpoint(
+            lambda: _DatagramProtocol(self.__command_update, True, self.__ip, self.__log),
+            sock=udp.bind_socket(self.__port[0]))
+        self.__status, _ = await loop.create_datagram_endpoint(
+            lambda: _DatagramProtocol(self.__status_update, True, self.__ip, self.__log),
+            sock=udp.bind_socket(self.__port[1]))
+        self.__video, _ = await loop.create_datagram_endpoint(
+            lambda: _DatagramProtocol(self.TelloDB.update_video, False, self.__ip, self.__log),
+            sock=udp.bind_socket(self.__port[2]))
+        self.__log.info("AsyncControl: UDP endpoints initiated.")
+        self.Discovery = discovery.Discovery(_TransportServer(self.__command, self.__ip), network=self.__network,
+                                             cache=self.__cache, debug=self.__debug)
+        await self.scan_tello()
+
+    def close(self):
+        """Stop cronjob and release sockets."""
+        if self.__cronjob_handle is not None:
+            self.__cronjob_handle.cancel()
+        for transport in (self.__command, self.__status, self.__video):
+            if transport is not None:
+                transport.close()
+        self.__log.warning("AsyncControl: Closed.")
+
+    # Basic Functions
+    def __broadcast(self, message: str):
+        message = message.encode("utf-8", errors="ignore")
+        for address in udp.broadcast_address(self.__ip, 8889, self.__network):
+            self.__command.sendto(message, address)
+
+    async def scan_tello(self, timeout: float = None):
+        """Scan tello in lan until every SN in sn_map is found, see Control.scan_tello. Called by start()."""
+        def on_found(ip: str, sn: str):
+            if sn in self.__sn_map:
+                self.TelloDB.add_tello(ip, sn)
+            else:
+                self.__log.warning(f"scan_tello - SN not in sn_map, ignored. - ['{ip}', '{sn}']")
+
+        self.__scan_inbox = asyncio.Queue()
+        found = await self.Discovery.scan_async(self.__sn_map, self.__scan_inbox, on_found=on_found, timeout=timeout)
+        found = {sn: ip for sn, ip in found.items() if sn in self.__sn_map}
+        # Start motor prevent overheat, answer is dropped with the inbox
+        for ip in found.values():
+            self.__command.sendto(b"motoron", (ip, 8889))
+        await asyncio.sleep(0.1)
+        self.__scan_inbox = None
+        # List details of tello found.
+        print(self.TelloDB.query_object_info())
+
+    def declare_emergency(self):
+        """Declare emergency!"""
+        for _ in range(3):  # Prevent drop package
+            self.__broadcast("emergency")
+        self.__log.critical(f"Declared emergency.")
+
+    # Event
+    def __command_update(self, datagram):
+        if self.__scan_inbox is not None:
+            self.__scan_inbox.put_nowait(datagram)
+        else:
+            self.__send(self.TelloDB.update_command(datagram))
+
+    def __status_update(self, datagram):
+        datagrams = self.TelloDB.update_status(datagram)
+        if datagrams:  # Safety action, skip the task queue
+            self.__send(datagrams)
+
+    def __send(self, datagrams: list):
+        """Send datagram from TelloDB and re-arm cronjob for the next timer."""
+        for datagram in datagrams:
+            self.__command.sendto(datagram[0], datagram[1])
+        if datagrams:
+            self.__log.info(f"Send - Done - {datagrams}")
+        deadline = self.TelloDB.next_deadline()
+        if self.__cronjob_handle is not None:
+            self.__cronjob_handle.cancel()
+            self.__cronjob_handle = None
+        if deadline is not None:
+            self.__cronjob_handle = asyncio.get_running_loop().call_later(
+                max(deadline - time.time(), 0), self.__cronjob)
+
+    def __cronjob(self):
+        """Handle timeout. Response is dispatched right away in __command_update."""
+        self.__cronjob_handle = None
+        self.__send(self.TelloDB.cronjob())
+
+    def __task_done(self, task_id: int):
+        waiter = self.__waiter.pop(task_id, None)
+        if (waiter is not None) and (not waiter.done()):
+            waiter.set_result(task_id)
+
+    # Command Process
+    def _exec_queue(self):
+        return self.__exec_queue
+
+    def _has_tello(self, index: int):
+        if self.TelloDB.info2info(index=index) is not None:
+            return True
+        self.__log.error(f"Index - Can't find tello[{index}]")
+        return False
+
+    async def exec(self, blocking: bool = True, sync: bool = False, repeat: bool = True, id_fulfil: list = (),
+                   at: float = None):
+        """
+        Execute cmd in exec queue & print result when finished.
+
+        :param repeat: Retransmit unanswered command after the RTO of tello to compensate drop packet.
+        :param blocking: Return when task finish.
+        :param sync: Ensure all the drones exec the task at the same time.
+        :param id_fulfil: If this exist. The task will start when all the task in given list is done.
+        :param at: The task will not start before this time(time.time()).
+        :return task_id, a id that can trace is the task finished yet.
+        """
+        self.__exec_id += 1
+        task_id = self.__exec_id
+        # Pass task to TelloDB
+        waiter = asyncio.get_running_loop().create_future()
+        self.__waiter[task_id] = waiter
+        self.__send(self.TelloDB.task_add(task_id, self.__exec_queue, blocking, sync, repeat, id_fulfil, at))
+        self.__log.info(f"Exec - Called TelloDB add task[{task_id}]. - {self.__exec_queue}, {blocking},"
+                        f"{sync}, {id_fulfil}, {at}.")
+        self.__exec_queue = []
+        if blocking:
+            await waiter
+        return task_id
+
+    async def exec_group(self, cmd, index, blocking: bool = True, repeat: bool = True, id_fulfil: list = (),
+                         at: float = None):
+        """Control.exec_group on the event loop."""
+        cmd = command.parse(cmd) if isinstance(cmd, str) else cmd
+        indexes = self._valid_index(index)
+        self.__exec_id += 1
+        task_id = self.__exec_id
+        # Pass task to TelloDB
+        waiter = asyncio.get_running_loop().create_future()
+        self.__waiter[task_id] = waiter
+        self.__send(self.TelloDB.group_add(task_id, cmd, indexes, blocking, repeat, id_fulfil, at))
+        self.__log.info(f"Exec Group - Called TelloDB add task[{task_id}]. - {cmd}, {indexes}, {blocking},"
+                        f"{id_fulfil}, {at}.")
+        if blocking:
+            await waiter
+        return task_id
+
+    async def wait(self, task_id: int):
+        """Wait until the task given is done."""
+        if not self.TelloDB.task_status(task_id):
+            await asyncio.shield(self.__waiter[task_id])
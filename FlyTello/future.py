@@ -0,0 +1,48 @@
+"""
+Handle of a task returned by Control.exec. It's completed by the thread that receives the last answer, so a script
+can queue many task and wait on them together instead of polling task_status.
+
+    first = control.exec(blocking=False)
+    control.land(1)
+    second = control.exec(blocking=False, id_fulfil=[first])
+    done, _ = future.wait_all([first, second], timeout=30)
+"""
+from concurrent import futures
+
+
+class TaskFuture(futures.Future):
+    def __init__(self, task_id: int):
+        """
+        concurrent.futures.Future of a task. Result is [(Tello index, cmd, result)].
+
+        Compared & hashed by identity, futures of 2 Control may share a task id. int(future) or .id is the task id,
+        it can be passed wherever a task id is taken(id_fulfil, task_wait ...).
+        Callback of add_done_callback is called from the thread that finished the task, keep it short.
+
+        :param task_id: Task id of Control.
+        """
+        super().__init__()
+        self.id = task_id
+        self.set_running_or_notify_cancel()  # Task is queued already, it can't be cancelled.
+
+    def __int__(self):
+        return self.id
+
+    def __index__(self):
+        return self.id
+
+    def __str__(self):
+        return str(self.id)
+
+    def __repr__(self):
+        return f"TaskFuture({self.id}, {'done' if self.done() else 'running'})"
+
+
+def wait_all(task_futures: list, timeout: float = None):
+    """Block until every future is done. Return (done, not done) as sets."""
+    return futures.wait(task_futures, timeout, futures.ALL_COMPLETED)
+
+
+def wait_any(task_futures: list, timeout: float = None):
+    """Block until any future is done. Return (done, not done) as sets."""
+    return futures.wait(task_futures, timeout, futures.FIRST_COMPLETED)
@@ -0,0 +1,218 @@
+import math
+import time
+
+DEFAULT_SPEED = 50  # Speed assumed for command without speed argument(cm/s)
+TAKEOFF_HEIGHT = 80  # Height tello hovers at after takeoff(cm)
+# Unit vector in body frame: x forward, y right, z up
+DIRECTION = {
+    "up": (0, 0, 1),
+    "down": (0, 0, -1),
+    "left": (0, -1, 0),
+    "right": (0, 1, 0),
+    "forward": (1, 0, 0),
+    "back": (-1, 0, 0)
+}
+# Mode
+REPORT = "report"  # Log conflict, release anyway
+STAGGER = "stagger"  # Hold the task until conflict clears, reject when it doesn't in time
+REJECT = "reject"  # Finish the task with a conflict result
+
+
+class Planner:
+    def __init__(self, separation: float = 50, dt: float = 0.1, mode: str = REPORT, stagger: float = 5,
+                 speed: float = DEFAULT_SPEED):
+        """
+        Collision precheck of motion command in the shared pad frame.
+
+        Every commanded path is sampled every dt along its flight time. Position of each drone at a time step goes
+        into a grid of cell size = 2x separation, so a pair closer than separation is always within 8 cells.
+        Each step costs O(drones) instead of O(drones^2).
+
+        :param separation: Minimum distance between 2 tello(cm).
+        :param dt: Time step of path sample(second).
+        :param mode: planner.REPORT / planner.STAGGER / planner.REJECT
+        :param stagger: In STAGGER mode, reject a task still in conflict after waiting this long(second).
+        :param speed: Speed assumed for command without speed argument(cm/s).
+        """
+        if mode not in (REPORT, STAGGER, REJECT):
+            raise ValueError(f"Planner - Unknown mode. - {mode}")
+        self.separation = separation
+        self.dt = dt
+        self.mode = mode
+        self.stagger = stagger
+        self.speed = speed
+        self.__track = {}  # Tello index -> (Start time, points) of path being flown
+        # #Stats
+        self.check_count = 0
+        self.conflict_count = 0
+
+    def __repr__(self):
+        return f"Planner({self.mode}, {self.separation}cm)"
+
+    # Path
+    def path(self, cmd: str, position: tuple):
+        """
+        Positions every dt while flying cmd from position. [position] for non motion command.
+
+        :param cmd: SDK command. e.g. "go 100 0 50 60", "curve 50 50 0 100 0 0 30 m1"
+        :param position: (x, y, z, yaw) in pad frame(cm, degree).
+        """
+        x, y, z, yaw = position
+        word = cmd.split()
+        try:
+            if word[0] in DIRECTION:
+                dx, dy, dz = [axis * float(word[1]) for axis in DIRECTION[word[0]]]
+                return self.__line((x, y, z), _rotate((dx, dy, dz), yaw, x, y, z), self.speed)
+            if word[0] == "takeoff":
+                return self.__line((x, y, z), (x, y, max(z, TAKEOFF_HEIGHT)), self.speed)
+            if word[0] == "land":
+                return self.__line((x, y, z), (x, y, 0), self.speed)
+            if word[0] in ("go", "jump"):
+                target = tuple(float(item) for item in word[1:4])
+                if (word[0] == "go") and (len(word) == 5):  # Relative, body frame
+                    target = _rotate(target, yaw, x, y, z)
+                return self.__line((x, y, z), target, float(word[4]))
+            if word[0] == "curve":
+                middle = tuple(float(item) for item in word[1:4])
+                target = tuple(float(item) for item in word[4:7])
+                if len(word) == 8:  # Relative, body frame
+                    middle = _rotate(middle, yaw, x, y, z)
+                    target = _rotate(target, yaw, x, y, z)
+                return self.__curve((x, y, z), middle, target, float(word[7]))
+        except (IndexError, ValueError):
+            pass
+        return [(x, y, z)]
+
+    def __line(self, start: tuple, end: tuple, speed: float):
+        steps = max(int(math.dist(start, end) / max(speed, 1) / self.dt), 1)
+        (x, y, z), (dx, dy, dz) = start, ((end[0] - start[0]) / steps, (end[1] - start[1]) / steps,
+                                          (end[2] - start[2]) / steps)
+        return [(x + dx * i, y + dy * i, z + dz * i) for i in range(steps + 1)]
+
+    def __curve(self, start: tuple, middle: tuple, end: tuple, speed: float):
+        # Quadratic through middle at half way, close enough to the arc tello flies.
+        control = tuple(2 * m - (a + b) / 2 for a, m, b in zip(start, middle, end))
+        length = math.dist(start, middle) + math.dist(middle, end)
+        steps = max(int(length / max(speed, 1) / self.dt), 1)
+        points = []
+        for i in range(steps + 1):
+            t = i / steps
+            points.append(tuple((1 - t) ** 2 * a + 2 * t * (1 - t) * c + t ** 2 * b
+                                for a, c, b in zip(start, control, end)))
+        return points
+
+    # Track
+    def begin(self, index: int, cmd: str, position: tuple, now: float = None):
+        """Tello[index] starts flying cmd. Its path is checked against later task until end()."""
+        if position is not None:
+            self.__track[index] = (time.time() if now is None else now, self.path(cmd, position))
+
+    def end(self, index: int):
+        """Tello[index] finished its command."""
+        self.__track.pop(index, None)
+
+    # Check
+    def check(self, items: list, static: dict, now: float = None):
+        """
+        Conflict of new commands against each other, paths being flown and still tello.
+
+        :param items: [(Tello index, cmd, position)] about to be sent together.
+        :param static: Tello index -> position of every tello with known position.
+        :return: [(Tello index, Tello index, seconds from now, distance(cm))] one per pair, closest approach.
+        """
+        now = time.time() if now is None else now
+        self.check_count += 1
+        tracks = {}  # Tello index -> (Start time, points)
+        for index, cmd, position in items:
+            if (position is not None) and (index not in tracks):
+                tracks[index] = (now, self.path(cmd, position))
+        if not tracks:
+            return []
+        moving = {index: track for index, track in self.__track.items() if index not in tracks}
+        still = {index: position[:3] for index, position in static.items()
+                 if (position is not None) and (index not in tracks) and (index not in moving)}
+        size = self.separation
+        cell_size = size * 2
+        still_grid = self.__grid(still.items())
+        steps = max(len(points) for _, points in tracks.values())
+        found = {}  # (a, b) -> (time, distance)
+        for step in range(steps):
+            at = now + step * self.dt
+            position = {index: points[step if step < len(points) else -1] for index, (_, points) in tracks.items()}
+            position.update((index, _at(track, at, self.dt)) for index, track in moving.items())
+            grid = self.__grid(position.items())
+            for index in tracks:
+                point = position[index]
+                # Cell is 2x separation, so a neighbour is in this cell or the one next to the nearer face per axis.
+                x, y, z = point[0] / cell_size, point[1] / cell_size, point[2] / cell_size
+                cx, cy, cz = math.floor(x), math.floor(y), math.floor(z)
+                nx = cx - 1 if x - cx < 0.5 else cx + 1
+                ny = cy - 1 if y - cy < 0.5 else cy + 1
+                nz = cz - 1 if z - cz < 0.5 else cz + 1
+                for lookup, cells in ((position, grid), (still, still_grid)):
+                    if not cells:
+                        continue
+                    for key in ((cx, cy, cz), (nx, cy, cz), (cx, ny, cz), (nx, ny, cz),
+                                (cx, cy, nz), (nx, cy, nz), (cx, ny, nz), (nx, ny, nz)):
+                        near = cells.get(key)
+                        if near is None:
+                            continue
+                        for other in near:
+                            if other == index:
+                                continue
+                            distance = math.dist(point, lookup[other])
+                            if distance < size:
+                                pair = (index, other) if index < other else (other, index)
+                                if (pair not in found) or (distance < found[pair][1]):
+                                    found[pair] = (step * self.dt, distance)
+        self.conflict_count += len(found)
+        return [(pair[0], pair[1], found[pair][0], found[pair][1]) for pair in sorted(found)]
+
+    def __grid(self, positions):
+        """Cell of 2x separation -> [Tello index]."""
+        grid = {}
+        size = self.separation * 2
+        for index, (x, y, z) in positions:
+            key = (math.floor(x / size), math.floor(y / size), math.floor(z / size))
+            cell = grid.get(key)
+            if cell is None:
+                grid[key] = [index]
+            else:
+                cell.append(index)
+        return grid
+
+
+def flight_time(cmd: str):
+    """
+    Time(second) to fly go / curve / jump at its own speed, None for other command. Path is measured from the origin
+    of the command: tello for the relative form, the pad for the mission pad form. Curve is measured along the 2
+    chords through its middle point, the arc tello flies is at most about 11% longer.
+    """
+    word = cmd.split()
+    try:
+        if word[0] in ("go", "jump"):
+            length = math.dist((0, 0, 0), [float(item) for item in word[1:4]])
+            speed = float(word[4])
+        elif word[0] == "curve":
+            middle = [float(item) for item in word[1:4]]
+            length = math.dist((0, 0, 0), middle) + math.dist(middle, [float(item) for item in word[4:7]])
+            speed = float(word[7])
+        else:
+            return None
+    except (IndexError, ValueError):
+        return None
+    return length / max(speed, 1)
+
+
+def _rotate(vector: tuple, yaw: float, x: float, y: float, z: float):
+    """Body frame vector -> pad frame point from (x, y, z) with heading yaw(degree, clockwise)."""
+    radian = math.radians(yaw)
+    cos, sin = math.cos(radian), math.sin(radian)
+    return x + vector[0] * cos - vector[1] * sin, y + vector[0] * sin + vector[1] * cos, z + vector[2]
+
+
+def _at(track: tuple, at: float, dt: float):
+    """Position of a track at time. Before start at the first point, after the end at the last."""
+    start, points = track
+    step = int(round((at - start) / dt))
+    return points[min(max(step, 0), len(points) - 1)]
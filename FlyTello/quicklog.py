@@ -1,6 +1,34 @@
 import os
 import time
 import logging
+import logging.handlers  # Queue & rotating handler
+import atexit  # Drain async log on exit
+import queue
+import threading
+import typing
+
+# Default of create_log, change with configure()
+SETTING = {
+    "async_mode": False,  # Write from a background thread in batch
+    "max_bytes": 0,  # Rotate file at this size(bytes). 0 to disable
+    "backup_count": 3,  # Rotated file kept
+    "batch": 512  # Max record written per batch
+}
+
+
+def configure(async_mode: bool = None, max_bytes: int = None, backup_count: int = None, batch: int = None):
+    """
+    Change default of logger created after this.
+
+    :param async_mode: Caller only put record in a queue, a background thread write them in batch.
+    :param max_bytes: Rotate log file at this size(bytes). 0 to disable.
+    :param backup_count: Rotated file kept.
+    :param batch: Max record written before flush.
+    """
+    for key, value in (("async_mode", async_mode), ("max_bytes", max_bytes), ("backup_count", backup_count),
+                       ("batch", batch)):
+        if value is not None:
+            SETTING[key] = value
 
 
 def create_log(
@@ -31,14 +59,177 @@ def create_log(
             os.mkdir(path)
         except FileExistsError:
             pass
-        handler = logging.FileHandler(f"{path}{name}.log", mode="w", encoding="utf-8",
-                                      errors="ignore")
+        handler = _file_handler(f"{path}{name}.log", "w")
     else:
-        handler = logging.FileHandler(f"Log//{name}.log", mode="w+", encoding="utf-8", errors="ignore")
+        handler = _file_handler(f"Log//{name}.log", "w+")
     handler.setFormatter(formatter)
 
     # Ref Level no. https://docs.python.org/3/library/logging.html#logging-levels
     logger.setLevel(level)
-    logger.addHandler(handler)
+    if SETTING["async_mode"]:
+        logger.addHandler(_QueueHandler(handler))
+    else:
+        logger.addHandler(handler)
 
     return logger
+
+
+def _file_handler(path: str, mode: str):
+    if SETTING["max_bytes"]:
+        # Rotating handler always append, start with an empty file like mode "w".
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=SETTING["max_bytes"],
+                                                       backupCount=SETTING["backup_count"], encoding="utf-8",
+                                                       errors="ignore")
+        handler.doRollover()
+    else:
+        handler = logging.FileHandler(path, mode=mode, encoding="utf-8", errors="ignore")
+    if SETTING["async_mode"]:
+        handler.flush = lambda: None  # Flushed once per batch by listener
+    return handler
+
+
+"Sampling"
+
+
+class _SamplingFilter(logging.Filter):
+    def __init__(self):
+        """Pass 1 in N record per channel. Channel is the message part before the first " - "."""
+        super().__init__()
+        self.every = {}  # Channel -> N
+        self.count = {}  # Channel -> Record seen
+
+    def filter(self, record: logging.LogRecord):
+        if record.levelno >= logging.WARNING:
+            return True
+        channel = str(record.msg).partition(" - ")[0]
+        every = self.every.get(channel)
+        if every is None:
+            return True
+        count = self.count.get(channel, 0)
+        self.count[channel] = count + 1
+        return count % every == 0
+
+
+def set_sampling(logger: logging.Logger, channel: str, every: int):
+    """
+    Keep 1 in every record of channel, e.g. set_sampling(log, "update_status", 10). Warning & above is kept too.
+
+    :param logger: Logger from create_log.
+    :param channel: Message prefix before the first " - ".
+    :param every: Keep 1 in this many record. 1 to keep all.
+    """
+    for item in logger.filters:
+        if isinstance(item, _SamplingFilter):
+            break
+    else:
+        item = _SamplingFilter()
+        logger.addFilter(item)
+    item.every[channel] = every
+
+
+"Async"
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, target: logging.Handler):
+        """Put record with its target handler into the shared queue."""
+        super().__init__(_listener().queue)
+        self.target = target
+
+    def prepare(self, record: logging.LogRecord):
+        # Message is already an f-string in this package. Only merge args, skip the copy of QueueHandler.
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        self.queue.put((self.target, record))
+
+
+class _BatchListener:
+    def __init__(self):
+        """Single background writer of every async logger."""
+        self.queue = queue.SimpleQueue()  # (Handler, record), (threading.Event, None) to mark flush, None to stop
+        self.batch_count = 0
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+        atexit.register(self.stop)
+
+    def __run(self):
+        running = True
+        while running:
+            batch = [self.queue.get()]  # Block until record arrived.
+            # Take what is queued, up to a batch.
+            while len(batch) < SETTING["batch"]:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            # Write, then flush each file once.
+            touched = set()
+            marker = []
+            for item in batch:
+                if item is None:
+                    running = False
+                elif item[1] is None:
+                    marker.append(item[0])
+                else:
+                    item[0].handle(item[1])
+                    touched.add(item[0])
+            for handler in touched:
+                if handler.stream is not None:
+                    handler.stream.flush()
+            for event in marker:
+                event.set()
+            self.batch_count += 1
+
+    def stop(self):
+        """Write everything queued & stop."""
+        if self.__thread.is_alive():
+            self.queue.put(None)
+            self.__thread.join()
+
+
+_LISTENER = []  # Created on first async logger
+
+
+def _listener():
+    if not _LISTENER:
+        _LISTENER.append(_BatchListener())
+    return _LISTENER[0]
+
+
+_WRITER = {}  # Path -> Line writer of async_writer, one per file so lines don't interleave
+
+
+def async_writer(path: str, encode: typing.Callable = str):
+    """
+    Append encode(item) as a line to path from the background writer, so the caller does no file I/O.
+
+    :param path: File to append to. Writer is shared per path.
+    :param encode: Turn item into a line, called from the background writer.
+    :return: Function write(item).
+    """
+    if path not in _WRITER:
+        handler = logging.FileHandler(path, mode="a", encoding="utf-8", errors="ignore", delay=True)
+        handler.flush = lambda: None  # Flushed once per batch by listener
+        handler.format = lambda record: encode(record.msg)
+        target = _listener().queue
+
+        def write(item):
+            target.put((handler, logging.makeLogRecord({"msg": item})))
+
+        _WRITER[path] = write
+    return _WRITER[path]
+
+
+def flush():
+    """Block until every record queued so far is written. No-op unless async mode was used."""
+    if _LISTENER:
+        done = threading.Event()
+        _LISTENER[0].queue.put((done, None))
+        done.wait()
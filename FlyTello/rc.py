@@ -0,0 +1,124 @@
+from FlyTello import quicklog, udp
+import collections  # Jitter samples
+import threading
+import time
+
+
+class RCStream:
+    def __init__(self, server: udp.Server, rate: float = 50, expire: float = 1, port: int = 8889,
+                 debug: bool = False):
+        """
+        Push rc setpoint to many tello at a fixed rate, outside the task system. Tello never answer rc.
+
+        Setpoint is encoded once in set(). A newer setpoint of the same tello replaces the one not sent yet, so
+        every tick sends only the latest one per tello. The last setpoint is sent every tick until replaced or
+        expired, tello hovers if rc stops coming.
+
+        :param server: Server to send from.
+        :param rate: Tick per second(Hz).
+        :param expire: Setpoint not refreshed for this(second) is replaced by a hover(rc 0 0 0 0). None for never.
+        :param port: Command port of tello.
+        :param debug: Enter debug mode.
+        """
+        "Log"
+        if not debug:
+            self.__log = quicklog.create_log(f"RCStream", 30, False)
+        else:
+            self.__log = quicklog.create_log(f"RCStream", 10, True)
+        "Basic"
+        self.__server = server
+        self.__period = 1 / rate
+        self.__expire = expire
+        self.__port = port
+        "Setpoint"
+        self.__lock = threading.Lock()  # Guard setpoint, taken by caller & sender
+        self.__setpoint = {}  # IP -> [Payload, time set, sent, address]
+        self.__wake = threading.Event()  # Set when there is setpoint
+        self.__running = True
+        "Stats"
+        self.__lateness = collections.deque(maxlen=1000)  # Send start - scheduled tick(second)
+        self.tick_count = 0
+        self.sent_count = 0
+        self.coalesced_count = 0  # Setpoint replaced before sent
+        self.overrun_count = 0  # Tick skipped as sender fell behind
+        "Thread"
+        self.__SenderThread = threading.Thread(target=self.__sender)
+        self.__SenderThread.daemon = True
+        self.__SenderThread.start()
+        self.__log.warning(f"RCStream - Initiated. - [{rate}, {expire}, {port}, {debug}]")
+
+    def set(self, ip: str, roll: int, pitch: int, throttle: int, yaw: int):
+        """Set rc setpoint of tello at ip. Value is clamped to -100 ~ 100."""
+        value = [int(min(max(item, -100), 100)) for item in (roll, pitch, throttle, yaw)]
+        payload = f"rc {value[0]} {value[1]} {value[2]} {value[3]}".encode("utf-8")
+        with self.__lock:
+            old = self.__setpoint.get(ip)
+            if (old is not None) and (not old[2]):
+                self.coalesced_count += 1
+            self.__setpoint[ip] = [payload, time.time(), False, (ip, self.__port) if old is None else old[3]]
+        self.__wake.set()
+
+    def clear(self, ip: str = None):
+        """Send a hover to tello at ip(every tello if None) once, then stop streaming to it."""
+        with self.__lock:
+            targets = list(self.__setpoint) if ip is None else [ip]
+            for target in targets:
+                self.__setpoint.pop(target, None)
+        self.__server.send_batch([(b"rc 0 0 0 0", (target, self.__port)) for target in targets])
+
+    def stop(self):
+        """Hover every tello & stop sender thread."""
+        self.__running = False
+        self.__wake.set()
+        self.__SenderThread.join()
+        self.clear()
+
+    def query_jitter(self):
+        """Lateness of tick(second) over the last 1000 tick. {"p50", "p99", "max"}, None if no tick yet."""
+        samples = sorted(self.__lateness)
+        if not samples:
+            return None
+        return {"p50": samples[len(samples) // 2], "p99": samples[max(int(len(samples) * 0.99) - 1, 0)],
+                "max": samples[-1]}
+
+    def query_setpoint(self):
+        """IP -> rc command being streamed."""
+        with self.__lock:
+            return {ip: item[0].decode("utf-8") for ip, item in self.__setpoint.items()}
+
+    def __sender(self):
+        clock = time.perf_counter
+        tick = clock()
+        while self.__running:
+            # Sleep while nothing to stream, restart schedule on wake.
+            if not self.__setpoint:
+                self.__wake.wait()
+                self.__wake.clear()
+                tick = clock()
+                continue
+            now = clock()
+            if now < tick:
+                time.sleep(tick - now)
+            # Compose batch
+            start = clock()
+            wall = time.time()
+            batch = []
+            with self.__lock:
+                for ip, item in list(self.__setpoint.items()):
+                    if (self.__expire is not None) and (wall - item[1] > self.__expire):
+                        batch.append((b"rc 0 0 0 0", item[3]))
+                        del self.__setpoint[ip]
+                        self.__log.warning(f"Sender - Setpoint expired, hover. - {ip}")
+                        continue
+                    item[2] = True
+                    batch.append((item[0], item[3]))
+            self.__server.send_batch(batch)
+            self.__lateness.append(start - tick)
+            self.tick_count += 1
+            self.sent_count += len(batch)
+            # Next tick on the fixed grid. Skip the missed one instead of bursting.
+            tick += self.__period
+            if clock() - tick > self.__period:
+                missed = int((clock() - tick) / self.__period)
+                self.overrun_count += missed
+                tick += missed * self.__period
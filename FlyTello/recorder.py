@@ -0,0 +1,233 @@
+"""
+Flight recorder. Append every datagram of udp.Server to a binary file, replay it into TelloDB.
+
+Data file: MAGIC, then record = HEADER + payload
+    HEADER "<dB4sHI": time.time(), channel, IPv4(4 bytes), port, payload length
+Index file(data file + ".idx"): INDEX entry per (IPv4, channel) for each index interval
+    INDEX "<dQ4sB": time.time(), offset of first record in data file, IPv4, channel
+Both are little-endian & fixed size, so they can be read straight from mmap.
+"""
+from FlyTello import quicklog
+import atexit  # Flush buffered record on exit
+import bisect  # Seek by time
+import mmap
+import os
+import socket  # IPv4 <-> 4 bytes
+import struct
+import threading
+import time
+import typing
+
+MAGIC = b"FTREC\x01\x00\x00"
+HEADER = struct.Struct("<dB4sHI")
+INDEX = struct.Struct("<dQ4sB")
+# Channel
+COMMAND = 0  # Received on command port, tello answer
+STATUS = 1  # Received on status port
+VIDEO = 2  # Received on video port
+SENT = 3  # Sent to tello
+CHANNEL_NAME = {COMMAND: "command", STATUS: "status", VIDEO: "video", SENT: "sent"}
+
+
+class Recorder:
+    def __init__(self, path: str, index_interval: float = 1, buffer: int = 1048576, debug: bool = False):
+        """
+        Append-only recorder shared by servers. Thread-safe, write is buffered in memory.
+
+        :param path: Data file. Index goes to path + ".idx". Appended if exists.
+        :param index_interval: A new index entry per tello & channel every this(second).
+        :param buffer: Write buffer(bytes).
+        :param debug: Enter debug mode.
+        """
+        "Log"
+        if not debug:
+            self.__log = quicklog.create_log(f"Recorder", 30, False)
+        else:
+            self.__log = quicklog.create_log(f"Recorder", 10, True)
+        "File"
+        self.path = path
+        new = (not os.path.isfile(path)) or (os.path.getsize(path) == 0)
+        self.__data = open(path, "ab", buffering=buffer)
+        self.__index = open(path + ".idx", "ab")
+        if new:
+            self.__data.write(MAGIC)
+        self.__offset = self.__data.tell()
+        "Index"
+        self.__interval = index_interval
+        self.__indexed = {}  # (IPv4, channel) -> Time of last index entry
+        self.__packed_ip = {}  # IP -> 4 bytes
+        self.__lock = threading.Lock()  # Guard file & offset, taken by every server thread
+        "Stats"
+        self.record_count = 0
+        self.byte_count = 0
+        atexit.register(self.close)
+        self.__log.warning(f"Recorder - Initiated. - ['{path}', {index_interval}, {buffer}]")
+
+    def write(self, channel: int, datagram: typing.Union[tuple, list], timestamp: float = None):
+        """Append a datagram (payload, (ip, port)). Payload can be bytes, memoryview or str."""
+        payload, address = datagram
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8", errors="ignore")
+        ip = self.__packed_ip.get(address[0])
+        if ip is None:
+            ip = self.__packed_ip[address[0]] = socket.inet_aton(address[0])
+        size = len(payload)
+        with self.__lock:
+            if self.__data.closed:
+                return
+            if timestamp is None:
+                timestamp = time.time()  # Taken in lock, so file is sorted by time
+            key = (ip, channel)
+            if timestamp - self.__indexed.get(key, float("-inf")) >= self.__interval:
+                self.__indexed[key] = timestamp
+                self.__index.write(INDEX.pack(timestamp, self.__offset, ip, channel))
+            self.__data.write(HEADER.pack(timestamp, channel, ip, address[1], size))
+            self.__data.write(payload)
+            self.__offset += HEADER.size + size
+            self.record_count += 1
+            self.byte_count += HEADER.size + size
+
+    def flush(self):
+        """Push buffered record to disk."""
+        with self.__lock:
+            if not self.__data.closed:
+                self.__data.flush()
+                self.__index.flush()
+
+    def close(self):
+        with self.__lock:
+            if not self.__data.closed:
+                self.__data.close()
+                self.__index.close()
+        self.__log.warning(f"Recorder - Closed. - ['{self.path}', {self.record_count}, {self.byte_count}]")
+
+
+class Replay:
+    def __init__(self, path: str):
+        """
+        Read a recording through mmap.
+
+        :param path: Data file written by Recorder.
+        """
+        self.path = path
+        with open(path, "rb") as file:
+            self.__data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.__data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not a flight recording. - {path}")
+        # Index, sorted by time as written
+        self.__index_time = []
+        self.__index_offset = []
+        self.__index_key = []  # (ip, channel)
+        if os.path.isfile(path + ".idx"):
+            with open(path + ".idx", "rb") as file:
+                raw = file.read()
+            for timestamp, offset, ip, channel in INDEX.iter_unpack(raw[:len(raw) - len(raw) % INDEX.size]):
+                self.__index_time.append(timestamp)
+                self.__index_offset.append(offset)
+                self.__index_key.append((socket.inet_ntoa(ip), channel))
+
+    def close(self):
+        self.__data.close()
+
+    def query_tello(self):
+        """IP that sent anything to control."""
+        return sorted({key[0] for key in self.__index_key if key[1] != SENT})
+
+    def __seek(self, start: float, ip: str):
+        """Offset to scan from. Record is written in time order & every key get an entry once an interval."""
+        if (start is None) or (not self.__index_time):
+            return len(MAGIC)
+        stop = bisect.bisect_left(self.__index_time, start)
+        if ip is None:
+            return self.__index_offset[stop - 1] if stop else len(MAGIC)
+        # Last entry of ip before start per channel, the earliest of them. First entry of ip if none before start.
+        last = {}
+        for position in range(stop):
+            if self.__index_key[position][0] == ip:
+                last[self.__index_key[position][1]] = self.__index_offset[position]
+        if last:
+            return min(last.values())
+        for position in range(stop, len(self.__index_key)):
+            if self.__index_key[position][0] == ip:
+                return self.__index_offset[position]
+        return len(self.__data)
+
+    def records(self, start: float = None, end: float = None, ip: str = None, channel: typing.Iterable = None):
+        """
+        Iterate records as (time, channel, (ip, port), payload memoryview). Oldest first.
+
+        :param start: Skip record older than this(time.time()).
+        :param end: Stop at record newer than this(time.time()).
+        :param ip: Only record of this tello.
+        :param channel: Only record of these channel.
+        """
+        data = self.__data
+        view = memoryview(data)
+        channel = None if channel is None else set(channel)
+        packed = None if ip is None else socket.inet_aton(ip)
+        offset = self.__seek(start, ip)
+        total = len(data)
+        unpack = HEADER.unpack_from
+        names = {}  # 4 bytes -> IP
+        try:
+            while offset + HEADER.size <= total:
+                timestamp, kind, raw_ip, port, size = unpack(data, offset)
+                body = offset + HEADER.size
+                offset = body + size
+                if offset > total:  # Truncated tail of a crashed recording
+                    break
+                if (end is not None) and (timestamp > end):
+                    break
+                if (start is not None) and (timestamp < start):
+                    continue
+                if ((packed is not None) and (raw_ip != packed)) or ((channel is not None) and (kind not in channel)):
+                    continue
+                name = names.get(raw_ip)
+                if name is None:
+                    name = names[raw_ip] = socket.inet_ntoa(raw_ip)
+                yield timestamp, kind, (name, port), view[body:offset]
+        finally:
+            view.release()
+
+    def replay(self, db, speed: float = 1, start: float = None, end: float = None,
+               channel: typing.Iterable = (COMMAND, STATUS, VIDEO)):
+        """
+        Feed recording into TelloDB update_command / update_status / update_video.
+
+        Tello unknown to db is added when its answer to "sn?" shows up, like a live scan.
+        Task isn't replayed, so command answer only reach a task added to db by the caller.
+
+        :param db: tello.TelloDB
+        :param speed: Replay speed, 1 for real time. None for as fast as possible.
+        :return: Record fed per channel name.
+        """
+        channel = set(channel)
+        count = {name: 0 for name in CHANNEL_NAME.values()}
+        asked_sn = set()  # IP sent "sn?" & not answered yet
+        origin = None  # (Recording time, wall time) of the first record
+        for timestamp, kind, address, payload in self.records(start, end):
+            if speed is not None:
+                if origin is None:
+                    origin = (timestamp, time.perf_counter())
+                wait = (timestamp - origin[0]) / speed - (time.perf_counter() - origin[1])
+                if wait > 0:
+                    time.sleep(wait)
+            if kind == SENT:
+                if bytes(payload) == b"sn?":
+                    asked_sn.add(address[0])
+                continue
+            if kind == COMMAND and (address[0] in asked_sn):
+                asked_sn.discard(address[0])
+                sn = str(payload, "utf-8", "ignore").strip()
+                if (not sn.startswith("error")) and (db.info2info(ip=address[0]) is None):
+                    db.add_tello(address[0], sn)
+            if kind not in channel:
+                continue
+            if kind == COMMAND:
+                db.update_command([str(payload, "utf-8", "ignore"), address])
+            elif kind == STATUS:
+                db.update_status([str(payload, "utf-8", "ignore"), address])
+            elif kind == VIDEO:
+                db.update_video([payload, address])
+            count[CHANNEL_NAME[kind]] += 1
+        return count
@@ -0,0 +1,121 @@
+from FlyTello import telemetry
+import time
+
+# Action of a rule
+LAND = "land"
+EMERGENCY = "emergency"  # Stop motor right away, tello falls
+REPORT = "report"  # Log only
+
+
+class Rule:
+    def __init__(self, field: str, op: str, limit: float, action: str = LAND, absolute: bool = False,
+                 name: str = None):
+        """
+        Trip when status field of a tello crosses limit.
+
+        :param field: Key in tello.status_template(). e.g. "bat"
+        :param op: "<" trip below limit, ">" trip above limit.
+        :param limit: Limit of field.
+        :param action: safety.LAND / safety.EMERGENCY / safety.REPORT
+        :param absolute: Compare |value|, e.g. pitch / roll.
+        :param name: Name in log & trip record. Default "field op limit".
+        """
+        if op not in ("<", ">"):
+            raise ValueError(f"Rule - Unknown op. - {op}")
+        if action not in (LAND, EMERGENCY, REPORT):
+            raise ValueError(f"Rule - Unknown action. - {action}")
+        self.field = field
+        self.op = op
+        self.limit = limit
+        self.action = action
+        self.absolute = absolute
+        self.name = name or f"{'|' + field + '|' if absolute else field} {op} {limit}"
+
+    def __repr__(self):
+        return f"Rule({self.name} -> {self.action})"
+
+
+# Default for tello EDU. Altitude limit depends on the room and attitude limit trips on flip, add them yourself.
+DEFAULT_RULES = (
+    Rule("bat", "<", 10, LAND),
+    Rule("temp_max", ">", 85, LAND)
+)
+
+
+class SafetyMonitor:
+    def __init__(self, rules: tuple = DEFAULT_RULES, interval: float = 0.05):
+        """
+        Evaluate rules over the whole fleet at once from TelemetryStore columns.
+
+        Each rule first reduces its column with min / max in C. Only a column crossing the limit is scanned to find
+        which tello it is, so a quiet fleet costs a few C calls per check regardless of size.
+
+        :param rules: Rule to check.
+        :param interval: Check at most once per this(second). Status of every tello arrives every 0.1s.
+        """
+        self.rules = tuple(rules)
+        self.interval = interval
+        self.__next_check = 0
+        self.__tripped = set()  # (Tello index, rule name) already reported, until reset
+        # #Stats
+        self.check_count = 0
+        self.check_time = 0  # Total time spent in check(second)
+
+    def due(self, now: float = None):
+        """True if a check is due. Cheap, call per status."""
+        return (time.time() if now is None else now) >= self.__next_check
+
+    def check(self, store: telemetry.TelemetryStore, now: float = None):
+        """
+        Evaluate every rule on the latest status.
+
+        :return: [(Tello index, Rule)] newly tripped. A trip is reported once until reset().
+        """
+        start = time.perf_counter()
+        self.__next_check = (time.time() if now is None else now) + self.interval
+        tripped = []
+        order = None
+        for rule in self.rules:
+            worst = _worst(store, rule)
+            if (worst is None) or not ((worst < rule.limit) if rule.op == "<" else (worst > rule.limit)):
+                continue
+            # Slow path, find who crossed
+            if order is None:
+                order = store.query_index()
+            for slot, value in enumerate(store.latest(rule.field)):
+                if value != value:  # nan
+                    continue
+                if rule.absolute:
+                    value = abs(value)
+                if (value < rule.limit) if rule.op == "<" else (value > rule.limit):
+                    key = (order[slot], rule.name)
+                    if key not in self.__tripped:
+                        self.__tripped.add(key)
+                        tripped.append((order[slot], rule))
+        self.check_count += 1
+        self.check_time += time.perf_counter() - start
+        return tripped
+
+    def reset(self, index: int = None):
+        """Allow rule to trip again for tello index, every tello if None."""
+        if index is None:
+            self.__tripped.clear()
+        else:
+            self.__tripped = {key for key in self.__tripped if key[0] != index}
+
+    def query_tripped(self):
+        """[(Tello index, rule name)] tripped and not reset."""
+        return sorted(self.__tripped)
+
+
+def _worst(store: telemetry.TelemetryStore, rule: Rule):
+    """Value closest to tripping rule across fleet, None if no data."""
+    if not rule.absolute:
+        return store.fleet_min(rule.field) if rule.op == "<" else store.fleet_max(rule.field)
+    low = store.fleet_min(rule.field)
+    high = store.fleet_max(rule.field)
+    if low is None:
+        return None
+    if rule.op == ">":
+        return max(abs(low), abs(high))
+    return 0 if low <= 0 <= high else min(abs(low), abs(high))
@@ -0,0 +1,356 @@
+"""
+Fleet split over worker processes. Each worker runs its own fly.Control on a part of sn_map, so telemetry, video and
+scheduling of a part has its own interpreter. ShardedControl is the coordinator with the same command API.
+
+Worker n uses port + n * port_step on this host and tells its tello to report there("port" command). With one NIC
+per access point, give each worker its NIC through interface and keep the default port.
+Each worker logs under Log//Shard{n}.
+"""
+from FlyTello import fly, future, quicklog, shm, tello
+from multiprocessing import connection
+import multiprocessing
+import os
+import sys
+import threading
+import typing
+
+
+def _worker(config: dict, conn):
+    """Entry of a worker process. Run fly.Control on config["sn_map"] and serve the coordinator through conn."""
+    os.makedirs(f"Log//Shard{config['no']}", exist_ok=True)
+    os.chdir(f"Log//Shard{config['no']}")
+    sys.stdout = open(os.devnull, "w")  # Task result is reported to coordinator instead
+    port = config["port"]
+    state = shm.FleetState(config["state"], track=True)  # Resource tracker is shared with the coordinator
+    control = fly.Control(config["sn_map"], debug=config["debug"], network=config["network"], cache=config["cache"],
+                          port=port, interface=config["interface"], publish=state)
+    objects = {item.index: item for item in control.TelloDB.query_advance_object_list()}  # Own tello only
+    send_lock = threading.Lock()  # Guard conn, sent from main & response thread
+    task_lock = threading.RLock()  # Guard task map, a task may finish inside exec
+    task_map = {}  # Local task id -> (Task id of coordinator, task list)
+    finished = set()  # Local task id done before exec returned
+
+    def send(message):
+        with send_lock:
+            conn.send(message)
+
+    def on_done(task_id: int):
+        with task_lock:
+            item = task_map.pop(task_id, None)
+            if item is None:
+                finished.add(task_id)
+                return
+        report(task_id, item)
+
+    def report(task_id: int, item: tuple):
+        # Detail is in the order of the task list, a tello may have several item
+        result = [(index, str(cmd), "Evicted from history" if record[1] is None else record[2])
+                  for (cmd, index), record in zip(item[1], control.TelloDB.task_detail(task_id))]
+        send(("done", item[0], result))
+
+    control.TelloDB.task_subscribe(on_done)
+    # Status & video to the ports of this worker
+    if (port[1], port[2]) != (8890, 11111):
+        control.set_report_port(port[1], port[2], list(objects))
+        control.exec()
+    send(("ready", sorted(objects)))
+    # Serve
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message[0] == "exec":
+            _, task_id, task_list, sync, repeat, at = message
+            with task_lock:
+                for cmd, index in task_list:
+                    control._cmd2datagram(cmd, index)
+                local = control.exec(blocking=False, sync=sync, repeat=repeat, at=at).id
+                if local not in finished:
+                    task_map[local] = (task_id, task_list)
+            if local in finished:
+                finished.discard(local)
+                report(local, (task_id, task_list))
+        elif message[0] == "rc":
+            control.stream_rc(*message[1:])
+        elif message[0] == "stop_rc":
+            control.stop_rc(message[1])
+        elif message[0] == "emergency":
+            control.declare_emergency()
+        elif message[0] == "stop":
+            break
+    control.RCStream.stop()
+    state.close()
+
+
+class ShardedControl(fly.CommandSet):
+    def __init__(
+            self,
+            sn_map: dict,
+            shards: typing.Union[int, list] = 2,
+            debug: bool = False,
+            network: str = None,
+            cache: str = "Log//discovery.json",
+            port: tuple = (8889, 8890, 11111),
+            port_step: int = 10,
+            interface: list = None
+    ):
+        """
+        Coordinator of fly.Control in worker processes. Same command API as Control.
+
+        Task is split per worker. id_fulfil is resolved here, so a task may wait for a task of another worker.
+        sync holds within a worker. Across workers the parts are released together once id_fulfil is done.
+
+        Worker is started with spawn, which imports the main module of the caller again. Create ShardedControl under
+        if __name__ == "__main__": in a script, otherwise every worker fails to start.
+
+        :param sn_map: SN to index dictionary.
+        :param shards: Number of worker, tello is split by index in order. Or a list of sn_map, one per worker.
+        :param debug: Enter debug mode.
+        :param network: Network to scan tello. None for network of NIC.
+        :param cache: Path of SN -> IP cache, relative to the log folder of the worker. None to disable.
+        :param port: Local port of command / status / video server of worker 0.
+        :param port_step: Worker n uses port + n * port_step. 0 to use the same port on a NIC per worker.
+        :param interface: IP of the NIC per worker. None for all NIC.
+        """
+        "Log"
+        if not debug:
+            self.__log = quicklog.create_log(f"ShardedControl", 30, False)
+        else:
+            self.__log = quicklog.create_log(f"ShardedControl", 10, True)
+        "Split"
+        if isinstance(shards, int):
+            order = sorted(sn_map, key=lambda sn: sn_map[sn])
+            size = -(-len(order) // shards)
+            shards = [{sn: sn_map[sn] for sn in order[no * size:(no + 1) * size]} for no in range(shards)]
+            shards = [part for part in shards if part]
+        self.State = shm.FleetState(index=sorted(set(sn_map.values())), fields=tuple(tello.status_template()))
+        "Task"
+        self.__lock = threading.RLock()  # Guard task state & pipe
+        self.__task = {}  # Task id -> Task not done
+        self.__task_done = {}  # Task id -> Result [(index, cmd, result)]
+        self.__dependents = {}  # Task id -> Task id waiting for it
+        self.__task_done_condition = threading.Condition()
+        self.__task_callback = []  # Called with task id when done
+        self.__future = {}  # Task id -> TaskFuture not done
+        self.__exec_local = threading.local()  # Exec queue per thread
+        self.__exec_id = 0
+        "Worker"
+        context = multiprocessing.get_context("spawn")  # Fork would copy threads of the caller
+        self.__conn = []
+        self.__process = []
+        self.__shard_of = {}  # Tello index -> Worker no
+        for no, part in enumerate(shards):
+            parent, child = context.Pipe()
+            config = {
+                "no": no,
+                "sn_map": part,
+                "debug": debug,
+                "network": network,
+                "cache": cache,
+                "port": tuple(item + no * port_step for item in port),
+                "interface": None if interface is None else interface[no],
+                "state": self.State.name
+            }
+            process = context.Process(target=_worker, args=(config, child), daemon=True)
+            process.start()
+            self.__conn.append(parent)
+            self.__process.append(process)
+        for no, conn in enumerate(self.__conn):
+            try:
+                _, found = conn.recv()  # Worker returns once its tello are found
+            except EOFError:
+                raise RuntimeError(f'ShardedControl - Worker {no} exited while starting. Check Log//Shard{no}, and '
+                                   f'create ShardedControl under if __name__ == "__main__":') from None
+            for index in found:
+                self.__shard_of[index] = no
+        "Thread"
+        self.__ReceiverThread = threading.Thread(target=self.__receiver)
+        self.__ReceiverThread.daemon = True
+        self.__ReceiverThread.start()
+        self.__log.warning(f"ShardedControl: Initiated. - [{len(self.__conn)}, {network}, {port}, {port_step}, "
+                           f"{interface}, {self.__shard_of}]")
+
+    def close(self):
+        """Stop every worker & free shared memory."""
+        with self.__lock:
+            for conn in self.__conn:
+                try:
+                    conn.send(("stop",))
+                except OSError:
+                    pass
+        for process in self.__process:
+            process.join(5)
+        self.State.close()
+
+    # Command Process
+    @property
+    def __exec_queue(self):
+        """Exec queue of calling thread."""
+        try:
+            return self.__exec_local.queue
+        except AttributeError:
+            self.__exec_local.queue = []
+            return self.__exec_local.queue
+
+    def _exec_queue(self):
+        return self.__exec_queue
+
+    def _has_tello(self, index: int):
+        if index in self.__shard_of:
+            return True
+        self.__log.error(f"Index - Can't find tello[{index}]")
+        return False
+
+    def exec(self, blocking: bool = True, sync: bool = False, repeat: bool = True, id_fulfil: list = (),
+             at: float = None):
+        """
+        Execute cmd in exec queue on the workers & print result when finished.
+
+        :param repeat: Retransmit unanswered command after the RTO of tello to compensate drop packet.
+        :param blocking: Func exit when task finish.
+        :param sync: Ensure all the drones exec the task at the same time.
+        :param id_fulfil: If this exist. The task will start when all the task in given list is done. Task id or
+            future.
+        :param at: The task will not start before this time(time.time()).
+        :return future.TaskFuture of the task, usable as its task id.
+        """
+        task_list = self.__exec_queue
+        self.__exec_local.queue = []
+        id_fulfil = [int(item) for item in id_fulfil]
+        with self.__lock:
+            self.__exec_id += 1
+            task_id = self.__exec_id
+            task_future = future.TaskFuture(task_id)
+            self.__future[task_id] = task_future
+            part = {}  # Worker no -> Task list
+            for item in task_list:
+                part.setdefault(self.__shard_of[item[1]], []).append(item)
+            task = {"id": task_id, "part": part, "sync": sync, "repeat": repeat, "at": at, "pending": 0,
+                    "remaining": len(part), "result": []}
+            self.__task[task_id] = task
+            for id_need in id_fulfil:
+                if id_need not in self.__task_done:
+                    self.__dependents.setdefault(id_need, []).append(task_id)
+                    task["pending"] += 1
+            done = self.__release(task)
+        self.__report(done)
+        self.__log.info(f"Exec - Task[{task_id}] - {task_list}, {blocking}, {sync}, {id_fulfil}, {at}.")
+        if blocking:
+            task_future.result()
+        return task_future
+
+    def __release(self, task: dict):
+        """Send parts of task to worker if nothing pending. Return task id done. Call with lock held."""
+        if task["pending"]:
+            return []
+        if not task["part"]:
+            return self.__complete(task["id"])
+        for no, task_list in task["part"].items():
+            self.__conn[no].send(("exec", task["id"], task_list, task["sync"], task["repeat"], task["at"]))
+        return []
+
+    def __complete(self, task_id: int):
+        """Move task to done & release task depends on it. Return task id done. Call with lock held."""
+        task = self.__task.pop(task_id)
+        self.__task_done[task_id] = sorted(task["result"])
+        done = [task_id]
+        for dependent in self.__dependents.pop(task_id, []):
+            dependent = self.__task[dependent]
+            dependent["pending"] -= 1
+            done += self.__release(dependent)
+        return done
+
+    def __report(self, done: list):
+        """Print result & wake waiter of task done. Call without lock."""
+        for task_id in done:
+            print(self.task_result(task_id))
+            with self.__task_done_condition:
+                self.__task_done_condition.notify_all()
+            for callback in self.__task_callback:
+                callback(task_id)
+            task_future = self.__future.pop(task_id, None)
+            if task_future is not None:
+                task_future.set_result(self.__task_done[task_id])
+
+    def __receiver(self):
+        alive = list(self.__conn)
+        while alive:
+            for conn in connection.wait(alive):
+                try:
+                    message = conn.recv()
+                except EOFError:
+                    alive.remove(conn)
+                    self.__log.error("Receiver - Worker exited.")
+                    continue
+                if message[0] != "done":
+                    continue
+                done = []
+                with self.__lock:
+                    task = self.__task.get(message[1])
+                    if task is None:
+                        continue
+                    task["result"] += message[2]
+                    task["remaining"] -= 1
+                    if task["remaining"] == 0:
+                        done = self.__complete(message[1])
+                self.__report(done)
+
+    # Task
+    def task_subscribe(self, callback: typing.Callable):
+        """Call callback(task_id) once a task is done. Called from the receiver thread."""
+        self.__task_callback.append(callback)
+
+    def task_wait(self, task_id: int, timeout: float = None):
+        """Block until task is done. Return task status."""
+        task_id = int(task_id)
+        with self.__task_done_condition:
+            self.__task_done_condition.wait_for(lambda: task_id in self.__task_done, timeout)
+        return task_id in self.__task_done
+
+    def task_status(self, task_id: int):
+        """Check task status. True for done, False for not yet."""
+        return int(task_id) in self.__task_done
+
+    def task_result(self, task_id: int):
+        """Return the result in formatted str."""
+        msg = f"\nTask[{task_id}] - Done\n"
+        for index, cmd, result in self.__task_done.get(int(task_id), []):
+            status = self.info2status(index)
+            msg += f"Tello[{index}] - {None if status is None else status['bat']} - {cmd} - {result}\n"
+        return msg
+
+    # Fleet
+    def info2status(self, index: int):
+        """Latest status of tello[index] from shared memory, None if not reported yet."""
+        item = self.State.read(index)
+        return None if item is None else item[1]
+
+    def query_shard(self):
+        """Tello index -> Worker no."""
+        return dict(self.__shard_of)
+
+    def declare_emergency(self):
+        """Declare emergency on every worker!"""
+        with self.__lock:
+            for conn in self.__conn:
+                conn.send(("emergency",))
+        self.__log.critical(f"Declared emergency.")
+
+    def stream_rc(self, roll: int, pitch: int, throttle: int, yaw: int, index):
+        """Stream rc setpoint from the worker of tello. See Control.stream_rc."""
+        with self.__lock:
+            for i in ([index] if type(index) == int else index):
+                if i in self.__shard_of:
+                    self.__conn[self.__shard_of[i]].send(("rc", roll, pitch, throttle, yaw, i))
+
+    def stop_rc(self, index=None):
+        """Hover tello and stop its rc stream. Every tello if index is None."""
+        with self.__lock:
+            if index is None:
+                for conn in self.__conn:
+                    conn.send(("stop_rc", None))
+                return
+            for i in ([index] if type(index) == int else index):
+                if i in self.__shard_of:
+                    self.__conn[self.__shard_of[i]].send(("stop_rc", i))
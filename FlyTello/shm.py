@@ -0,0 +1,167 @@
+"""
+Fleet state in multiprocessing.shared_memory, written by the process owning the tello and read by any process.
+
+Layout, little-endian:
+    HEADER "<8sII": MAGIC, slot count, length of layout JSON {"index": [...], "fields": [...]}
+    Layout JSON, padded to 8 bytes
+    Slot * slot count: uint64 sequence, float64 time.time() of status, float64 per field(nan for None)
+Slot n belongs to tello layout["index"][n]. Sequence is even while the slot is stable and odd while it is written
+(seqlock), a reader retries until it reads the same even sequence before and after the copy.
+"""
+from multiprocessing import resource_tracker, shared_memory
+import atexit  # Free created block on exit
+import json
+import math
+import struct
+import time
+
+MAGIC = b"FTSHM\x01\x00\x00"
+HEADER = struct.Struct("<8sII")
+SEQUENCE = struct.Struct("<Q")
+NAN = float("nan")
+SPIN = 16  # Retry before yielding to the writer
+_CREATED = set()  # Name of block created by this process
+
+
+class FleetState:
+    def __init__(self, name: str = None, index: list = None, fields: tuple = None, track: bool = False):
+        """
+        Create a block when index & fields are given, attach to block name otherwise.
+
+        Every slot has one writer. Any number of reader, none of them takes a lock or talks to the writer.
+
+        :param name: Name of the block. None to get one from the OS, see .name.
+        :param index: Tello index per slot.
+        :param fields: Status key per slot, e.g. tuple(tello.status_template()).
+        :param track: On attach, let this process' resource tracker own the block as well. Keep False in a process
+            not started by the creator, or its exit frees the block. True in a child started by multiprocessing.
+        """
+        if index is not None:
+            layout = json.dumps({"index": list(index), "fields": list(fields)}).encode("utf-8")
+            layout += b" " * (-len(layout) % 8)
+            self.__data = struct.Struct(f"<{1 + len(fields)}d")
+            size = HEADER.size + len(layout) + len(index) * (SEQUENCE.size + self.__data.size)
+            self.__memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+            self.__owner = True
+            self.__memory.buf[HEADER.size:HEADER.size + len(layout)] = layout
+            self.__base = HEADER.size + len(layout)
+            empty = SEQUENCE.pack(0) + self.__data.pack(*([NAN] * (1 + len(fields))))
+            for slot in range(len(index)):
+                offset = self.__base + slot * len(empty)
+                self.__memory.buf[offset:offset + len(empty)] = empty
+            HEADER.pack_into(self.__memory.buf, 0, MAGIC, len(index), len(layout))  # Last, block is ready
+            _CREATED.add(self.__memory._name)
+            atexit.register(self.close)
+        else:
+            self.__memory = _attach(name, track)
+            self.__owner = False
+            magic, _, length = HEADER.unpack_from(self.__memory.buf, 0)
+            if magic != MAGIC:
+                self.__memory.close()
+                raise ValueError(f"Not a fleet state block. - {name}")
+            layout = json.loads(bytes(self.__memory.buf[HEADER.size:HEADER.size + length]))
+            index, fields = layout["index"], layout["fields"]
+            self.__data = struct.Struct(f"<{1 + len(fields)}d")
+            self.__base = HEADER.size + length
+        self.name = self.__memory.name
+        self.index = tuple(index)
+        self.fields = tuple(fields)
+        self.__slot = {item: slot for slot, item in enumerate(self.index)}  # Tello index -> Slot
+        self.__size = SEQUENCE.size + self.__data.size
+        self.__seen = {}  # Tello index -> Sequence returned by changed()
+        # #Stats
+        self.retry_count = 0  # Read retried on a slot being written
+
+    # Writer
+    def write(self, index: int, status: dict, timestamp: float = None):
+        """Publish status of tello[index]. False if it has no slot."""
+        slot = self.__slot.get(index)
+        if slot is None:
+            return False
+        buf = self.__memory.buf
+        offset = self.__base + slot * self.__size
+        values = [NAN if status.get(field) is None else status[field] for field in self.fields]
+        sequence = SEQUENCE.unpack_from(buf, offset)[0]
+        SEQUENCE.pack_into(buf, offset, sequence + 1)  # Odd, reader backs off
+        self.__data.pack_into(buf, offset + SEQUENCE.size, time.time() if timestamp is None else timestamp, *values)
+        SEQUENCE.pack_into(buf, offset, sequence + 2)
+        return True
+
+    # Reader
+    def __read(self, slot: int):
+        """(Sequence, values) of a consistent copy of slot."""
+        buf = self.__memory.buf
+        offset = self.__base + slot * self.__size
+        retry = 0
+        while True:
+            before = SEQUENCE.unpack_from(buf, offset)[0]
+            if not before & 1:
+                values = self.__data.unpack_from(buf, offset + SEQUENCE.size)
+                if SEQUENCE.unpack_from(buf, offset)[0] == before:
+                    return before, values
+            self.retry_count += 1
+            retry += 1
+            if retry % SPIN == 0:  # Writer is preempted mid-write
+                time.sleep(0)
+
+    def read(self, index: int):
+        """(time, status dict) of tello[index], None if never published."""
+        slot = self.__slot.get(index)
+        if slot is None:
+            return None
+        sequence, values = self.__read(slot)
+        if sequence == 0:
+            return None
+        return self.__status(values)
+
+    def __status(self, values: tuple):
+        """(time, status dict) from values of a slot."""
+        return values[0], {field: None if math.isnan(value) else value
+                           for field, value in zip(self.fields, values[1:])}
+
+    def snapshot(self):
+        """Tello index -> (time, status dict) of every tello published."""
+        snapshot = {}
+        for index in self.index:
+            item = self.read(index)
+            if item is not None:
+                snapshot[index] = item
+        return snapshot
+
+    def changed(self):
+        """Tello index -> (time, status dict) published since the last call on this object."""
+        changed = {}
+        for slot, index in enumerate(self.index):
+            sequence, values = self.__read(slot)
+            if (sequence != 0) and (self.__seen.get(index) != sequence):
+                self.__seen[index] = sequence
+                changed[index] = self.__status(values)
+        return changed
+
+    def column(self, field: str):
+        """Tello index -> value of one field, None if not published. Skips building the dict per tello."""
+        position = self.fields.index(field) + 1
+        column = {}
+        for slot, index in enumerate(self.index):
+            sequence, values = self.__read(slot)
+            column[index] = None if (sequence == 0) or math.isnan(values[position]) else values[position]
+        return column
+
+    def close(self):
+        """Detach. The creator also frees the block."""
+        if self.__memory.buf is None:
+            return
+        self.__memory.close()
+        if self.__owner:
+            self.__memory.unlink()
+
+
+def _attach(name: str, track: bool):
+    """Open an existing block. Untracked unless asked, resource tracker frees every block it knows on exit."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=track)  # Python 3.13+
+    except TypeError:
+        memory = shared_memory.SharedMemory(name=name)
+        if (not track) and (memory._name not in _CREATED):
+            resource_tracker.unregister(memory._name, "shared_memory")
+        return memory
@@ -0,0 +1,159 @@
+"""
+Choreography. A show is compiled once before the flight: every command is checked against SDK range and every step
+becomes a task(a sync step with a list, one per command) with its dependency mapped to id_fulfil. run() hands all
+task to the scheduler at start, so each datagram is encoded at compile and the next step goes out from the response
+thread, not from the caller.
+
+Show file(JSON, or YAML if PyYAML is installed):
+{
+    "name": "demo",
+    "tello": [1, 2],
+    "steps": [
+        {"id": "pad", "cmd": "mon"},
+        {"id": "up", "cmd": "takeoff", "sync": true},
+        {"id": "cross", "cmd": {"1": "go 100 0 80 50 m1", "2": ["go -100 0 80 50 m1", "cw 90"]}, "at": 10},
+        {"cmd": "land", "after": ["cross"], "sync": true}
+    ]
+}
+Step:
+    cmd: Command for every tello of the step, or tello index -> command. A list runs in order, in a sync step the
+        n-th command of every tello goes out together once every tello is done with the one before.
+    tello: Tello index of the step. Default "tello" of the show.
+    id: Name used in "after". Default step no.
+    after: Step id to wait for. Default the previous step, [] to start with the show.
+    at: Don't start before this(second) after the show start.
+    sync / repeat: As Control.exec. Default false / true.
+"""
+from FlyTello import command, future
+import json
+import time
+
+STEP_KEYS = {"cmd", "tello", "id", "after", "at", "sync", "repeat"}
+
+
+def load(path: str):
+    """Read and compile a show file. .yaml / .yml needs PyYAML."""
+    with open(path, "r", encoding="utf-8") as file:
+        if path.endswith((".yaml", ".yml")):
+            import yaml  # Optional
+            return compile_show(yaml.safe_load(file))
+        return compile_show(json.load(file))
+
+
+def compile_show(show: dict):
+    """
+    Check a show and turn it into Show.
+
+    :param show: Show in the format of module doc.
+    :raise ValueError: Bad step, unknown "after" or command out of SDK range.
+    """
+    default = show.get("tello", [])
+    steps = []
+    ids = {}  # Step id -> Step no
+    for no, step in enumerate(show.get("steps", [])):
+        step_id = str(step.get("id", no))
+        where = f"Show - Step {step_id}"
+        unknown = set(step) - STEP_KEYS
+        if unknown:
+            raise ValueError(f"{where} - Unknown key. - {sorted(unknown)}")
+        if step_id in ids:
+            raise ValueError(f"{where} - Duplicate id.")
+        if "cmd" not in step:
+            raise ValueError(f"{where} - Missing cmd.")
+        # Command per tello
+        if isinstance(step["cmd"], dict):
+            plan = {int(index): cmd for index, cmd in step["cmd"].items()}
+        else:
+            plan = {int(index): step["cmd"] for index in step.get("tello", default)}
+        if not plan:
+            raise ValueError(f"{where} - No tello.")
+        task = []
+        rounds = []  # Task sent one after another. A sync task sends every item at once, so one per command.
+        for index, cmd in plan.items():
+            for no, item in enumerate([cmd] if isinstance(cmd, str) else cmd):
+                try:
+                    task.append((command.parse(item), index))
+                except ValueError as error:
+                    raise ValueError(f"{where} - Tello {index} - {error}") from None
+                if len(rounds) <= no:
+                    rounds.append([])
+                rounds[no].append(task[-1])
+        sync = bool(step.get("sync", False))
+        if (not sync) or (not task):
+            rounds = [task]
+        # Dependency, only on an earlier step so the show can't deadlock
+        after = step.get("after", [steps[-1]["id"]] if steps else [])
+        for need in after:
+            if str(need) not in ids:
+                raise ValueError(f"{where} - after must be an earlier step. - {need}")
+        at = step.get("at")
+        if (at is not None) and (at < 0):
+            raise ValueError(f"{where} - at must not be negative. - {at}")
+        ids[step_id] = no
+        steps.append({
+            "id": step_id,
+            "task": task,
+            "rounds": rounds,
+            "after": [ids[str(need)] for need in after],
+            "at": at,
+            "sync": sync,
+            "repeat": bool(step.get("repeat", True))
+        })
+    return Show(show.get("name", ""), steps)
+
+
+class Show:
+    def __init__(self, name: str, steps: list):
+        """Compiled show. Build with load() or compile_show()."""
+        self.name = name
+        self.steps = steps
+
+    def __len__(self):
+        return len(self.steps)
+
+    def timeline(self):
+        """Tello index -> [(Step id, command)] in order."""
+        timeline = {}
+        for step in self.steps:
+            for cmd, index in step["task"]:
+                timeline.setdefault(index, []).append((step["id"], str(cmd)))
+        return timeline
+
+    def run(self, control, blocking: bool = True, delay: float = 0):
+        """
+        Queue every step on fly.Control at once.
+
+        :param blocking: Return when every step is done.
+        :param delay: Show start is this(second) from now, "at" counts from there.
+        :return: future.TaskFuture per step, of its last task.
+        """
+        start = time.time() + delay
+        task_ids = []
+        for step in self.steps:
+            id_fulfil = [task_ids[no] for no in step["after"]]
+            for task in step["rounds"]:
+                for cmd, index in task:
+                    control._cmd2datagram(cmd, index)
+                id_fulfil = [control.exec(blocking=False, sync=step["sync"], repeat=step["repeat"],
+                                          id_fulfil=id_fulfil, at=start + (step["at"] or 0))]
+            task_ids.append(id_fulfil[0])
+        if blocking:
+            future.wait_all(task_ids)
+        return task_ids
+
+    async def run_async(self, control, blocking: bool = True, delay: float = 0):
+        """run() on fly.AsyncControl."""
+        start = time.time() + delay
+        task_ids = []
+        for step in self.steps:
+            id_fulfil = [task_ids[no] for no in step["after"]]
+            for task in step["rounds"]:
+                for cmd, index in task:
+                    control._cmd2datagram(cmd, index)
+                id_fulfil = [await control.exec(blocking=False, sync=step["sync"], repeat=step["repeat"],
+                                                id_fulfil=id_fulfil, at=start + (step["at"] or 0))]
+            task_ids.append(id_fulfil[0])
+        if blocking:
+            for task_id in task_ids:
+                await control.wait(task_id)
+        return task_ids
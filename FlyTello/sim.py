@@ -0,0 +1,284 @@
+"""
+Local tello simulator. Linux only, each tello binds its own loopback address(127.0.0.x:8889).
+Control must use another local command port, 0.0.0.0:8889 would collide with the fleet.
+
+    fleet = sim.Fleet(size=10).start()
+    control = fly.Control(fleet.sn_map, network=fleet.network, cache=None, port=(18889, 8890, 11111))
+"""
+import heapq  # Timer heap
+import multiprocessing  # Run fleet outside the control process
+import random
+import selectors  # Serve every tello from one thread
+import socket
+import threading
+import time
+
+# Time(second) tello takes before answering. Command not listed answer right away.
+DELAY = {
+    "takeoff": 1,
+    "land": 1,
+    "up": 0.3,
+    "down": 0.3,
+    "left": 0.3,
+    "right": 0.3,
+    "forward": 0.3,
+    "back": 0.3,
+    "cw": 0.3,
+    "ccw": 0.3,
+    "flip": 0.5,
+    "go": 0.5,
+    "curve": 0.8,
+    "jump": 0.8,
+    "reboot": 1
+}
+
+# Answer of query command
+QUERY = {
+    "speed?": "100.0",
+    "time?": "0s",
+    "wifi?": "90",
+    "sdk?": "30",
+    "hardware?": "RMTT",
+    "wifiversion?": "1.0.0",
+    "ap?": "",
+    "ssid?": "RMTT-SIM",
+    "EXT tof?": "tof 100",
+    "EXT version?": "version=v1.0.0.0"
+}
+
+
+class SimTello:
+    def __init__(self, ip: str, sn: str, index: int, status_port: int = 8890, video_port: int = 11111):
+        """State of a simulated tello."""
+        self.ip = ip
+        self.sn = sn
+        self.index = index
+        self.socket = None
+        self.control = None  # IP of control, known after "command"
+        self.status_port = status_port
+        self.video_port = video_port
+        self.video = False
+        self.busy = None  # Command being executed
+        # Flight state, in frame of pad 1(cm)
+        self.x = 0.0
+        self.y = 0.0
+        self.z = 0.0
+        self.yaw = 0.0
+        self.bat = 100.0
+        self.flying = False
+        # Stats
+        self.received = []  # (time.time(), command)
+
+    def status(self):
+        """Status datagram like a tello EDU detecting pad 1."""
+        return (f"mid:1;x:{self.x:.0f};y:{self.y:.0f};z:{self.z:.0f};mpry:0,0,{self.yaw:.0f};pitch:0;roll:0;"
+                f"yaw:{self.yaw:.0f};vgx:0;vgy:0;vgz:0;templ:60;temph:62;tof:{self.z + 10:.0f};h:{self.z:.0f};"
+                f"bat:{self.bat:.0f};baro:180.00;time:0;agx:0.00;agy:0.00;agz:-1000.00;\r\n").encode("utf-8")
+
+    def apply(self, command: str):
+        """Move tello for a completed command."""
+        word = command.split()
+        try:
+            if word[0] == "takeoff":
+                self.flying, self.z = True, 80.0
+            elif word[0] in ("land", "emergency"):
+                self.flying, self.z = False, 0.0
+            elif word[0] in ("up", "down", "left", "right", "forward", "back"):
+                sign = 1 if word[0] in ("up", "right", "forward") else -1
+                axis = {"up": "z", "down": "z", "left": "y", "right": "y", "forward": "x", "back": "x"}[word[0]]
+                setattr(self, axis, getattr(self, axis) + sign * float(word[1]))
+            elif word[0] in ("cw", "ccw"):
+                self.yaw = (self.yaw + (1 if word[0] == "cw" else -1) * float(word[1])) % 360
+            elif word[0] in ("go", "jump"):
+                if len(word) > 5:  # Pad coordinate
+                    self.x, self.y, self.z = float(word[1]), float(word[2]), float(word[3])
+                else:
+                    self.x, self.y, self.z = self.x + float(word[1]), self.y + float(word[2]), self.z + float(word[3])
+            elif word[0] == "curve":
+                if len(word) > 8:
+                    self.x, self.y, self.z = float(word[4]), float(word[5]), float(word[6])
+                else:
+                    self.x, self.y, self.z = self.x + float(word[4]), self.y + float(word[5]), self.z + float(word[6])
+            self.bat = max(self.bat - 0.1, 0)
+        except (IndexError, ValueError):
+            pass
+
+
+def serve(config: dict, conn):
+    """
+    Serve a fleet until "stop" arrives on conn. Run in a thread or process.
+
+    Pipe request: "stats" -> {sn: [(time, command)]}, "stop" -> None
+    """
+    rand = random.Random(config["seed"])
+    selector = selectors.DefaultSelector()
+    fleet = []
+    for sn, index in config["sn_map"].items():
+        tello = SimTello(f"{config['prefix']}{index + 1}", sn, index, config["status_port"],
+                         config["video_port"])
+        tello.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        tello.socket.bind((tello.ip, config["port"]))
+        tello.socket.setblocking(False)
+        selector.register(tello.socket, selectors.EVENT_READ, tello)
+        fleet.append(tello)
+    selector.register(conn, selectors.EVENT_READ, None)
+    timer = []  # Heap of (time, seq, kind, tello, payload)
+    seq = 0
+    delay = dict(DELAY, **config["delay"])
+    frame = b"\x00\x00\x00\x01" + bytes(config["video_size"])
+    now = time.time()
+    heapq.heappush(timer, (now, -1, "status", None, None))
+    if config["video_fps"]:
+        heapq.heappush(timer, (now, -2, "video", None, None))
+    conn.send("ready")
+
+    def reply(tello: SimTello, message: str, address: tuple):
+        if rand.random() >= config["loss"]:
+            tello.socket.sendto(message.encode("utf-8"), address)
+
+    while True:
+        timeout = max(timer[0][0] - time.time(), 0) if timer else None
+        for key, _ in selector.select(timeout):
+            # Pipe request
+            if key.data is None:
+                request = conn.recv()
+                if request == "stop":
+                    for tello in fleet:
+                        tello.socket.close()
+                    conn.send(None)
+                    return
+                conn.send({tello.sn: tello.received for tello in fleet})
+                continue
+            # Command
+            tello = key.data
+            try:
+                data, address = tello.socket.recvfrom(2048)
+            except OSError:
+                continue
+            if rand.random() < config["loss"]:
+                continue
+            command = data.decode("utf-8", errors="ignore").strip()
+            tello.received.append((time.time(), command))
+            word = command.split()
+            if not word:
+                continue
+            if command == "command":
+                tello.control = address[0]
+                reply(tello, "ok", address)
+            elif command == "sn?":
+                reply(tello, tello.sn, address)
+            elif command == "battery?":
+                reply(tello, f"{tello.bat:.0f}", address)
+            elif command in QUERY:
+                reply(tello, QUERY[command], address)
+            elif word[0] == "rc":
+                pass  # No response for rc
+            elif word[0] == "port" and len(word) == 3:
+                tello.status_port, tello.video_port = int(word[1]), int(word[2])
+                reply(tello, "ok", address)
+            elif word[0] in ("streamon", "streamoff"):
+                tello.video = word[0] == "streamon"
+                reply(tello, "ok", address)
+            elif word[0] in ("emergency", "stop"):
+                tello.apply(command)
+                tello.busy = None
+                reply(tello, "ok", address)
+            elif tello.busy is not None:
+                if command != tello.busy:  # Repeated copy of the running command is ignored.
+                    reply(tello, "error Not joystick", address)
+            elif word[0] in delay:
+                tello.busy = command
+                seq += 1
+                heapq.heappush(timer, (time.time() + delay[word[0]], seq, "done", tello, (command, address)))
+            else:
+                reply(tello, "ok", address)
+        # Timer
+        now = time.time()
+        while timer and timer[0][0] <= now:
+            due, _, kind, tello, payload = heapq.heappop(timer)
+            if kind == "done":
+                if tello.busy == payload[0]:
+                    tello.busy = None
+                    tello.apply(payload[0])
+                    reply(tello, "ok", payload[1])
+            elif kind == "status":
+                for tello in fleet:
+                    if tello.control is not None:
+                        tello.socket.sendto(tello.status(), (tello.control, tello.status_port))
+                heapq.heappush(timer, (due + 1 / config["status_rate"], -1, "status", None, None))
+            elif kind == "video":
+                for tello in fleet:
+                    if tello.video and (tello.control is not None):
+                        for start in range(0, len(frame), 1460):
+                            tello.socket.sendto(frame[start:start + 1460], (tello.control, tello.video_port))
+                heapq.heappush(timer, (due + 1 / config["video_fps"], -2, "video", None, None))
+
+
+class Fleet:
+    def __init__(
+            self,
+            size: int = 10,
+            delay: dict = None,
+            loss: float = 0,
+            status_rate: float = 10,
+            video_fps: float = 0,
+            video_size: int = 4000,
+            prefix: str = "127.0.0.",
+            port: int = 8889,
+            status_port: int = 8890,
+            video_port: int = 11111,
+            seed: int = 0
+    ):
+        """
+        Simulated tello fleet. Tello n(1 ~ size) is at {prefix}{n + 1}:{port} with SN "SIM{n:04d}".
+
+        :param size: Number of tello. At most 253 on one prefix.
+        :param delay: Override time(second) before answer per command word. e.g. {"takeoff": 0.1}
+        :param loss: Probability a datagram is dropped, both way.
+        :param status_rate: Status sent per second(Hz).
+        :param video_fps: Synthetic video frame per second after streamon. 0 to disable.
+        :param video_size: Size of synthetic frame(bytes).
+        :param prefix: Address prefix of tello.
+        :param port: Command port of tello.
+        :param status_port: Port on control that status is sent to.
+        :param video_port: Port on control that video is sent to.
+        :param seed: Seed of packet loss.
+        """
+        self.sn_map = {f"SIM{i:04d}": i for i in range(1, size + 1)}
+        self.network = f"{prefix}0/24"
+        self.__config = {
+            "sn_map": self.sn_map,
+            "delay": delay or {},
+            "loss": loss,
+            "status_rate": status_rate,
+            "video_fps": video_fps,
+            "video_size": video_size,
+            "prefix": prefix,
+            "port": port,
+            "status_port": status_port,
+            "video_port": video_port,
+            "seed": seed
+        }
+        self.__conn = None
+        self.__worker = None
+
+    def start(self, process: bool = False):
+        """Serve in a daemon thread, or a separate process to keep its CPU out of the control process."""
+        self.__conn, child = multiprocessing.Pipe()
+        if process:
+            self.__worker = multiprocessing.Process(target=serve, args=(self.__config, child), daemon=True)
+        else:
+            self.__worker = threading.Thread(target=serve, args=(self.__config, child), daemon=True)
+        self.__worker.start()
+        self.__conn.recv()  # Wait until every socket is bound
+        return self
+
+    def stats(self):
+        """Command received per SN. {sn: [(time.time(), command)]}"""
+        self.__conn.send("stats")
+        return self.__conn.recv()
+
+    def stop(self):
+        self.__conn.send("stop")
+        self.__conn.recv()
+        self.__worker.join()
@@ -0,0 +1,133 @@
+import array  # Preallocated typed column
+import bisect  # Search time window in ring
+import time
+import typing
+
+NAN = float("nan")
+
+
+class TelemetryStore:
+    def __init__(self, fields: typing.Sequence = (), slots: int = 1, history: int = 100):
+        """
+        Fleet telemetry in fixed-size columns. Memory is allocated once here.
+
+        Per field:
+            latest - 1 value per drone, the last status received.
+            ring - history values per drone, drone n use [n * history, (n + 1) * history).
+        Missing value is stored as nan and ignored by the queries.
+
+        :param fields: Name of field to store. e.g. keys of tello.status_template()
+        :param slots: Max number of drone.
+        :param history: Status kept per drone. 100 is ~10s when tello report at 10Hz.
+        """
+        self.fields = tuple(fields)
+        self.slots = slots
+        self.history = history
+        # #Slot
+        self.__slot = {}  # Drone index -> Slot no
+        # #Column
+        self.__latest = {field: array.array("d", [NAN]) * slots for field in self.fields}
+        self.__ring = {field: array.array("d", [NAN]) * (slots * history) for field in self.fields}
+        self.__time = array.array("d", [float("-inf")]) * (slots * history)  # Unused entry never in window
+        self.__head = array.array("l", [0]) * slots  # Next write position per drone
+
+    # Slot
+    def add(self, index: int):
+        """Assign a slot to drone. Return False if store is full."""
+        if index in self.__slot:
+            return True
+        if len(self.__slot) >= self.slots:
+            return False
+        self.__slot[index] = len(self.__slot)
+        return True
+
+    def query_index(self):
+        """Drone index in slot order. Position n is the value n of latest()."""
+        return list(self.__slot)
+
+    # Write
+    def record(self, index: int, status: dict, timestamp: float = None):
+        """Store a status dictionary of drone."""
+        slot = self.__slot.get(index)
+        if slot is None:
+            return False
+        if timestamp is None:
+            timestamp = time.time()
+        position = slot * self.history + self.__head[slot]
+        for field in self.fields:
+            value = status.get(field)
+            if value is None:
+                value = NAN
+            self.__latest[field][slot] = value
+            self.__ring[field][position] = value
+        self.__time[position] = timestamp
+        self.__head[slot] = (self.__head[slot] + 1) % self.history
+        return True
+
+    # Read
+    def latest(self, field: str):
+        """Latest value of every drone, in slot order. Zero-copy view, nan if no data."""
+        return memoryview(self.__latest[field])[:len(self.__slot)]
+
+    def __segments(self, slot: int, cutoff: float):
+        """(start, end) of ring that is newer than cutoff, oldest segment first."""
+        base = slot * self.history
+        head = base + self.__head[slot]
+        end = base + self.history
+        segments = []
+        for start, stop in ((head, end), (base, head)):  # Ring is sorted in 2 piece
+            start = bisect.bisect_left(self.__time, cutoff, start, stop)
+            if start < stop:
+                segments.append((start, stop))
+        return segments
+
+    def window(self, index: int, field: str, seconds: float, now: float = None):
+        """Values of drone within last seconds. Oldest first."""
+        slot = self.__slot.get(index)
+        if slot is None:
+            return []
+        cutoff = (time.time() if now is None else now) - seconds
+        ring = self.__ring[field]
+        values = []
+        for start, stop in self.__segments(slot, cutoff):
+            values.extend(ring[start:stop])
+        return [value for value in values if value == value]  # Drop nan
+
+    def fleet_min(self, field: str, seconds: float = None, now: float = None):
+        """Min value across fleet. Latest value only if seconds is None, else within last seconds."""
+        return _reduce(min, self.__columns(field, seconds, now))
+
+    def fleet_max(self, field: str, seconds: float = None, now: float = None, absolute: bool = False):
+        """Max value (or max |value|) across fleet. Latest value only if seconds is None, else within last seconds."""
+        columns = self.__columns(field, seconds, now)
+        if not absolute:
+            return _reduce(max, columns)
+        high = _reduce(max, columns)
+        low = _reduce(min, columns)
+        if high is None:
+            return None
+        return max(abs(high), abs(low))
+
+    def __columns(self, field: str, seconds: float, now: float):
+        """Zero-copy views of the values to reduce."""
+        if seconds is None:
+            return [self.latest(field)]
+        cutoff = (time.time() if now is None else now) - seconds
+        ring = memoryview(self.__ring[field])
+        return [ring[start:stop] for slot in range(len(self.__slot)) for start, stop in self.__segments(slot, cutoff)]
+
+
+def _reduce(func, columns: list):
+    """Apply min / max over columns in C. Only fall back to filter nan when it shows up."""
+    result = []
+    for column in columns:
+        if len(column) == 0:
+            continue
+        value = func(column)
+        if value != value:  # nan at the front poison min / max
+            column = [item for item in column if item == item]
+            if not column:
+                continue
+            value = func(column)
+        result.append(value)
+    return func(result) if result else None
@@ -1,7 +1,17 @@
+from FlyTello import command  # Pre-encoded command
+from FlyTello import planner  # Collision precheck
 from FlyTello import quicklog  # Logger setup script
+from FlyTello import safety  # Fleet safety rule
+from FlyTello import shm  # Shared memory fleet state
+from FlyTello import telemetry  # Fleet status history
+from FlyTello import video  # H.264 frame reassembly
 import typing  # Union type
+import collections  # Ordered task history
+import json  # Spill task history
+import functools  # Spill encoder
+import heapq  # Timer heap
+import threading  # Scheduler lock
 import time
-import io  # Provide binary stream type
 
 
 def status_template():
@@ -34,86 +44,196 @@ def status_template():
     return template
 
 
-def format_status(status: str):
-    """Format status from str to dictionary."""
-    status = status.split(";")
-    # Template
-    template = status_template()
-    # Process
-    for item in status:
+# Status key from tello -> Key in status_template. "mpry" is handled separately.
+STATUS_KEYS = {
+    "mid": "pad",
+    "x": "pad_x",
+    "y": "pad_y",
+    "z": "pad_z",
+    "pitch": "pitch",
+    "roll": "roll",
+    "yaw": "yaw",
+    "vgx": "vgx",
+    "vgy": "vgy",
+    "vgz": "vgz",
+    "templ": "temp_min",
+    "temph": "temp_max",
+    "tof": "tof",
+    "h": "height",
+    "bat": "bat",
+    "baro": "barometer",
+    "time": "time",
+    "agx": "agx",
+    "agy": "agy",
+    "agz": "agz"
+}
+
+
+# Command answered right away, RTT is measured on these. Others answer after the motion is done.
+INSTANT = {
+    "command", "speed", "wifi", "mon", "moff", "mdirection", "ap", "streamon", "streamoff", "motoron",
+    "motoroff", "stop", "emergency", "port", "setfps", "setbitrate", "setresolution", "multiwifi", "downvision", "EXT"
+}
+INSTANT_TIMEOUT = 3  # Timeout of instant command(second), retransmit keeps going until then.
+# Timeout of non-instant command(second) by first word. (Base, extra per unit of first argument)
+# go / curve / jump add their flight time(path length / speed) to the base instead.
+TIMEOUT = {
+    "takeoff": (15, 0),
+    "land": (15, 0),
+    "up": (3, 0.05),
+    "down": (3, 0.05),
+    "left": (3, 0.05),
+    "right": (3, 0.05),
+    "forward": (3, 0.05),
+    "back": (3, 0.05),
+    "cw": (3, 0.03),
+    "ccw": (3, 0.03),
+    "flip": (5, 0),
+    "go": (15, 0),
+    "curve": (20, 0),
+    "jump": (20, 0),
+    "reboot": (20, 0)
+}
+DEFAULT_TIMEOUT = 8
+# Retransmit timer(second). RFC 6298 with a lower floor, tello answer in a few ms on a quiet channel.
+RTO_INIT = 0.3
+RTO_MIN = 0.02
+RTO_MAX = 1
+LOSS_REPEAT = 0.01  # Estimated loss above this get a repeat copy of non-instant command.
+
+
+def is_instant(cmd: str):
+    """True if tello answer cmd right away instead of after the motion."""
+    return cmd.endswith("?") or (cmd.split(" ", 1)[0] in INSTANT)
+
+
+def command_timeout(cmd: str):
+    """Time(second) to wait for the answer of cmd."""
+    if is_instant(cmd):
+        return INSTANT_TIMEOUT
+    word = cmd.split()
+    base, extra = TIMEOUT.get(word[0], (DEFAULT_TIMEOUT, 0)) if word else (DEFAULT_TIMEOUT, 0)
+    flight = planner.flight_time(cmd)
+    if flight is not None:
+        return base + flight
+    try:
+        return base + extra * abs(float(word[1])) if extra else base
+    except (IndexError, ValueError):
+        return base
+
+
+def format_status(status: str, template: dict = None):
+    """
+    Format status from str to dictionary.
+
+    :param status: Status datagram. e.g. "mid:-1;x:-100;...;agz:-999.00;\r\n"
+    :param template: Write into this dictionary in place instead of a new one. Missing key keeps old value.
+    :return: Status dictionary.
+    """
+    if template is None:
+        template = status_template()
+    keys = STATUS_KEYS
+    for item in status.split(";"):
+        key, _, value = item.partition(":")
         try:
-            item = item.split(":")
-            if item[0] == "mid":
-                template["pad"] = float(item[1])
-            elif item[0] == "x":
-                template["pad_x"] = float(item[1])
-            elif item[0] == "y":
-                template["pad_y"] = float(item[1])
-            elif item[0] == "z":
-                template["pad_z"] = float(item[1])
-            elif item[0] == "mpry":
-                data = item[1].split(",")
-                template["pad_pitch"] = float(data[0])
-                template["pad_roll"] = float(data[1])
-                template["pad_yaw"] = float(data[2])
-            elif item[0] == "pitch":
-                template["pitch"] = float(item[1])
-            elif item[0] == "roll":
-                template["roll"] = float(item[1])
-            elif item[0] == "yaw":
-                template["yaw"] = float(item[1])
-            elif item[0] == "vgx":
-                template["vgx"] = float(item[1])
-            elif item[0] == "vgy":
-                template["vgy"] = float(item[1])
-            elif item[0] == "vgz":
-                template["vgz"] = float(item[1])
-            elif item[0] == "templ":
-                template["temp_min"] = float(item[1])
-            elif item[0] == "temph":
-                template["temp_max"] = float(item[1])
-            elif item[0] == "tof":
-                template["tof"] = float(item[1])
-            elif item[0] == "h":
-                template["height"] = float(item[1])
-            elif item[0] == "bat":
-                template["bat"] = float(item[1])
-            elif item[0] == "baro":
-                template["barometer"] = float(item[1])
-            elif item[0] == "time":
-                template["time"] = float(item[1])
-            elif item[0] == "agx":
-                template["agx"] = float(item[1])
-            elif item[0] == "agy":
-                template["agy"] = float(item[1])
-            elif item[0] == "agz":
-                template["agz"] = float(item[1])
-        except IndexError:
-            pass
+            name = keys.get(key)
+            if name is not None:
+                template[name] = float(value)
+            elif key == "mpry":
+                pitch, roll, yaw = value.split(",")
+                template["pad_pitch"] = float(pitch)
+                template["pad_roll"] = float(roll)
+                template["pad_yaw"] = float(yaw)
         except ValueError:
             pass
     return template
 
 
+class TaskHistory:
+    def __init__(self, max_size: int = 1000, max_age: float = None, spill: str = None, tag: dict = None):
+        """
+        Done task record keyed by task id, or (task id, item no) per tello. Oldest evicted first(LRU).
+
+        :param max_size: Record kept in memory. None for unlimited.
+        :param max_age: Evict record older than this(second). None for never.
+        :param spill: Append evicted record to this file as json lines, through quicklog.async_writer. None to drop.
+        :param tag: Extra key added to spilled record. e.g. {"tello": 1}
+        """
+        self.__record = collections.OrderedDict()  # Task id -> (Time added, record)
+        self.__max_size = max_size
+        self.__max_age = max_age
+        self.__spill = None  # write(record), off the scheduler thread
+        if spill is not None:
+            self.__spill = quicklog.async_writer(spill, functools.partial(json.dumps, default=str))
+        self.__tag = tag or {}
+
+    def __contains__(self, key: typing.Union[int, tuple]):
+        return key in self.__record
+
+    def __len__(self):
+        return len(self.__record)
+
+    def __reversed__(self):
+        """Key from the most recently used."""
+        return reversed(self.__record)
+
+    def add(self, key: typing.Union[int, tuple], record: dict):
+        """Add or replace record of key, then evict."""
+        self.__record[key] = (time.time(), record)
+        self.__record.move_to_end(key)
+        self.evict()
+
+    def get(self, key: typing.Union[int, tuple], default=None):
+        """Record of key. Mark it as recently used."""
+        try:
+            self.__record.move_to_end(key)
+        except KeyError:
+            return default
+        return self.__record[key][1]
+
+    def evict(self):
+        """Drop record over max_size or older than max_age. Spill them if configured, written off this thread."""
+        evicted = 0
+        while self.__record:
+            task_id, (added, record) = next(iter(self.__record.items()))
+            too_many = (self.__max_size is not None) and (len(self.__record) > self.__max_size)
+            too_old = (self.__max_age is not None) and (time.time() - added > self.__max_age)
+            if not (too_many or too_old):
+                break
+            self.__record.popitem(last=False)
+            evicted += 1
+            if self.__spill is not None:
+                self.__spill(dict(self.__tag, id=task_id, time=added, record=record))
+        return evicted
+
+
 class Tello:
-    def __init__(self, ip: str, sn: str, index: int):
+    def __init__(self, ip: str, sn: str, index: int, task_history: TaskHistory = None):
         """Tello object - data holder"""
         # Basic Info
         self.__ip = ip
         self.__sn = sn
         self.__index = index
+        self.address = (ip, 8889)  # Command destination, built once
         # Task control related
         self.__cmd = ""
         self.busy_time = 0
         self.__task_id = 0
-        self.__task_done = []
+        self.__item_no = 0
+        self.__task_done = TaskHistory() if task_history is None else task_history  # (Task id, item no) -> Result
         self.busy = False  # Indicates executing command
         # Control setting
         self.hold = False  # Set to on hold.
+        # Link estimate
+        self.__srtt = None  # Smoothed RTT(second)
+        self.__rttvar = None  # RTT variation(second)
+        self.__rto = RTO_INIT  # Retransmit timeout(second)
+        self.__loss = LOSS_REPEAT * 10  # Estimated loss, start pessimistic so early command get a repeat copy
+        self.__rtt_sample = 0
         # Status - Ref to official doc
         self.__status = status_template()
         # Video Frame
-        self.video_stream = io.BytesIO()
+        self.video_stream = video.VideoStream()
 
     # Control setting
     def set_hold(self, hold: bool = False):
@@ -121,19 +241,22 @@ class Tello:
         self.hold = hold
 
     # Task related function
-    def task_exec(self, task_id: int, task_cmd: str):
-        """Update task info."""
+    def task_exec(self, task_id: int, task_cmd: str, item_no: int = 0):
+        """Update task info. A task may hold several item for one tello, item no tells them apart."""
         self.__cmd = task_cmd
         self.__task_id = task_id
+        self.__item_no = item_no
         self.busy_time = time.time()
         self.busy = True
 
     def task_exec_result(self, result: str):
         """Update task exec result."""
         # Add record to __task_done
-        self.__task_done.append(
+        self.__task_done.add(
+            (self.__task_id, self.__item_no),
             {
                 "id": self.__task_id,
+                "no": self.__item_no,
                 "cmd": self.__cmd,
                 "result": result
             }
@@ -141,21 +264,63 @@ class Tello:
         # Set indicator
         self.busy = False
 
-    def task_query_status(self, task_id: int):
-        """Ask task status."""
-        for item in self.__task_done:
-            if item["id"] == task_id:
-                return True
-        return False
+    def task_record(self, task_id: int, task_cmd: str, result: str, item_no: int = 0):
+        """Add result of a task item never sent, running task is untouched."""
+        self.__task_done.add((task_id, item_no), {"id": task_id, "no": item_no, "cmd": task_cmd, "result": result})
 
-    def task_query_result(self, task_id: int):
-        """Get task result."""
-        for item in reversed(self.__task_done):
-            if item["id"] == task_id:
-                return item
-        return False
+    def task_query_status(self, task_id: int, item_no: int = None):
+        """Ask task status. Any item of the task on this tello if item_no is None."""
+        return self.task_query_result(task_id, item_no) is not False
+
+    def task_query_result(self, task_id: int, item_no: int = None):
+        """Get task result. The latest item of the task on this tello if item_no is None."""
+        task_id = int(task_id)
+        if item_no is None:
+            item_no = next((key[1] for key in reversed(self.__task_done) if key[0] == task_id), None)
+        return self.__task_done.get((task_id, item_no), False)
+
+    # Link estimate
+    def link_sample(self, rtt: float):
+        """Add an RTT sample(second). Only from command sent once, answered right away(Karn's rule)."""
+        if self.__srtt is None:
+            self.__srtt = rtt
+            self.__rttvar = rtt / 2
+        else:
+            self.__rttvar = 0.75 * self.__rttvar + 0.25 * abs(self.__srtt - rtt)
+            self.__srtt = 0.875 * self.__srtt + 0.125 * rtt
+        self.__rto = min(max(self.__srtt + 4 * self.__rttvar, RTO_MIN), RTO_MAX)
+        self.__rtt_sample += 1
+
+    def link_loss(self, lost: bool):
+        """Add an outcome of a command: lost if it needed retransmit or timed out."""
+        self.__loss = 0.9 * self.__loss + 0.1 * lost
+
+    @property
+    def rto(self):
+        return self.__rto
+
+    @property
+    def loss(self):
+        return self.__loss
+
+    def get_link(self):
+        """Get link estimate of tello."""
+        return {"srtt": self.__srtt, "rttvar": self.__rttvar, "rto": self.__rto, "loss": self.__loss,
+                "sample": self.__rtt_sample}
 
     # Get info
+    @property
+    def ip(self):
+        return self.__ip
+
+    @property
+    def sn(self):
+        return self.__sn
+
+    @property
+    def index(self):
+        return self.__index
+
     def get_basic_info(self):
         """Get basic info of tello."""
         return {"ip": self.__ip, "sn": self.__sn, "index": self.__index}
@@ -173,178 +338,534 @@ class Tello:
         """Update status dictionary with a new one."""
         self.__status = status
 
-    def update_video(self, frame: bytes):
-        """Update the video stream."""
-        self.video_stream.write(frame)
+    def update_video(self, packet: bytes):
+        """Update the video stream with a packet."""
+        return self.video_stream.feed(packet)
 
 
 class TelloDB:
-    def __init__(self, sn_map: dict, debug: bool = True):
-        """A class to manage tello data and task exec."""
+    def __init__(
+            self,
+            sn_map: dict,
+            debug: bool = True,
+            history: int = 100,
+            task_history: int = 1000,
+            task_age: float = None,
+            task_spill: str = None,
+            safety_rules: tuple = None,
+            planner: "planner.Planner" = None,
+            publish: typing.Union[bool, str, shm.FleetState] = None
+    ):
+        """
+        A class to manage tello data and task exec.
+
+        :param sn_map: SN to index dictionary.
+        :param debug: Enter debug mode.
+        :param history: Status kept per tello in Telemetry.
+        :param task_history: Done task kept in memory, per tello and for TelloDB. None for unlimited.
+        :param task_age: Evict done task older than this(second). None for never.
+        :param task_spill: Append evicted task to this json lines file. None to drop.
+        :param safety_rules: Rule checked on status stream, e.g. safety.DEFAULT_RULES. None to disable.
+        :param planner: Collision precheck of task before it is sent, e.g. planner.Planner(). None to disable.
+        :param publish: Publish the latest status of every tello to shared memory for other process, see State.
+            True for a new block, str for a new block of that name, shm.FleetState to write into. None to disable.
+        """
         "Log"
         if not debug:
             self.__log = quicklog.create_log(f"TelloDB", 30, False)
         else:
             self.__log = quicklog.create_log(f"TelloDB", 10, True)
+        self.__debug = debug  # Per packet log is only composed in debug mode
         "Basic"
         self.__sn_map = sn_map  # SN to index dictionary.
         self.__TelloObjects = []  # List holding tello object.
+        self.__ip2tello = {}  # Index: IP -> tello object
+        self.__sn2tello = {}  # Index: SN -> tello object
+        self.__index2tello = {}  # Index: Index -> tello object
+        self.Telemetry = telemetry.TelemetryStore(tuple(status_template()), len(set(sn_map.values())), history)
+        if isinstance(publish, shm.FleetState) or not publish:
+            self.State = publish or None
+        else:
+            self.State = shm.FleetState(None if publish is True else publish, sorted(set(sn_map.values())),
+                                        tuple(status_template()))
         "Task"
-        self.__task_status = {}  # Task id -> Status
-        self.__task_done = []  # Task that is done
-        self.__task_work = []  # Active task
+        self.__lock = threading.RLock()  # Guard scheduler state, taken by every entry below
+        self.__task_last = 0  # Highest task id added. Task id is given in increasing order, as Control does.
+        self.__task_history = (task_history, task_age, task_spill)  # Retention of TaskHistory
+        self.__task_done = TaskHistory(*self.__task_history)  # Task id -> Task that is done
+        self.__task_work = {}  # Task id -> Active task
+        self.__task_done_condition = threading.Condition()
+        self.__task_callback = []  # Called with task id when done
+        "Scheduler"
+        self.__dependents = {}  # Task id -> Task id waiting for it
+        self.__waiting = {}  # Tello index -> [(Task id, item no)] not sent yet
+        self.__running = {}  # Tello index -> [(Task id, item no)] sent, waiting response
+        self.__hold = set()  # Tello index held from dispatch(e.g. takeoff error)
+        self.__guard = {}  # Tello index -> [Unanswered copy, deadline]. Held until stale answer absorbed.
+        self.__timer = []  # Heap of (deadline, seq, kind, tello index, entry)
+        self.__timer_seq = 0
+        "Safety"
+        self.Safety = None if safety_rules is None else safety.SafetyMonitor(safety_rules)
+        self.__tripped = {}  # Tello index -> Rule tripped. Nothing is dispatched until safety_reset.
+        "Planner"
+        self.Planner = planner
         "Log"
         self.__log.warning(f"TelloDB - Initiated. - [{sn_map}, {debug}]")
 
+    "Scheduler"
+    def __dispatch(self, index: int, out: dict):
+        """Send the first ready task waiting for tello[index]. Call with lock held."""
+        tello = self.__index2tello.get(index)
+        if index in self.__tripped:
+            self.__abort(index, f"Safety - {self.__tripped[index].name}", out)
+            return
+        if (tello is None) or tello.busy or (index in self.__hold) or (index in self.__guard):
+            return
+        for task_id, item_no in self.__waiting[index]:
+            task = self.__task_work[task_id]
+            # Determine if id_fulfil is ok
+            if task["pending"]:
+                continue
+            # Non sync task: Only this tello
+            if not task["sync"]:
+                if not self.__plan(task, [item_no], out):
+                    return
+                self.__waiting[index].remove((task_id, item_no))
+                self.__send(task, [item_no], out)
+                return
+            # Sync task: Every related tello is idle. A tripped one aborts the task as a whole.
+            related = task["tello"]
+            tripped = [i for i in related if i in self.__tripped]
+            if tripped:
+                self.__abort(tripped[0], f"Safety - {self.__tripped[tripped[0]].name}", out)
+                self.__dispatch(index, out)
+                return
+            if all((not self.__index2tello[i].busy) and (i not in self.__hold) and (i not in self.__guard)
+                   for i in related):
+                if not self.__plan(task, range(len(task["task"])), out):
+                    return
+                for i in set(related):
+                    self.__waiting[i] = [entry for entry in self.__waiting[i] if entry[0] != task_id]
+                self.__send(task, range(len(task["task"])), out)
+                return
+
+    def __position(self, index: int):
+        """(x, y, z, yaw) of tello[index] in pad frame, None if no pad in sight."""
+        status = self.__index2tello[index].get_status()
+        if (status["pad"] is None) or (status["pad"] < 1):
+            return None
+        return status["pad_x"], status["pad_y"], status["pad_z"], status["pad_yaw"] or 0
+
+    def __plan(self, task: dict, item_no: typing.Iterable, out: dict):
+        """Collision precheck of items about to be sent. False if they must not be sent now. Call with lock held."""
+        if self.Planner is None:
+            return True
+        items = [(task["task"][no][1], task["task"][no][0], self.__position(task["task"][no][1])) for no in item_no]
+        static = {tello.index: self.__position(tello.index) for tello in self.__TelloObjects}
+        conflict = self.Planner.check(items, static)
+        if not conflict:
+            return True
+        now = time.time()
+        first = "plan_deadline" not in task
+        if first:
+            task["plan_deadline"] = now + self.Planner.stagger
+            self.__log.warning(f"Planner - Task {task['id']} conflict. - {conflict}")
+        if self.Planner.mode == planner.REPORT:
+            return True
+        # Conflict inside the task won't clear by waiting.
+        own = set(task["tello"])
+        if (self.Planner.mode == planner.STAGGER) and (now < task["plan_deadline"]) and \
+                not all((a in own) and (b in own) for a, b, _, _ in conflict):
+            if not task.get("plan_retry"):
+                task["plan_retry"] = True
+                self.__timer_add(self.Planner.dt * 2, "plan", None, task["id"])
+            return False
+        # Reject
+        result = f"Conflict - {[(a, b) for a, b, _, _ in conflict]}"
+        self.__log.warning(f"Planner - Task {task['id']} rejected. - {result}")
+        for no in item_no:
+            index = task["task"][no][1]
+            if (task["id"], no) in self.__waiting[index]:
+                self.__waiting[index].remove((task["id"], no))
+                self.__record(task, no, result)
+                task["remaining"] -= 1
+        if task["remaining"] == 0:
+            self.__complete(task["id"], out)
+        for index in set(task["task"][no][1] for no in item_no):
+            self.__dispatch(index, out)
+        return False
+
+    def __send(self, task: dict, item_no: typing.Iterable, out: dict):
+        """Compose datagram of task items & mark tello busy. Call with lock held."""
+        now = time.time()
+        group = task["group"]
+        rto = None  # Retransmit timer of a group task, the slowest link of the group
+        for no in item_no:
+            cmd, index = task["task"][no]
+            tello = self.__index2tello[index]
+            out["datagram"].append((task["payload"][no], tello.address))
+            if not self.__running[index]:
+                tello.task_exec(task["id"], cmd, no)
+                if self.Planner is not None:
+                    self.Planner.begin(index, cmd, self.__position(index), now)
+            self.__running[index].append((task["id"], no))
+            task["sent"][no] = now
+            task["copies"][no] = 1
+            # Retransmit instant command after RTO. Motion only on a lossy link, a lost one would cost the timeout.
+            repeat = task["repeat"] and (task["instant"][no] or (tello.loss > LOSS_REPEAT))
+            if group:
+                if repeat:
+                    rto = tello.rto if rto is None else max(rto, tello.rto)
+                continue
+            self.__timer_add(command_timeout(cmd), "timeout", index, (task["id"], no))
+            if repeat:
+                self.__timer_add(tello.rto, "retransmit", index, (task["id"], no))
+        if group:
+            # One timer for the whole group instead of one per tello
+            self.__timer_add(command_timeout(task["task"][0][0]), "group_timeout", None, task["id"])
+            if rto is not None:
+                self.__timer_add(rto, "group_retransmit", None, task["id"])
+
+    def __retransmit(self, index: int, entry: tuple, out: dict):
+        """Resend a running item that hasn't been answered. Instant command keep backing off. Call with lock held."""
+        if entry not in self.__running[index]:
+            return
+        task = self.__task_work[entry[0]]
+        tello = self.__index2tello[index]
+        out["datagram"].append((task["payload"][entry[1]], tello.address))
+        task["copies"][entry[1]] += 1
+        if task["instant"][entry[1]]:
+            self.__timer_add(min(tello.rto * 2 ** (task["copies"][entry[1]] - 1), RTO_MAX), "retransmit", index,
+                             entry)
+        self.__log.info(f"Retransmit - Tello {index} - [{entry}, {task['copies'][entry[1]]}]")
+
+    def __group_retransmit(self, task_id: int, out: dict):
+        """Resend a group task to every tello that hasn't answered, in one burst. Call with lock held."""
+        task = self.__task_work.get(task_id)
+        if task is None:
+            return
+        rto, copies, resent = 0, 0, 0
+        for no, index in enumerate(task["tello"]):
+            running = self.__running[index]
+            if (not running) or (running[0] != (task_id, no)):  # Answered
+                continue
+            tello = self.__index2tello[index]
+            if task["instant"][no] or (tello.loss > LOSS_REPEAT):
+                out["datagram"].append((task["payload"][no], tello.address))
+                task["copies"][no] += 1
+                rto, copies, resent = max(rto, tello.rto), max(copies, task["copies"][no]), resent + 1
+        if resent and task["instant"][0]:
+            self.__timer_add(min(rto * 2 ** (copies - 1), RTO_MAX), "group_retransmit", None, task_id)
+        self.__log.info(f"Retransmit - Group {task_id} - [{resent}, {copies}]")
+
+    def __finish(self, index: int, result: str, out: dict):
+        """Tello[index] finished the running item with result. Call with lock held."""
+        tello = self.__index2tello[index]
+        task_id, no = self.__running[index].pop(0)
+        task = self.__task_work[task_id]
+        if task["group"]:  # Answer goes into the group record
+            task["result"][no] = result
+            tello.busy = False
+        else:
+            tello.task_exec_result(result)
+        # Link estimate. RTT from instant command sent once only(Karn's rule).
+        copies = task["copies"][no]
+        if result != "Timeout":
+            if (copies == 1) and task["instant"][no]:
+                tello.link_sample(time.time() - task["sent"][no])
+            if copies > 1:  # Hold until the answer of the other copy is absorbed, it'd be taken as the next one's.
+                self.__guard[index] = [copies - 1, time.time() + tello.rto]
+                self.__timer_add(tello.rto, "guard", index, None)
+        if task["instant"][no] or (copies == 1) or (result == "Timeout"):
+            tello.link_loss((copies > 1) or (result == "Timeout"))
+        if self.Planner is not None:
+            self.Planner.end(index)
+        if self.__running[index]:  # Sync task sent more than 1 item to this tello
+            next_id, next_no = self.__running[index][0]
+            tello.task_exec(next_id, self.__task_work[next_id]["task"][next_no][0], next_no)
+            if self.Planner is not None:
+                self.Planner.begin(index, self.__task_work[next_id]["task"][next_no][0], self.__position(index))
+        # Wait tello release lock
+        if ("error" in result) and ("takeoff" in task["task"][no][0]):
+            self.__hold.add(index)
+            self.__timer_add(2, "release", index, None)
+        # Task done
+        task["remaining"] -= 1
+        if task["remaining"] == 0:
+            self.__complete(task_id, out)
+        self.__dispatch(index, out)
+
+    def __abort(self, index: int, result: str, out: dict):
+        """
+        Finish every item of tello[index] with result. Sync task with it is aborted as a whole. Call with lock held.
+        """
+        while self.__running[index]:
+            self.__finish(index, result, out)
+        for task_id, _ in list(self.__waiting[index]):
+            task = self.__task_work.get(task_id)
+            if task is None:
+                continue
+            for no, related in enumerate(task["tello"]):
+                if ((related == index) or task["sync"]) and ((task_id, no) in self.__waiting[related]):
+                    self.__waiting[related].remove((task_id, no))
+                    self.__record(task, no, result)
+                    task["remaining"] -= 1
+            if task["remaining"] == 0:
+                self.__complete(task_id, out)
+
+    def __record(self, task: dict, no: int, result: str):
+        """Result of a task item never sent. Call with lock held."""
+        if task["group"]:
+            task["result"][no] = result
+        else:
+            self.__index2tello[task["task"][no][1]].task_record(task["id"], task["task"][no][0], result, no)
+
+    def __trip(self, index: int, rule: safety.Rule, out: dict):
+        """Fast path of a tripped rule. Action goes out ahead of any task. Call with lock held."""
+        tello = self.__index2tello.get(index)
+        self.__log.critical(f"Safety - Tello {index} tripped. - {rule}")
+        if (tello is None) or (rule.action == safety.REPORT):
+            return
+        payload = rule.action.encode("utf-8")
+        out["datagram"].extend([(payload, tello.address)] * 3)  # Prevent drop package, tello ignore the rest
+        self.__tripped[index] = rule
+        self.__abort(index, f"Safety - {rule.name}", out)
+
+    def __complete(self, task_id: int, out: dict):
+        """Move task to done & release task depends on it. Call with lock held."""
+        task = self.__task_work.pop(task_id)
+        self.__task_done.add(task_id, task)
+        out["done"].append(task_id)
+        for dependent in self.__dependents.pop(task_id, []):
+            dependent = self.__task_work.get(dependent)
+            if dependent is None:  # Aborted while waiting for this one
+                continue
+            dependent["pending"] -= 1
+            if dependent["pending"] == 0:
+                for index in set(dependent["tello"]):
+                    self.__dispatch(index, out)
+
+    def __timer_add(self, delay: float, kind: str, index: int, entry):
+        self.__timer_seq += 1
+        heapq.heappush(self.__timer, (time.time() + delay, self.__timer_seq, kind, index, entry))
+
+    def __flush(self, out: dict):
+        """Report done task & return datagram to send. Call without lock."""
+        for task_id in out["done"]:
+            print(self.task_result(task_id))
+            with self.__task_done_condition:
+                self.__task_done_condition.notify_all()
+            for callback in self.__task_callback:
+                callback(task_id)
+        return out["datagram"]
+
     "CronJob"
     def cronjob(self):
-        """Function that regularly called. Check task status & generate command."""
-        # Check tello timeout
-        timeout = 8  # Unit: second
-        for tello in self.__TelloObjects:
-            if (time.time() - tello.busy_time) >= timeout and tello.busy:
-                tello.task_exec_result("Timeout")
-        # Check task status
-        for task in self.__task_work:
-            # Get task info
-            task_id = task["id"]
-            tello_index = task["tello"]
-            # Determine status
-            status = True
-            for tello in tello_index:
-                tello = self.__info2tello(index=tello)
-                status = tello.task_query_status(task_id) and status
-                if not status:  # If it is false, no need to check more.
-                    break
-            # Move task to finish if status.
-            if status:
-                self.__task_done.append(task)
-                self.__task_work.remove(task)
-                self.__task_status[task_id] = True
-                print(self.task_result(task_id))
-        # Generate command
-        datagram = []
-        for task in self.__task_work:
-            ok = True
-            # Get task info
-            task_id = task["id"]
-            task_list = task["task"]
-            task_sync = task["sync"]
-            tello_index = task["tello"]
-            cmd_repeat = task["repeat"]
-            id_fulfil = task["id_fulfil"]
-            # Determine if id_fulfil is ok
-            for id_need in id_fulfil:
-                ok = ok and self.task_status(id_need)
-                if not ok:
-                    break
-            # Determine sync is ok
-            if task_sync:
-                for tello in tello_index:
-                    tello = self.__info2tello(index=tello)
-                    ok = (not tello.busy) and ok
-                    if not ok:
-                        break
-            # Generate command
-            if ok:
-                # Generate for task sync
-                if task_sync:
-                    for item in task_list:
-                        # Get task detail
-                        tello = self.__info2tello(index=item[1])
-                        cmd = item[0]
-                        # Add to datagram list
-                        if cmd_repeat:
-                            datagram.append(
-                                (
-                                    cmd.encode("utf-8", errors="ignore"),
-                                    (tello.get_basic_info()["ip"], 8889)
-                                )
-                            )
-                        datagram.append(
-                            (
-                                cmd.encode("utf-8", errors="ignore"),
-                                (tello.get_basic_info()["ip"], 8889)
-                            )
-                        )
-                        # Setup tello
-                        tello.task_exec(task_id, cmd)
-                # Generate for non sync task
-                else:
-                    for item in task_list:
-                        # Get task detail
-                        tello = self.__info2tello(index=item[1])
-                        cmd = item[0]
-                        # Not busy & haven't exec command
-                        if (not tello.busy) and (not tello.task_query_status(task_id)):
-                            # Add to datagram list
-                            if cmd_repeat:
-                                datagram.append(
-                                    (
-                                        cmd.encode("utf-8", errors="ignore"),
-                                        (tello.get_basic_info()["ip"], 8889)
-                                    )
-                                )
-                            datagram.append(
-                                (
-                                    cmd.encode("utf-8", errors="ignore"),
-                                    (tello.get_basic_info()["ip"], 8889)
-                                )
-                            )
-                            # Setup tello
-                            tello.task_exec(task_id, cmd)
-        return datagram
+        """Handle due timer: tello timeout, retransmit, release, task start time & staggered task. Return datagram."""
+        out = {"datagram": [], "done": []}
+        with self.__lock:
+            now = time.time()
+            while self.__timer and (self.__timer[0][0] <= now):
+                _, _, kind, index, entry = heapq.heappop(self.__timer)
+                if kind == "timeout":
+                    # Still running the same item
+                    if self.__running[index] and (self.__running[index][0] == entry):
+                        self.__finish(index, "Timeout", out)
+                elif kind == "retransmit":
+                    self.__retransmit(index, entry, out)
+                elif kind == "group_timeout":
+                    # Every tello of the group still running it
+                    task = self.__task_work.get(entry)
+                    if task is not None:
+                        for no, i in enumerate(task["tello"]):
+                            if self.__running[i] and (self.__running[i][0] == (entry, no)):
+                                self.__finish(i, "Timeout", out)
+                elif kind == "group_retransmit":
+                    self.__group_retransmit(entry, out)
+                elif kind == "release":
+                    self.__hold.discard(index)
+                    self.__dispatch(index, out)
+                elif kind == "guard":
+                    guard = self.__guard.get(index)
+                    if (guard is not None) and (guard[1] <= now):
+                        del self.__guard[index]
+                        self.__dispatch(index, out)
+                elif kind == "at":
+                    # Start time of task reached
+                    task = self.__task_work.get(entry)
+                    if task is not None:
+                        task["pending"] -= 1
+                        if task["pending"] == 0:
+                            for i in set(task["tello"]):
+                                self.__dispatch(i, out)
+                elif kind == "plan":
+                    # Staggered task, check again
+                    task = self.__task_work.get(entry)
+                    if task is not None:
+                        task["plan_retry"] = False
+                        for i in set(task["tello"]):
+                            self.__dispatch(i, out)
+        return self.__flush(out)
+
+    def next_deadline(self):
+        """Time(time.time()) cronjob should be called next. None if no timer."""
+        with self.__lock:
+            return self.__timer[0][0] if self.__timer else None
 
     "Task Manage"
-    def task_add(self, task_id: int, task_list: list, blocking: bool, sync: bool, repeat: bool, id_fulfil: list):
-        """Add task to queue."""
-        # Get index of tello that is related
-        related_tello_index = [item[1] for item in task_list]
-        # Add task item to list
-        self.__task_work.append(
-            {
-                "id": task_id,
-                "task": task_list,
-                "blocking": blocking,
-                "sync": sync,
-                "tello": related_tello_index,
-                "id_fulfil": id_fulfil,
-                "repeat": repeat
-            }
-        )
-        # Add to trace
-        self.__task_status[task_id] = False
+    def task_add(self, task_id: int, task_list: list, blocking: bool, sync: bool, repeat: bool, id_fulfil: list,
+                 at: float = None):
+        """
+        Add task to queue. Return datagram to send right away.
+
+        :param at: Don't send before this time(time.time()), on top of id_fulfil. None for right away.
+        """
+        # Command object is encoded already, str is encoded here
+        payload = [item[0].payload if isinstance(item[0], command.Command)
+                   else item[0].encode("utf-8", errors="ignore") for item in task_list]
+        task_list = [(str(item[0]), item[1]) for item in task_list]
+        task = {
+            "id": task_id,
+            "task": task_list,
+            "blocking": blocking,
+            "sync": sync,
+            "tello": [item[1] for item in task_list],  # Index of tello that is related
+            "id_fulfil": id_fulfil,
+            "repeat": repeat,
+            "payload": payload,  # Encode once
+            "instant": [is_instant(item[0]) for item in task_list],
+            "sent": [0.0] * len(task_list),  # Time first copy is sent per item
+            "copies": [0] * len(task_list),  # Copy sent per item
+            "pending": 0,  # id_fulfil not done yet
+            "remaining": len(task_list),  # Item not done yet
+            "group": False
+        }
+        datagram = self.__task_queue(task, at)
         # Log
-        self.__log.info(f"Task Add - Task added. - [{task_id}, {task_list}, {blocking}, {sync}, {id_fulfil}]")
+        self.__log.info(f"Task Add - Task added. - [{task_id}, {task_list}, {blocking}, {sync}, {id_fulfil}, {at}]")
+        return datagram
+
+    def group_add(self, task_id: int, cmd: typing.Union[str, command.Command], indexes: typing.Iterable,
+                  blocking: bool, repeat: bool, id_fulfil: list, at: float = None):
+        """
+        Add one command for many tello as a single task. Return datagram to send right away.
+
+        Sent to every tello in one burst once all of them are idle, like a sync task. The group shares one payload,
+        one timeout & retransmit timer, and every answer goes into the task record instead of a record per tello.
+
+        :param cmd: Command for every tello, str is sent as is.
+        :param indexes: Tello index. Duplicate is dropped.
+        :param at: Don't send before this time(time.time()), on top of id_fulfil. None for right away.
+        """
+        if not isinstance(cmd, command.Command):
+            cmd = command.parse(cmd, False)
+        indexes = list(dict.fromkeys(indexes))
+        size = len(indexes)
+        task = {
+            "id": task_id,
+            "task": [(cmd.text, index) for index in indexes],
+            "blocking": blocking,
+            "sync": True,
+            "tello": indexes,
+            "id_fulfil": id_fulfil,
+            "repeat": repeat,
+            "payload": [cmd.payload] * size,  # Same bytes for every tello
+            "instant": [is_instant(cmd.text)] * size,
+            "sent": [0.0] * size,
+            "copies": [0] * size,
+            "pending": 0,
+            "remaining": size,
+            "group": True,
+            "result": [None] * size  # Answer per tello
+        }
+        datagram = self.__task_queue(task, at)
+        # Log
+        self.__log.info(f"Group Add - Task added. - [{task_id}, {cmd}, {indexes}, {blocking}, {id_fulfil}, {at}]")
+        return datagram
+
+    def __task_queue(self, task: dict, at: float):
+        """Register a new task & dispatch it if it's ready. Return datagram to send right away."""
+        out = {"datagram": [], "done": []}
+        task_id = task["id"]
+        with self.__lock:
+            self.__task_work[task_id] = task
+            self.__task_last = max(self.__task_last, task_id)
+            # Register dependency
+            for id_need in task["id_fulfil"]:
+                if not self.__finished(id_need):
+                    self.__dependents.setdefault(id_need, []).append(task_id)
+                    task["pending"] += 1
+            # Start time, released by timer like a dependency
+            if (at is not None) and (at > time.time()):
+                task["pending"] += 1
+                self.__timer_add(at - time.time(), "at", None, task_id)
+            # Queue on every related tello
+            for no, index in enumerate(task["tello"]):
+                self.__waiting.setdefault(index, []).append((task_id, no))
+            # Dispatch
+            if not task["task"]:
+                self.__complete(task_id, out)
+            elif not task["pending"]:
+                for index in set(task["tello"]):
+                    self.__dispatch(index, out)
+        return self.__flush(out)
+
+    def task_subscribe(self, callback: typing.Callable):
+        """Call callback(task_id) once a task is done. Called from the thread that finished the task."""
+        self.__task_callback.append(callback)
+
+    def task_wait(self, task_id: int, timeout: float = None):
+        """Block until task is done. Return task status."""
+        with self.__task_done_condition:
+            return self.__task_done_condition.wait_for(lambda: self.__finished(task_id), timeout)
 
     def task_status(self, task_id: int):
         """Check task status. True for done, False for not yet."""
-        try:
-            return self.__task_status[task_id]
-        except KeyError:
+        if int(task_id) > self.__task_last:
             self.__log.warning(f"Task Status - Unknown id {task_id}")
             return False
+        return self.__finished(task_id)
+
+    def __finished(self, task_id: int):
+        """
+        Task is done. Derived from active task & history, so nothing is kept per task once it's evicted:
+        a task id up to the highest one added that is no longer active is done.
+        """
+        task_id = int(task_id)
+        return (task_id not in self.__task_work) and ((task_id <= self.__task_last) or (task_id in self.__task_done))
 
     def task_result(self, task_id: int):
         """Return the result in formatted str."""
         msg = f"\nTask[{task_id}] - Done\n"
-        # Get related tello
-        index_list = []
-        for item in reversed(self.__task_done):
-            if item["id"] == task_id:
-                index_list = item["tello"]
-                break
+        with self.__lock:
+            return self.__task_result(int(task_id), msg)
+
+    def __task_result(self, task_id: int, msg: str):
         # Generate msg
-        for tello in index_list:
-            tello = self.__info2tello(index=tello)
-            task = tello.task_query_result(task_id)
-            info = tello.get_basic_info()
-            status = tello.get_status()
-            msg += f"Tello[{info['index']}] - {status['bat']} - {task['cmd']} - {task['result']}\n"
-            if ("error" in task['result']) and ("takeoff" in task['cmd']):
-                time.sleep(2)  # Wait tello release lock
+        for index, cmd, result in self.__task_detail(task_id):
+            status = self.__info2tello(index=index).get_status()
+            if cmd is not None:
+                msg += f"Tello[{index}] - {status['bat']} - {cmd} - {result}\n"
+            else:
+                msg += f"Tello[{index}] - {status['bat']} - Evicted from history\n"
         return msg
 
+    def task_detail(self, task_id: int):
+        """Result of a done task, [(Tello index, cmd, result)]. cmd & result are None if evicted from history."""
+        with self.__lock:
+            return self.__task_detail(int(task_id))
+
+    def __task_detail(self, task_id: int):
+        # Get related tello
+        record = self.__task_done.get(task_id, {})
+        if record.get("group"):  # One record for the whole group
+            return [(index, cmd, result) for (cmd, index), result in zip(record["task"], record["result"])]
+        detail = []
+        for no, index in enumerate(record.get("tello", [])):
+            task = self.__info2tello(index=index).task_query_result(task_id, no)
+            detail.append((index, task["cmd"], task["result"]) if task else (index, None, None))
+        return detail
+
     "Data Manage"
     # Add tello object
     def add_tello(self, ip: str, sn: str):
@@ -354,41 +875,45 @@ class TelloDB:
             index = self.__sn_map[sn]
         except KeyError:
             self.__log.error(f"Add tello - Unknown SN - {sn}")
-        # Prevent duplicate
-        if self.__info2tello(ip=ip) is not None:
-            return None
-        # Add tello object
-        self.__TelloObjects.append(
-            Tello(ip, sn, index)
-        )
+        with self.__lock:
+            # Prevent duplicate
+            if self.__info2tello(ip=ip) is not None:
+                return None
+            # Add tello object
+            tello = Tello(ip, sn, index, TaskHistory(*self.__task_history, tag={"tello": index}))
+            self.__TelloObjects.append(tello)
+            # Update index, first one wins like a linear scan. Index before object is visible to scheduler.
+            self.__waiting.setdefault(index, [])
+            self.__running.setdefault(index, [])
+            self.__sn2tello.setdefault(sn, tello)
+            self.__index2tello.setdefault(index, tello)
+            self.__ip2tello.setdefault(ip, tello)
+        # Slot only for tello in sn_map, so an unknown one can't take the slot of a mapped one
+        if (sn in self.__sn_map) and (not self.Telemetry.add(index)):
+            self.__log.error(f"Add tello - Telemetry full, status not recorded. - {index}")
         # Log event
         self.__log.warning(f"Add - Tello added. - ['{ip}', '{sn}', {index}]")
 
     # Info convert
     def __info2tello(self, ip: str = None, sn: str = None, index: int = None) -> typing.Union[Tello, type(None)]:
         """Return tello that matches all the description."""
-        for tello in self.__TelloObjects:
-            info = tello.get_basic_info()
-            match = True
-            # Match IP
-            if ip is None:
-                match = match and True
-            else:
-                match = match and (info["ip"] == ip)
-            # Match SN
-            if sn is None:
-                match = match and True
-            else:
-                match = match and (info["sn"] == sn)
-            # Match SN
-            if index is None:
-                match = match and True
-            else:
-                match = match and (info["index"] == index)
-            # Return
-            if match:
-                return tello
-        return None
+        # Pick from the index of the first description given.
+        if ip is not None:
+            tello = self.__ip2tello.get(ip)
+        elif sn is not None:
+            tello = self.__sn2tello.get(sn)
+        elif index is not None:
+            tello = self.__index2tello.get(index)
+        else:
+            return self.__TelloObjects[0] if self.__TelloObjects else None
+        if tello is None:
+            return None
+        # Match the rest
+        if (sn is not None) and (tello.sn != sn):
+            return None
+        if (index is not None) and (tello.index != index):
+            return None
+        return tello
 
     def info2info(self, ip: str = None, sn: str = None, index: int = None):
         """Return the basic info of tello that matches all the description."""
@@ -404,8 +929,22 @@ class TelloDB:
             return None
         return tello.get_status()
 
+    def info2link(self, ip: str = None, sn: str = None, index: int = None):
+        """Return the link estimate(RTT, RTO, loss) of tello that matches all the description."""
+        tello = self.__info2tello(ip, sn, index)
+        if tello is None:
+            return None
+        return tello.get_link()
+
     def info2stream(self, ip: str = None, sn: str = None, index: int = None):
-        """Return the video stream of tello that matches all the description."""
+        """Return the latest video frame(memoryview) of tello that matches all the description."""
+        tello = self.__info2tello(ip, sn, index)
+        if tello is None:
+            return None
+        return tello.get_stream().latest()
+
+    def info2video(self, ip: str = None, sn: str = None, index: int = None):
+        """Return the video stream(VideoStream) of tello that matches all the description."""
         tello = self.__info2tello(ip, sn, index)
         if tello is None:
             return None
@@ -413,22 +952,75 @@ class TelloDB:
 
     # Update tello object data
     def update_command(self, datagram):
+        """Record response & dispatch the next task right away. Return datagram to send."""
+        out = {"datagram": [], "done": []}
         tello = self.__info2tello(ip=datagram[1][0])
         if tello is None:
             self.__log.warning(f"update_command - Received unknown response from {datagram[1][0]}")
-        else:
-            tello.task_exec_result(datagram[0])
-            self.__log.info(f"update_command - Updated exec result for Tello {tello.get_basic_info()['index']}."
-                            f" - {datagram[0]}")
+            return []
+        with self.__lock:
+            index = tello.index
+            if not self.__running[index]:
+                # Answer of a repeated copy. Release the guard once every copy is answered.
+                guard = self.__guard.get(index)
+                if guard is not None:
+                    guard[0] -= 1
+                    if guard[0] <= 0:
+                        del self.__guard[index]
+                        self.__dispatch(index, out)
+                    self.__log.info(f"update_command - Tello {index} duplicate response suppressed. - {datagram[0]}")
+                    return self.__flush(out)
+                self.__log.info(f"update_command - Tello {index} is idle, response ignored. - {datagram[0]}")
+                return []
+            task_id, no = self.__running[index][0]
+            task = self.__task_work[task_id]
+            if (not task["instant"][no]) and (task["copies"][no] > 1) and datagram[0].startswith("error"):
+                # Repeated copy reached tello while moving, the answer of the first copy is still coming.
+                task["copies"][no] -= 1
+                self.__log.info(f"update_command - Tello {index} duplicate response suppressed. - {datagram[0]}")
+                return []
+            self.__finish(index, datagram[0], out)
+        self.__log.info(f"update_command - Updated exec result for Tello {tello.index}."
+                        f" - {datagram[0]}")
+        return self.__flush(out)
 
     def update_status(self, datagram):
+        """Record status & run safety check when due. Return datagram to send(safety action)."""
         tello = self.__info2tello(ip=datagram[1][0])
         if tello is None:
             self.__log.warning(f"update_status - Received unknown status from {datagram[1][0]}")
-        else:
-            status = format_status(datagram[0])
-            tello.update_status(status)
-            self.__log.info(f"update_status - Updated status for Tello {tello.get_basic_info()['index']}. - {status}")
+            return []
+        status = format_status(datagram[0])
+        tello.update_status(status)
+        self.Telemetry.record(tello.index, status)
+        if self.State is not None:
+            self.State.write(tello.index, status)
+        if self.__debug:
+            self.__log.info(f"update_status - Updated status for Tello {tello.index}. - {status}")
+        if (self.Safety is None) or (not self.Safety.due()):
+            return []
+        tripped = self.Safety.check(self.Telemetry)
+        if not tripped:
+            return []
+        out = {"datagram": [], "done": []}
+        with self.__lock:
+            for index, rule in tripped:
+                self.__trip(index, rule, out)
+        return self.__flush(out)
+
+    def safety_reset(self, index: int = None):
+        """Let tello[index](every tello if None) take task again after a safety trip."""
+        with self.__lock:
+            for i in (list(self.__tripped) if index is None else [index]):
+                self.__tripped.pop(i, None)
+            if self.Safety is not None:
+                self.Safety.reset(index)
+        self.__log.warning(f"Safety - Reset. - {index}")
+
+    def query_tripped(self):
+        """Tello index -> Rule tripped and not reset."""
+        with self.__lock:
+            return dict(self.__tripped)
 
     def update_video(self, datagram):
         tello = self.__info2tello(ip=datagram[1][0])
@@ -436,7 +1028,8 @@ class TelloDB:
             self.__log.warning(f"update_video - Received unknown stream from {datagram[1][0]}")
         else:
             tello.update_video(datagram[0])
-            self.__log.info(f"update_status - Updated stream for Tello {tello.get_basic_info()['index']}.")
+            if self.__debug:
+                self.__log.info(f"update_video - Updated stream for Tello {tello.index}.")
 
     # Query TelloDB info
     def query_num_tello(self):
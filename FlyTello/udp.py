@@ -1,17 +1,93 @@
-from FlyTello import quicklog
+from FlyTello import quicklog, recorder
 import select  # Block until data in socket
 import socket  # UDP socket
 import typing  # Union type support
 import threading  # Multi-thread
+import queue  # Thread-safe delivery
+import collections
+import ipaddress  # Network of NIC
+import struct  # ioctl request
 import time
 
 
+def bind_socket(port: int, ip: str = "0.0.0.0"):
+    """Create a non-blocking udp socket bound to port on NIC of ip, all NIC by default."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)  # IPV4, UDP
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4194304)  # 4MB Socket Buffer
+    sock.bind((ip, port))
+    sock.setblocking(False)  # Set non-blocking socket
+    return sock
+
+
+def interface_network(ip: str, limit: int = 20):
+    """
+    Network of the NIC holding ip, using its real netmask. Fall back to /24 when it can't be read(Non-Linux).
+
+    :param limit: Minimum prefix length, prevent sweeping a huge network(e.g. 127.0.0.0/8).
+    """
+    network = ipaddress.IPv4Network(f"{ip}/24", strict=False)
+    try:
+        import fcntl  # Unix only
+    except ImportError:
+        return network
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        for _, name in socket.if_nameindex():
+            request = struct.pack("256s", name.encode("utf-8")[:15])
+            try:
+                address = socket.inet_ntoa(fcntl.ioctl(sock.fileno(), 0x8915, request)[20:24])  # SIOCGIFADDR
+                if address != ip:
+                    continue
+                netmask = socket.inet_ntoa(fcntl.ioctl(sock.fileno(), 0x891B, request)[20:24])  # SIOCGIFNETMASK
+            except OSError:
+                continue
+            network = ipaddress.IPv4Network(f"{ip}/{netmask}", strict=False)
+            if network.prefixlen < limit:
+                network = ipaddress.IPv4Network(f"{ip}/{limit}", strict=False)
+            break
+    finally:
+        sock.close()
+    return network
+
+
+def broadcast_address(ip: str, port: int, network: typing.Union[str, ipaddress.IPv4Network] = None):
+    """Every host address in network(Default: NIC network of ip). Tello ignore real broadcast so unicast to each."""
+    if network is None:
+        network = interface_network(ip)
+    return [(str(host), port) for host in ipaddress.IPv4Network(network, strict=False).hosts()]
+
+
+class BufferPool:
+    def __init__(self, slots: int = 256, size: int = 2048):
+        """Preallocated bytearray handed out and recycled, so receive doesn't allocate in steady state."""
+        self.__free = collections.deque(bytearray(size) for _ in range(slots))  # Thread-safe append / pop
+
+    def acquire(self):
+        """Take a free buffer, None if all in use."""
+        try:
+            return self.__free.pop()
+        except IndexError:
+            return None
+
+    def release(self, buffer: bytearray):
+        """Give back a buffer."""
+        self.__free.append(buffer)
+
+    def query_free(self):
+        return len(self.__free)
+
+
 class Server:
     def __init__(
             self,
             recv_port: int = 8889,
             recv_decode: bool = True,
             send_independent: bool = False,
+            recv_limit: int = 0,
+            recv_into: bool = False,
+            recv_pool: int = 0,
+            recv_size: int = 2048,
+            bind: str = "0.0.0.0",
             debug: bool = False
     ):
         """
@@ -20,11 +96,18 @@ class Server:
         :param recv_port: Port to bind.
         :param send_independent: Assign independent socket for send method.
         :param recv_decode: Decode received datagram as utf-8 bytes.
+        :param recv_limit: Max datagram held for read. 0 for unlimited. Datagram is dropped when full.
+        :param recv_into: Receive with recvfrom_into into a preallocated buffer instead of a new bytes per datagram.
+        :param recv_pool: With recv_into and recv_decode False, number of preallocated buffer. Datagram is handed out
+            as memoryview on the buffer, call release(datagram) after use. 0 to copy it out as bytes.
+        :param recv_size: Size of each buffer in pool. Tello datagram is at most 1460 bytes.
+        :param bind: IP of the NIC to receive & send on. Default all NIC, sent from the NIC of hostname.
         :param debug: Enter debug mode.
         """
         "Server Info"
-        self.__ip = socket.gethostbyname(socket.gethostname())
+        self.__ip = socket.gethostbyname(socket.gethostname()) if bind == "0.0.0.0" else bind
         self.__debug = debug
+        self.network = None  # Network to broadcast, None for network of NIC
         "Log"
         if not debug:
             self.__log = quicklog.create_log(name=f"UDP-{recv_port}", level=30, preserve=False)
@@ -32,15 +115,20 @@ class Server:
             self.__log = quicklog.create_log(name=f"UDP-{recv_port}", level=10, preserve=True)
         "Recv"
         # #Storage
-        self.__recv_data = []
+        self.__recv_data = queue.Queue(maxsize=recv_limit)
+        self.__recv_handlers = []  # Subscribed handlers, called from recv thread
+        self.__recorder = None  # Flight recorder, (Recorder, channel)
         # #Basic Config
         self.__recv_port = recv_port
         self.__recv_decode = recv_decode
+        self.__recv_into = recv_into
+        # #Buffer Setup
+        self.__recv_pool = None if (not recv_into) or recv_decode or (recv_pool <= 0) else \
+            BufferPool(recv_pool, recv_size)
+        self.__recv_scratch = bytearray(65536)
+        self.__recv_scratch_view = memoryview(self.__recv_scratch)
         # #Socket Setup
-        self.__recv_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)  # IPV4, UDP
-        self.__recv_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4194304)  # 4MB Socket Buffer
-        self.__recv_socket.bind(("0.0.0.0", self.__recv_port))  # Bind to all NIC
-        self.__recv_socket.setblocking(False)  # Set non-blocking socket
+        self.__recv_socket = bind_socket(self.__recv_port, bind)
         self.__log.info("Recv - Socket initiated.")
         # #Thread Setup
         self.__recv_thread = threading.Thread(target=self.__recv)
@@ -55,41 +143,78 @@ class Server:
             self.__send_socket = self.__recv_socket
         else:
             self.__send_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            if bind != "0.0.0.0":
+                self.__send_socket.bind((bind, 0))
+        self.send_skew = 0  # Skew of the last send_batch
         self.__log.info("Send - Socket initiated.")
-        "Read"
-        # #Basic Variables
-        self.read_new = False  # Indicates new message
-        self.__log.warning(f"Server started. [{recv_port}, {send_independent}, {recv_decode}, {debug}]")
+        self.__log.warning(f"Server started. [{recv_port}, {send_independent}, {recv_decode}, '{bind}', {debug}]")
 
     def __recv(self):
         """A internal thread to receive datagram. Datagram format: (bytes, (ip, port))"""
         while select.select([self.__recv_socket], [], [])[0]:  # Block until package in socket
-            datagram = []
             # Try get datagram from socket
             try:
-                datagram = list(self.__recv_socket.recvfrom(65536))  # Format (bytes, (ip, port))
+                if not self.__recv_into:
+                    datagram = list(self.__recv_socket.recvfrom(65536))  # Format (bytes, (ip, port))
+                else:
+                    datagram = self.__recv_buffer()  # Format (str / memoryview, (ip, port))
             except ConnectionResetError:  # Win Err 10054 (Broadcast ICMP Response)
                 self.__log.warning("Recv - ConnectionResetError(Maybe due to ICMP report from broadcast failure.)")
+                continue
             except ConnectionError:
                 self.__log.error("Recv - ConnectionError(Check network.)")
+                continue
             # Filter blank and broadcast datagram
+            if (len(datagram[0]) == 0) or (datagram[1][0] == self.__ip):
+                self.release(datagram)
+                continue
+            if self.__recorder is not None:
+                self.__recorder[0].write(self.__recorder[1], datagram)
+            # Decode on demand
+            if self.__recv_decode and (not self.__recv_into):
+                datagram[0] = datagram[0].decode("utf-8", errors="ignore")
+            if self.__debug:
+                self.__log.info(f"Recv - Received datagram. - {datagram}")
+            # Deliver to subscriber or storage
+            if self.__recv_handlers:
+                for handler in self.__recv_handlers:
+                    try:
+                        handler(datagram)
+                    except Exception:  # A bad datagram must not stop the recv thread
+                        self.__log.exception(f"Recv - Handler failed. - [{handler}, {datagram}]")
+                continue
             try:
-                if (datagram[0] != b"") and (datagram[1][0] != self.__ip):
-                    # Decode on demand
-                    if self.__recv_decode:
-                        datagram[0] = datagram[0].decode("utf-8", errors="ignore")
-                    # Add to storage
-                    self.__recv_data.append(datagram)
-                    self.__log.info(f"Recv - Received datagram. - {datagram}")
-                    # Setup indicator
-                    self.read_new = True
-            except IndexError:
-                pass
+                self.__recv_data.put_nowait(datagram)
+            except queue.Full:
+                self.__log.warning(f"Recv - Storage full, datagram dropped. - {datagram}")
+                self.release(datagram)
         self.__log.critical(f"Recv: Thread exit unexpectedly.")  # Thread shouldn't exit until any scenario.
 
+    def __recv_buffer(self):
+        """Receive with recvfrom_into. Decoded datagram reuse scratch buffer, raw one take a buffer from pool."""
+        if self.__recv_decode:
+            size, address = self.__recv_socket.recvfrom_into(self.__recv_scratch)
+            return [str(self.__recv_scratch_view[:size], "utf-8", "ignore"), address]
+        buffer = None if self.__recv_pool is None else self.__recv_pool.acquire()
+        if buffer is None:
+            # No pool, or consumer doesn't release in time. Copy out instead of blocking recv.
+            size, address = self.__recv_socket.recvfrom_into(self.__recv_scratch)
+            if self.__recv_pool is not None:
+                self.__log.warning("Recv - Buffer pool exhausted, datagram copied. Release datagram after use.")
+            return [bytes(self.__recv_scratch_view[:size]), address]
+        size, address = self.__recv_socket.recvfrom_into(buffer)
+        return [memoryview(buffer)[:size], address]
+
+    def release(self, datagram: typing.Union[tuple, list]):
+        """Return the buffer of a datagram to pool. Do nothing if not from pool."""
+        if (self.__recv_pool is not None) and isinstance(datagram[0], memoryview):
+            self.__recv_pool.release(datagram[0].obj)
+
     def send(self, datagram: typing.Union[tuple, list], internal: bool = False):
         """Send datagram. Datagram format: (bytes, (ip, port))"""
         try:
+            if self.__recorder is not None:
+                self.__recorder[0].write(recorder.SENT, datagram)  # Before send, answer may be recorded first
             self.__send_socket.sendto(datagram[0], datagram[1])
             if not internal:
                 self.__log.info(f"Send - Sent datagram. - {datagram}")
@@ -97,30 +222,71 @@ class Server:
             print("Error - Send - Check Log.")
             self.__log.error(f"Send - Address Error. - {datagram}")
 
+    @property
+    def ip(self):
+        return self.__ip
+
+    def send_batch(self, datagrams: typing.Sequence):
+        """
+        Send datagrams back to back. Datagram format: (bytes, (ip, port))
+
+        :return: Skew(second) between the first and the last datagram leave.
+        """
+        if not datagrams:
+            return 0
+        if self.__recorder is not None:
+            for datagram in datagrams:
+                self.__recorder[0].write(recorder.SENT, datagram)  # Before send, answer may be recorded first
+        sendto = self.__send_socket.sendto
+        clock = time.perf_counter
+        start = clock()
+        for payload, address in datagrams:
+            try:
+                sendto(payload, address)
+            except socket.gaierror:
+                self.__log.error(f"Send - Address Error. - {(payload, address)}")
+        skew = clock() - start
+        self.send_skew = skew
+        if self.__debug:
+            self.__log.info(f"Send - Sent batch. - [{len(datagrams)}, {skew * 1000:.3f}ms] {datagrams}")
+        return skew
+
     def broadcast(self, message: str, port: int):
         """Broadcast a message using dumb way. Tello won't accept the easy one..."""
         message = message.encode("utf-8", errors="ignore")
-        ip = self.__ip.split(".")
-        messages = [(message, (f"{ip[0]}.{ip[1]}.{ip[2]}.{x}", port)) for x in range(0, 256)]
-        for datagram in messages:
-            self.send(datagram, internal=True)
-        self.__log.info(f"Broadcast - Message broadcasted. - [{message}, {port}, '{ip}']")
-
-    def read(self):
-        """Return the latest unread datagram."""
+        if self.network is None:
+            self.network = interface_network(self.__ip)
+        for address in broadcast_address(self.__ip, port, self.network):
+            self.send((message, address), internal=True)
+        self.__log.info(f"Broadcast - Message broadcasted. - [{message}, {port}, '{self.__ip}']")
+
+    def record(self, flight_recorder, channel: int):
+        """
+        Append every datagram received(and sent) to a flight recorder. None to stop.
+
+        :param flight_recorder: recorder.Recorder
+        :param channel: Channel of received datagram, e.g. recorder.STATUS. Sent one is recorder.SENT.
+        """
+        self.__recorder = None if flight_recorder is None else (flight_recorder, channel)
+        self.__log.info(f"Record - Recorder set. - [{flight_recorder}, {channel}]")
+
+    def subscribe(self, handler: typing.Callable):
+        """
+        Deliver every datagram to handler from recv thread instead of storage.
+
+        Handler should return quickly, otherwise it stalls the socket.
+        """
+        self.__recv_handlers.append(handler)
+        self.__log.info(f"Subscribe - Handler subscribed. - {handler}")
+
+    @property
+    def read_new(self):
+        """Indicates unread datagram in storage."""
+        return not self.__recv_data.empty()
+
+    def read(self, timeout: float = None):
+        """Return the oldest unread datagram. Block until arrival, None if timeout reached."""
         try:
-            # Reset indicator
-            if len(self.__recv_data) == 1:
-                self.read_new = False
-            # Return Data
-            return self.__recv_data.pop(0)
-        except IndexError:
-            self.__log.error("Read - Error Occurs. Func called when not prepared. Pls investigate.")
-            # Block until data arrived.
-            while len(self.__recv_data) == 0:
-                time.sleep(0.05)
-            # Reset indicator
-            if len(self.__recv_data) == 1:
-                self.read_new = False
-            # Return Data
-            return self.__recv_data.pop()
+            return self.__recv_data.get(timeout=timeout)
+        except queue.Empty:
+            return None
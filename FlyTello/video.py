@@ -0,0 +1,69 @@
+import typing
+
+PACKET_SIZE = 1460  # Tello split H.264 frame into packet of this size, the last one is shorter.
+START_CODE = b"\x00\x00\x00\x01"  # H.264 NAL unit start code (Annex B)
+
+
+class VideoStream:
+    def __init__(self, frames: int = 8, frame_size: int = 131072):
+        """
+        Reassemble tello video packet into H.264 frame, keep a bounded ring of recent frame.
+
+        Packets are copied straight into the ring slot being assembled, so memory stays at
+        frames * frame_size unless a bigger frame shows up.
+
+        :param frames: Frame kept in ring.
+        :param frame_size: Initial size of each slot(bytes). Slot grows when frame is bigger.
+        """
+        self.__frames = [bytearray(frame_size) for _ in range(frames)]
+        self.__length = [0] * frames  # Length of completed frame per slot
+        self.__write = 0  # Slot being assembled
+        self.__fill = 0  # Bytes written in slot being assembled
+        self.__latest = None  # Slot of latest completed frame
+        # #Stats
+        self.frame_count = 0
+        self.drop_count = 0
+        self.byte_count = 0
+
+    def feed(self, packet: typing.Union[bytes, memoryview]):
+        """Add a datagram from port 11111. Return True when a frame is completed."""
+        size = len(packet)
+        self.byte_count += size
+        slot = self.__frames[self.__write]
+        if self.__fill == 0:
+            self.__length[self.__write] = 0  # Old frame in slot is being overwritten
+        end = self.__fill + size
+        # Grow slot. Replace instead of resize as reader may hold a memoryview on it.
+        if end > len(slot):
+            grown = bytearray(max(end, len(slot) * 2))
+            grown[:self.__fill] = slot[:self.__fill]
+            self.__frames[self.__write] = slot = grown
+        slot[self.__fill:end] = packet
+        self.__fill = end
+        if size == PACKET_SIZE:
+            return False
+        # Last packet of frame. Drop frame with lost head.
+        complete = slot[:4] == START_CODE
+        if complete:
+            self.__length[self.__write] = end
+            self.__latest = self.__write
+            self.__write = (self.__write + 1) % len(self.__frames)
+            self.frame_count += 1
+        else:
+            self.drop_count += 1
+        self.__fill = 0
+        return complete
+
+    def latest(self):
+        """Latest completed frame as zero-copy memoryview, None if no frame yet. Valid until ring wraps around."""
+        if self.__latest is None:
+            return None
+        return memoryview(self.__frames[self.__latest])[:self.__length[self.__latest]]
+
+    def frames(self):
+        """Completed frames in ring as memoryview. Oldest first."""
+        if self.__latest is None:
+            return []
+        count = len(self.__frames)
+        order = [(self.__latest + 1 + i) % count for i in range(count)]
+        return [memoryview(self.__frames[slot])[:self.__length[slot]] for slot in order if self.__length[slot]]
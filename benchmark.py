@@ -0,0 +1,714 @@
+from FlyTello import command, discovery, fly, future, planner, quicklog, recorder, safety, shard, shm, show, sim
+from FlyTello import tello, udp, video
+import contextlib
+import io
+import math
+import os
+import random
+import socket
+import tempfile
+import threading
+import time
+import tracemalloc
+
+"""
+Benchmarks - Run without drone. Linux only (Use 127.0.0.x as fake tello address).
+"""
+
+
+def report(name: str, samples: list, unit: str = "ms", scale: float = 1000):
+    """Print p50 / p99 / max of samples."""
+    samples = sorted(samples)
+    p50 = samples[len(samples) // 2] * scale
+    p99 = samples[int(len(samples) * 0.99) - 1] * scale
+    print(f"{name:<40} p50 {p50:9.3f}{unit}  p99 {p99:9.3f}{unit}  max {samples[-1] * scale:9.3f}{unit}")
+
+
+def fake_socket(ip: str = "127.0.0.2"):
+    """Socket that acts like a tello."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((ip, 0))
+    return sock
+
+
+"""
+Receive Pipeline
+"""
+
+
+def bench_recv_latency(count: int = 500, port: int = 18889):
+    """Latency from sendto() to consumer wakeup. Polling (Legacy) vs blocking read."""
+    server = udp.Server(recv_port=port, recv_decode=True)
+    sock = fake_socket()
+    sent = {}
+
+    def polling(result: list):
+        # Legacy consumer: spin on read_new with 10ms sleep.
+        while len(result) < count:
+            while server.read_new:
+                datagram = server.read()
+                result.append(time.perf_counter() - sent[datagram[0]])
+            time.sleep(0.01)
+
+    def blocking(result: list):
+        while len(result) < count:
+            datagram = server.read()
+            result.append(time.perf_counter() - sent[datagram[0]])
+
+    for name, consumer in (("recv - polling(legacy)", polling), ("recv - blocking read", blocking)):
+        result = []
+        thread = threading.Thread(target=consumer, args=(result,), daemon=True)
+        thread.start()
+        for i in range(count):
+            message = f"{name}-{i}"
+            sent[message] = time.perf_counter()
+            sock.sendto(message.encode("utf-8"), ("127.0.0.1", port))
+            time.sleep(0.002)
+        thread.join()
+        report(name, result)
+
+
+def bench_send_skew(size: int = 40, rounds: int = 200, port: int = 18890):
+    """Time for the first copy of a sync command to leave for every tello. send() loop vs send_batch()."""
+    server = udp.Server(recv_port=port, recv_decode=True)
+    fleet = [fake_socket(f"127.0.1.{i + 2}") for i in range(size)]
+    legacy, batch = [], []
+    for _ in range(rounds):
+        # Legacy cronjob: encode per datagram, repeat copy interleaved, send() one by one.
+        start = time.perf_counter()
+        for i, sock in enumerate(fleet):
+            server.send(("takeoff".encode("utf-8"), sock.getsockname()))
+            if i == size - 1:
+                legacy.append(time.perf_counter() - start)
+            server.send(("takeoff".encode("utf-8"), sock.getsockname()))
+        # Encoded once, every first copy in one batch, then the repeat.
+        payload = "takeoff".encode("utf-8")
+        first = [(payload, sock.getsockname()) for sock in fleet]
+        batch.append(server.send_batch(first))
+        server.send_batch(first)
+        for sock in fleet:
+            for _ in range(4):
+                sock.recvfrom(64)
+    report(f"send - send() loop(legacy) {size} tello", legacy)
+    report(f"send - send_batch() {size} tello", batch)
+
+
+"""
+TelloDB
+"""
+
+
+def fake_fleet(size: int):
+    """TelloDB filled with size tello on 127.0.x.y"""
+    sn_map = {f"SN{i:04d}": i for i in range(1, size + 1)}
+    db = tello.TelloDB(sn_map=sn_map, debug=False)
+    for sn, index in sn_map.items():
+        db.add_tello(f"127.0.{index // 250}.{index % 250 + 2}", sn)
+    return db
+
+
+def bench_lookup(sizes: tuple = (1, 10, 50, 100, 500), count: int = 100000):
+    """Cost of info2status by ip / index as fleet grows. Should stay flat."""
+    for size in sizes:
+        db = fake_fleet(size)
+        ips = [db.info2info(index=i)["ip"] for i in range(1, size + 1)]
+        start = time.perf_counter()
+        for i in range(count):
+            db.info2status(ip=ips[i % size])
+        by_ip = (time.perf_counter() - start) / count
+        start = time.perf_counter()
+        for i in range(count):
+            db.info2status(index=i % size + 1)
+        by_index = (time.perf_counter() - start) / count
+        print(f"lookup - {size:>4} tello  ip {by_ip * 1e6:7.3f}us  index {by_index * 1e6:7.3f}us")
+
+
+def bench_scheduler(size: int = 50, tasks: int = 500):
+    """Response -> next command latency & CPU of TelloDB scheduler. 10 task per tello, every 5th one sync."""
+    db = fake_fleet(size)
+    ips = {db.info2info(index=i)["ip"]: i for i in range(1, size + 1)}
+    latency = []
+    with contextlib.redirect_stdout(io.StringIO()):  # Task result is printed
+        cpu = time.process_time()
+        inflight = []
+        for task_id in range(1, tasks + 1):
+            if task_id % 5 == 0:
+                group = [(task_id + i) % size + 1 for i in range(5)]
+                inflight += db.task_add(task_id, [("up 20", i) for i in group], False, True, False, [])
+            else:
+                inflight += db.task_add(task_id, [("cw 90", task_id % size + 1)], False, False, False,
+                                        [task_id - 1] if task_id % 7 == 0 else [])
+        # Answer every command, the answer dispatch the next one.
+        while inflight:
+            payload, address = inflight.pop(0)
+            start = time.perf_counter()
+            sent = db.update_command(["ok", address])
+            if sent:
+                latency.append(time.perf_counter() - start)
+            inflight += sent
+        cpu = time.process_time() - cpu
+    done = sum(db.task_status(task_id) for task_id in range(1, tasks + 1))
+    report(f"scheduler - {size} tello {tasks} task", latency)
+    print(f"scheduler - {done}/{tasks} task done  cpu {cpu * 1000:.1f}ms  ({cpu / tasks * 1e6:.1f}us per task)")
+
+
+def bench_group(sizes: tuple = (40, 200), rounds: int = 200):
+    """Fleet-wide command through TelloDB, same command queued per tello as a sync task vs group_add."""
+    land = command.build("land")
+
+    def run(db: tello.TelloDB, size: int, group_add: bool):
+        group = list(range(1, size + 1))
+        for task_id in range(1, rounds + 1):
+            if group_add:
+                sent = db.group_add(task_id, land, group, False, True, [])
+            else:
+                sent = db.task_add(task_id, [(land, i) for i in group], False, True, True, [])
+            for _, address in sent:
+                db.update_command(["ok", address])
+
+    for size in sizes:
+        for name, group_add in (("sync task", False), ("group_add", True)):
+            with contextlib.redirect_stdout(io.StringIO()):  # Task result is printed
+                db = fake_fleet(size)
+                cpu = time.process_time()
+                run(db, size, group_add)
+                cpu = time.process_time() - cpu
+                db = fake_fleet(size)
+                tracemalloc.start()
+                run(db, size, group_add)
+                held = tracemalloc.get_traced_memory()[0]
+                tracemalloc.stop()
+            done = sum(db.task_status(task_id) for task_id in range(1, rounds + 1))
+            print(f"group - {size:>3} tello {name:<9}  {cpu / rounds * 1e6:8.1f}us per round  "
+                  f"history {held / 1024:8.1f}KiB  {done}/{rounds} done")
+
+
+def stress_control(size: int = 20, tasks: int = 3000, threads: int = 4, port: tuple = (18889, 18890, 21111)):
+    """Concurrent exec from several thread while fleet floods status at 100Hz. Every command must be answered."""
+    fleet = sim.Fleet(size, delay={"up": 0}, status_rate=100, status_port=port[1]).start(process=True)
+    sn_map = fleet.sn_map
+    with contextlib.redirect_stdout(io.StringIO()):  # Task result is printed
+        control = fly.Control(sn_map, network=fleet.network, cache=None, port=port)
+        time.sleep(0.2)  # Scan & motoron answered
+        baseline = sum(len(received) for received in fleet.stats().values())
+        issued = [[] for _ in range(threads)]
+
+        def user(no: int):
+            rand = random.Random(no)
+            for i in range(tasks // threads):
+                group = rand.sample(range(1, size + 1), rand.choice((1, 1, 1, 3)))
+                control.up(20, group)
+                after = issued[no][-1:] if i % 10 == 0 else []
+                issued[no].append(control.exec(blocking=False, sync=len(group) > 1, repeat=False, id_fulfil=after))
+
+        start = time.perf_counter()
+        workers = [threading.Thread(target=user, args=(no,)) for no in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        task_ids = [task_id for ids in issued for task_id in ids]
+        done = sum(control.TelloDB.task_wait(task_id, timeout=30) for task_id in task_ids)
+        elapsed = time.perf_counter() - start
+    results = [tello.task_query_result(task_id) for tello in control.TelloDB.query_advance_object_list()
+               for task_id in task_ids]
+    answered = sum(1 for result in results if result and result["result"] == "ok")
+    timeout = sum(1 for result in results if result and result["result"] == "Timeout")
+    sent = sum(len(received) for received in fleet.stats().values()) - baseline
+    fleet.stop()
+    print(f"stress - {size} tello {threads} thread  {done}/{len(task_ids)} task done in {elapsed:.2f}s"
+          f"  {answered}/{sent} command answered  {timeout} timeout")
+    # Fail the run on a lost response, not just report it
+    if (done != len(task_ids)) or (answered != sent) or timeout:
+        raise AssertionError(f"stress - Lost response. - [{done}/{len(task_ids)} task, {answered}/{sent} answered, "
+                             f"{timeout} timeout]")
+
+
+"""
+Swarm - End to end against FlyTello.sim
+"""
+
+
+def bench_swarm(sizes: tuple = (1, 10, 50, 100), rounds: int = 50, port: int = 28889):
+    """
+    Discovery time, command RTT, sync skew & CPU per drone of Control as fleet grows.
+
+    Fleet runs in its own process so CPU measured here is the control side only.
+    Sync skew is the spread of arrival time of one sync command across the fleet, seen by the simulator.
+    """
+    for no, size in enumerate(sizes):
+        ports = (port + no * 10, port + no * 10 + 1, port + no * 10 + 2)
+        fleet = sim.Fleet(size, delay={"up": 0.02, "down": 0.02}, status_port=ports[1], video_port=ports[2])
+        fleet.start(process=True)
+        with contextlib.redirect_stdout(io.StringIO()):  # Task result is printed
+            # Discovery alone, on a separate server
+            server = udp.Server(recv_port=ports[0] + 5, recv_decode=True)
+            start = time.perf_counter()
+            found = discovery.Discovery(server, network=fleet.network, cache=None).scan(fleet.sn_map, timeout=10)
+            scan = time.perf_counter() - start
+            control = fly.Control(fleet.sn_map, network=fleet.network, cache=None, port=ports)
+            # RTT of a query, one tello at a time
+            rtt = []
+            for i in range(rounds * 4):
+                control.ask_battery(i % size + 1)
+                start = time.perf_counter()
+                control.exec(repeat=False)
+                rtt.append(time.perf_counter() - start)
+            # Sync command to whole fleet
+            baseline = {sn: len(received) for sn, received in fleet.stats().items()}
+            for i in range(rounds):
+                (control.up if i % 2 == 0 else control.down)(20, list(fleet.sn_map.values()))
+                control.exec(sync=True, repeat=False)
+            # Idle with status at 10Hz
+            cpu = time.process_time()
+            time.sleep(2)
+            cpu = (time.process_time() - cpu) / 2
+        arrival = [[at for at, command in received[baseline[sn]:] if command.split()[0] in ("up", "down")]
+                   for sn, received in fleet.stats().items()]
+        skew = [max(column) - min(column) for column in zip(*arrival)]
+        fleet.stop()
+        print(f"swarm - {size:>3} tello  discovery {scan * 1000:8.1f}ms ({len(found)}/{size} found)"
+              f"  idle cpu {cpu / size * 100:6.3f}% per drone")
+        report(f"swarm - {size:>3} tello command rtt", rtt)
+        report(f"swarm - {size:>3} tello sync skew", skew)
+
+
+def bench_retransmit(size: int = 10, loss: float = 0.1, rounds: int = 100, port: int = 28989):
+    """Completion time & datagram sent per command on a lossy link. Query(instant) and motion(sync)."""
+    fleet = sim.Fleet(size, delay={"up": 0.05, "down": 0.05}, loss=loss, status_port=port + 1, video_port=port + 2)
+    fleet.start(process=True)
+    group = list(fleet.sn_map.values())
+    result = {}
+    with contextlib.redirect_stdout(io.StringIO()):  # Task result is printed
+        control = fly.Control(fleet.sn_map, network=fleet.network, cache=None, port=(port, port + 1, port + 2))
+        for name, command, count in (("query", control.ask_battery, rounds), ("motion", None, rounds // 5)):
+            baseline = sum(len(received) for received in fleet.stats().values())
+            elapsed, task_ids = [], []
+            for i in range(count):
+                if command is None:
+                    (control.up if i % 2 == 0 else control.down)(20, group)
+                else:
+                    command(group)
+                start = time.perf_counter()
+                task_ids.append(control.exec(sync=command is None))
+                elapsed.append(time.perf_counter() - start)
+            received = sum(len(received) for received in fleet.stats().values()) - baseline
+            answer = [tello.task_query_result(task_id)["result"]
+                      for tello in control.TelloDB.query_advance_object_list() for task_id in task_ids]
+            result[name] = (elapsed, received / (1 - loss) / len(answer), answer.count("Timeout"), len(answer))
+    fleet.stop()
+    for name, (elapsed, sent, timeout, count) in result.items():
+        report(f"retransmit - {name} {size} tello {loss:.0%} loss", elapsed)
+        print(f"retransmit - {name}  {sent:.2f} datagram per command  {timeout}/{count} timeout")
+    links = [control.TelloDB.info2link(index=index) for index in group]
+    print(f"retransmit - rto {min(link['rto'] for link in links) * 1000:.1f} ~ "
+          f"{max(link['rto'] for link in links) * 1000:.1f}ms"
+          f"  loss estimate {sum(link['loss'] for link in links) / size:.2f}")
+
+
+def bench_rc(size: int = 50, seconds: float = 3, update_rate: float = 200, port: int = 29089):
+    """Tick jitter & delivery of rc stream at 50Hz while a user thread updates setpoint faster than the tick."""
+    fleet = sim.Fleet(size, status_port=port + 1, video_port=port + 2).start(process=True)
+    group = list(fleet.sn_map.values())
+    with contextlib.redirect_stdout(io.StringIO()):  # Task result is printed
+        control = fly.Control(fleet.sn_map, network=fleet.network, cache=None, port=(port, port + 1, port + 2))
+    baseline = {sn: len(received) for sn, received in fleet.stats().items()}
+    stream = control.RCStream
+    start = time.perf_counter()
+    i = 0
+    while time.perf_counter() - start < seconds:
+        control.stream_rc(i % 20, 0, 0, -(i % 20), group)
+        i += 1
+        time.sleep(1 / update_rate)
+    control.stop_rc()
+    elapsed = time.perf_counter() - start
+    time.sleep(0.1)
+    received = [sum(1 for _, command in received[baseline[sn]:] if command.startswith("rc"))
+                for sn, received in fleet.stats().items()]
+    fleet.stop()
+    jitter = stream.query_jitter()
+    print(f"rc - {size} tello  tick p50 {jitter['p50'] * 1000:.3f}ms  p99 {jitter['p99'] * 1000:.3f}ms"
+          f"  max {jitter['max'] * 1000:.3f}ms late  {stream.tick_count / elapsed:.1f} tick/s")
+    print(f"rc - {stream.coalesced_count} setpoint coalesced  {stream.overrun_count} tick overrun"
+          f"  {min(received)} ~ {max(received)} rc received per tello")
+
+
+def bench_show(size: int = 20, steps: int = 40, port: int = 29189):
+    """Show of sync up / down, step by step exec() vs compiled show. Gap is time between steps beyond the command."""
+    fleet = sim.Fleet(size, delay={"up": 0.02, "down": 0.02}, status_port=port + 1, video_port=port + 2)
+    fleet.start(process=True)
+    group = list(fleet.sn_map.values())
+    script = {"tello": group, "steps": [{"cmd": "up 20" if i % 2 == 0 else "down 20", "sync": True}
+                                        for i in range(steps)]}
+    start = time.perf_counter()
+    compiled = show.compile_show(script)
+    compile_time = time.perf_counter() - start
+    result = {}
+    with contextlib.redirect_stdout(io.StringIO()):  # Task result is printed
+        control = fly.Control(fleet.sn_map, network=fleet.network, cache=None, port=(port, port + 1, port + 2))
+        start = time.perf_counter()
+        for i in range(steps):
+            (control.up if i % 2 == 0 else control.down)(20, group)
+            control.exec(sync=True)
+        result["exec() per step"] = time.perf_counter() - start
+        start = time.perf_counter()
+        compiled.run(control)
+        result["compiled show"] = time.perf_counter() - start
+    fleet.stop()
+    print(f"show - compile {steps} step x {size} tello in {compile_time * 1000:.2f}ms")
+    for name, elapsed in result.items():
+        print(f"show - {name:<16} {elapsed:.3f}s  gap {(elapsed / steps - 0.02) * 1000:6.3f}ms per step")
+
+
+def bench_shard(size: int = 200, tasks: int = 4000, shards: tuple = (1, 2, 4), port: int = 29289):
+    """
+    Query throughput & caller CPU, one Control vs ShardedControl over worker processes, same simulated fleet.
+
+    Fleet sends status at 50Hz so telemetry competes with scheduling like a video-less show of a big fleet.
+    """
+    fleet = sim.Fleet(size, status_rate=50, status_port=port + 1, video_port=port + 2)
+    fleet.start(process=True)
+    group = list(fleet.sn_map.values())
+    result = []
+    for no, count in enumerate(shards):
+        ports = (port + no * 50, port + no * 50 + 1, port + no * 50 + 2)
+        with contextlib.redirect_stdout(io.StringIO()):  # Task result is printed
+            if count == 1:
+                control = fly.Control(fleet.sn_map, network=fleet.network, cache=None, port=ports)
+                control.set_report_port(ports[1], ports[2], group)
+                control.exec()
+            else:
+                control = shard.ShardedControl(fleet.sn_map, shards=count, network=fleet.network, cache=None,
+                                               port=ports)
+            time.sleep(0.5)
+            cpu = time.process_time()
+            start = time.perf_counter()
+            task_ids = []
+            for i in range(tasks):
+                control.ask_battery(group[i % size])
+                task_ids.append(control.exec(blocking=False))
+            future.wait_all(task_ids)
+            elapsed = time.perf_counter() - start
+            cpu = time.process_time() - cpu
+            if count != 1:
+                control.close()
+        result.append((count, elapsed, cpu))
+    fleet.stop()
+    for count, elapsed, cpu in result:
+        name = "single process" if count == 1 else f"{count} worker"
+        print(f"shard - {size} tello {name:<14} {tasks / elapsed:8.0f} task/s  caller cpu {cpu / elapsed:6.1%}")
+
+
+def bench_future(size: int = 20, tasks: int = 1000, port: int = 29389):
+    """Per-tello task one after another: blocking exec, polling task_status, futures with wait_all. CPU of process."""
+    fleet = sim.Fleet(size, delay={"up": 0.02}, status_port=port + 1, video_port=port + 2)
+    fleet.start(process=True)
+    group = list(fleet.sn_map.values())
+    result = {}
+    with contextlib.redirect_stdout(io.StringIO()):  # Task result is printed
+        control = fly.Control(fleet.sn_map, network=fleet.network, cache=None, port=(port, port + 1, port + 2))
+        start, cpu = time.perf_counter(), time.process_time()
+        for i in range(tasks // 10):  # 10x slower, fewer task
+            control.up(20, group[i % size])
+            control.exec()
+        result["blocking exec"] = ((time.perf_counter() - start) * 10, (time.process_time() - cpu) * 10)
+        start, cpu = time.perf_counter(), time.process_time()
+        task_ids = []
+        for i in range(tasks):
+            control.up(20, group[i % size])
+            task_ids.append(control.exec(blocking=False))
+        for task_id in task_ids:
+            while not control.TelloDB.task_status(task_id):
+                time.sleep(0.01)
+        result["poll task_status"] = (time.perf_counter() - start, time.process_time() - cpu)
+        start, cpu = time.perf_counter(), time.process_time()
+        task_futures = []
+        for i in range(tasks):
+            control.up(20, group[i % size])
+            task_futures.append(control.exec(blocking=False))
+        done, _ = future.wait_all(task_futures)
+        result["futures"] = (time.perf_counter() - start, time.process_time() - cpu)
+    fleet.stop()
+    for name, (elapsed, cpu) in result.items():
+        print(f"future - {size} tello {tasks} task {name:<16} {elapsed:7.3f}s  {tasks / elapsed:6.0f} task/s  "
+              f"cpu {cpu:.3f}s")
+
+
+"""
+Status
+"""
+# Recorded from tello EDU (SDK 3.0)
+STATUS_SAMPLES = [
+    "mid:-1;x:-100;y:-100;z:-100;mpry:0,0,0;pitch:0;roll:0;yaw:0;vgx:0;vgy:0;vgz:0;templ:62;temph:64;tof:10;h:0;"
+    "bat:87;baro:182.14;time:0;agx:-1.00;agy:-2.00;agz:-999.00;\r\n",
+    "mid:1;x:12;y:-31;z:98;mpry:1,-2,87;pitch:1;roll:-2;yaw:-3;vgx:0;vgy:-1;vgz:0;templ:71;temph:73;tof:101;h:100;"
+    "bat:64;baro:183.02;time:37;agx:12.00;agy:-20.00;agz:-1001.00;\r\n",
+    "mid:8;x:-4;y:6;z:152;mpry:0,1,-178;pitch:-4;roll:3;yaw:179;vgx:10;vgy:0;vgz:-2;templ:75;temph:77;tof:149;"
+    "h:150;bat:41;baro:183.51;time:122;agx:-61.00;agy:33.00;agz:-990.00;\r\n"
+]
+
+
+def bench_status_parse(count: int = 200000):
+    """Throughput of format_status. New dictionary vs write in place."""
+    samples = STATUS_SAMPLES * (count // len(STATUS_SAMPLES))
+    start = time.perf_counter()
+    for status in samples:
+        tello.format_status(status)
+    elapsed = time.perf_counter() - start
+    print(f"status - format_status(new dict)  {len(samples) / elapsed:12,.0f} packets/s")
+    record = tello.status_template()
+    start = time.perf_counter()
+    for status in samples:
+        tello.format_status(status, record)
+    elapsed = time.perf_counter() - start
+    print(f"status - format_status(in place)  {len(samples) / elapsed:12,.0f} packets/s")
+
+
+def bench_command(count: int = 200000):
+    """Cost of composing a motion command, f-string + validate + encode per call vs cached Command."""
+    moves = [(x, y, 80, 50) for x in (-100, 100) for y in (-60, 0, 60)]
+    start = time.perf_counter()
+    for i in range(count):
+        x, y, z, speed = moves[i % len(moves)]
+        command.validate(f"go {x} {y} {z} {speed}").encode("utf-8", errors="ignore")
+    elapsed = time.perf_counter() - start
+    print(f"command - validate + encode  {count / elapsed:12,.0f} cmd/s")
+    start = time.perf_counter()
+    for i in range(count):
+        command.build("go", *moves[i % len(moves)]).payload
+    elapsed = time.perf_counter() - start
+    print(f"command - build(cached)      {count / elapsed:12,.0f} cmd/s  {command.build.cache_info()}")
+
+
+def bench_safety(sizes: tuple = (10, 100, 500), count: int = 2000):
+    """Cost of one safety check over a quiet fleet vs a per-drone loop over info2status, and trip reaction time."""
+    rules = safety.DEFAULT_RULES + (safety.Rule("height", ">", 300, safety.EMERGENCY),
+                                    safety.Rule("pitch", ">", 45, safety.REPORT, absolute=True))
+    for size in sizes:
+        sn_map = {f"SN{i:04d}": i for i in range(1, size + 1)}
+        db = tello.TelloDB(sn_map=sn_map, debug=False, safety_rules=rules)
+        for sn, index in sn_map.items():
+            db.add_tello(f"127.0.{index // 250}.{index % 250 + 2}", sn)
+            db.update_status([STATUS_SAMPLES[index % 3], (f"127.0.{index // 250}.{index % 250 + 2}", 8890)])
+        monitor = db.Safety
+        start = time.perf_counter()
+        for _ in range(count):
+            monitor.check(db.Telemetry)
+        vectorized = (time.perf_counter() - start) / count
+        start = time.perf_counter()
+        for _ in range(count):
+            for index in range(1, size + 1):
+                status = db.info2status(index=index)
+                for rule in rules:
+                    value = status[rule.field]
+                    if value is not None:
+                        value = abs(value) if rule.absolute else value
+                        _ = (value < rule.limit) if rule.op == "<" else (value > rule.limit)
+        loop = (time.perf_counter() - start) / count
+        # Reaction: status that trips -> land datagram returned
+        ip = f"127.0.{size // 250}.{size % 250 + 2}"
+        time.sleep(monitor.interval)
+        start = time.perf_counter()
+        sent = db.update_status([STATUS_SAMPLES[1].replace("bat:64", "bat:5"), (ip, 8890)])
+        reaction = time.perf_counter() - start
+        print(f"safety - {size:>3} tello  check {vectorized * 1e6:8.2f}us"
+              f"  per-drone loop {loop * 1e6:9.2f}us  trip -> {len(sent)} datagram in {reaction * 1e6:.0f}us")
+
+
+def bench_shm(size: int = 100, count: int = 20000, rounds: int = 200):
+    """
+    Cost of publishing status to shared memory per update, and of a consistent fleet snapshot on the reader side.
+    """
+    sn_map = {f"SN{i:04d}": i for i in range(1, size + 1)}
+    for name, publish in (("no publish", None), ("publish", True)):
+        db = tello.TelloDB(sn_map=sn_map, debug=False, publish=publish)
+        for sn, index in sn_map.items():
+            db.add_tello(f"127.0.{index // 250}.{index % 250 + 2}", sn)
+        start = time.perf_counter()
+        for i in range(count):
+            index = i % size + 1
+            db.update_status([STATUS_SAMPLES[i % 3], (f"127.0.{index // 250}.{index % 250 + 2}", 8890)])
+        print(f"shm - update_status {name:<11} {(time.perf_counter() - start) / count * 1e6:6.2f}us")
+    reader = shm.FleetState(db.State.name)
+    for name, call in (("snapshot", reader.snapshot), ("changed", reader.changed),
+                       ("column bat", lambda: reader.column("bat"))):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            call()
+        print(f"shm - reader {name:<11} {size} tello {(time.perf_counter() - start) / rounds * 1e6:8.1f}us")
+    reader.close()
+    db.State.close()
+
+
+"""
+Planner
+"""
+
+
+def naive_conflict(tracks: dict, separation: float):
+    """Pairs closer than separation at any step, every pair compared. Reference for the grid."""
+    index = list(tracks)
+    steps = max(len(points) for points in tracks.values())
+    found = set()
+    for step in range(steps):
+        position = [tracks[i][min(step, len(tracks[i]) - 1)] for i in index]
+        for a in range(len(index)):
+            for b in range(a + 1, len(index)):
+                if math.dist(position[a], position[b]) < separation:
+                    found.add((index[a], index[b]))
+    return found
+
+
+def bench_planner(sizes: tuple = (100, 200, 500), spacing: float = 100, rounds: int = 5):
+    """Precheck of a sync task moving the whole swarm 1m forward on a grid. Grid index vs every pair."""
+    for size in sizes:
+        sn_map = {f"SN{i:04d}": i for i in range(size)}
+        db = tello.TelloDB(sn_map=sn_map, debug=False, planner=planner.Planner(mode=planner.REPORT))
+        items = []
+        for sn, index in sn_map.items():
+            ip = f"127.0.{index // 250}.{index % 250 + 2}"
+            x, y = index % 20 * spacing, index // 20 * spacing
+            db.add_tello(ip, sn)
+            db.update_status([f"mid:1;x:{x};y:{y};z:80;mpry:0,0,0;bat:90;\r\n", (ip, 8890)])
+            items.append((f"go {x + spacing} {y} 80 50 m1", index))
+        # Last one cuts across its neighbour
+        items[-1] = (f"go {(size - 1) % 20 * spacing} {((size - 1) // 20 - 1) * spacing} 80 50 m1", size - 1)
+        plan = db.Planner
+        positions = {index: (index % 20 * spacing, index // 20 * spacing, 80, 0) for index in range(size)}
+        check = [(index, cmd, positions[index]) for cmd, index in items]
+        start = time.perf_counter()
+        for _ in range(rounds):
+            conflict = plan.check(check, positions)
+        grid = (time.perf_counter() - start) / rounds
+        tracks = {index: plan.path(cmd, positions[index]) for index, cmd, _ in check}
+        start = time.perf_counter()
+        reference = naive_conflict(tracks, plan.separation)
+        naive = time.perf_counter() - start
+        # Scheduler: sync task released with precheck
+        start = time.perf_counter()
+        sent = db.task_add(1, items, False, True, False, [])
+        dispatch = time.perf_counter() - start
+        print(f"planner - {size:>3} tello {len(tracks[0]):>2} step  grid {grid * 1000:7.2f}ms  "
+              f"all pairs {naive * 1000:8.2f}ms  conflict {len(conflict)}/{len(reference)}  "
+              f"sync task -> {len(sent)} datagram in {dispatch * 1000:.2f}ms")
+
+
+"""
+Log
+"""
+
+
+def bench_log(count: int = 50000):
+    """Caller side cost of a debug status log. Sync file vs async batch vs async with 1 in 10 sampling."""
+    status = tello.format_status(STATUS_SAMPLES[1])
+    start = time.perf_counter()
+    for i in range(count):
+        _ = f"update_status - Updated status for Tello {i % 50}. - {status}"
+    print(f"log - {'compose message only':<20} caller {(time.perf_counter() - start) / count * 1e6:6.2f}us")
+    setting = dict(quicklog.SETTING)
+    for no, (name, option, every) in enumerate((("sync", {}, 1), ("async", {"async_mode": True}, 1),
+                                                ("async + rotate 1MB", {"async_mode": True, "max_bytes": 1048576}, 1),
+                                                ("async + sample 1/10", {"async_mode": True}, 10))):
+        quicklog.configure(**option)
+        log = quicklog.create_log(f"BenchLog{no}", 10, True)
+        quicklog.set_sampling(log, "update_status", every)
+        start = time.perf_counter()
+        for i in range(count):
+            log.info(f"update_status - Updated status for Tello {i % 50}. - {status}")
+        caller = time.perf_counter() - start
+        quicklog.flush()
+        total = time.perf_counter() - start
+        print(f"log - {name:<20} caller {caller / count * 1e6:6.2f}us per record  drained in {total:.2f}s")
+        quicklog.SETTING.update(setting)
+
+
+"""
+Video
+"""
+
+
+def synthetic_packets(frames: int, size: tuple = (2000, 40000)):
+    """Split fake H.264 frames into tello sized packets."""
+    packets = []
+    for i in range(frames):
+        frame = video.START_CODE + os.urandom(size[0] + (i * 7919) % (size[1] - size[0]))
+        packets.extend(frame[x:x + video.PACKET_SIZE] for x in range(0, len(frame), video.PACKET_SIZE))
+    return packets
+
+
+def bench_video(frames: int = 3000):
+    """Reassembly throughput and memory held after a long feed."""
+    packets = synthetic_packets(300)
+    tracemalloc.start()
+    stream = video.VideoStream()
+    start = time.perf_counter()
+    for _ in range(frames // 300):
+        for packet in packets:
+            stream.feed(packet)
+    elapsed = time.perf_counter() - start
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"video - {stream.frame_count} frames  {stream.byte_count / elapsed / 1e6:9.1f}MB/s"
+          f"  {stream.frame_count / elapsed:9.0f}frames/s  held {held / 1e6:.2f}MB"
+          f"  latest {len(stream.latest())}B")
+
+
+"""
+Recorder
+"""
+
+
+def bench_recorder(size: int = 50, seconds: int = 60):
+    """Record cost per datagram & max speed replay of a synthetic flight. Status 10Hz & video 30fps per tello."""
+    packets = synthetic_packets(30, (2000, 6000))
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "flight.rec")
+        rec = recorder.Recorder(path)
+        sn_map = {f"SN{i:04d}": i for i in range(1, size + 1)}
+        start = time.perf_counter()
+        for sn, index in sn_map.items():
+            rec.write(recorder.SENT, (b"sn?", (f"127.0.0.{index + 1}", 8889)), 0)
+            rec.write(recorder.COMMAND, (sn.encode("utf-8"), (f"127.0.0.{index + 1}", 8889)), 0)
+        for tick in range(seconds * 10):
+            for index in range(1, size + 1):
+                address = (f"127.0.0.{index + 1}", 8889)
+                rec.write(recorder.STATUS, (STATUS_SAMPLES[tick % 3], address), tick / 10)
+                for packet in packets[tick * 3 % len(packets):tick * 3 % len(packets) + 3]:
+                    rec.write(recorder.VIDEO, (packet, address), tick / 10)
+        elapsed = time.perf_counter() - start
+        rec.close()
+        print(f"recorder - write {rec.record_count} record  {elapsed / rec.record_count * 1e6:.2f}us per record"
+              f"  {rec.byte_count / 1e6:.1f}MB for {size} tello {seconds}s")
+        replay = recorder.Replay(path)
+        db = tello.TelloDB(sn_map, debug=False)
+        start = time.perf_counter()
+        count = replay.replay(db, speed=None)
+        elapsed = time.perf_counter() - start
+        print(f"recorder - replay {sum(count.values()) / elapsed:,.0f} record/s  {count}")
+        start = time.perf_counter()
+        found = sum(1 for _ in replay.records(start=seconds - 1, ip="127.0.0.2", channel=(recorder.STATUS,)))
+        print(f"recorder - last 1s of 1 tello status  {found} record  {(time.perf_counter() - start) * 1000:.2f}ms")
+        replay.close()
+
+
+if __name__ == "__main__":
+    bench_recv_latency()
+    bench_send_skew()
+    bench_lookup()
+    bench_scheduler()
+    bench_group()
+    stress_control()
+    bench_swarm()
+    bench_retransmit()
+    bench_rc()
+    bench_show()
+    bench_shard()
+    bench_future()
+    bench_status_parse()
+    bench_command()
+    bench_safety()
+    bench_shm()
+    bench_planner()
+    bench_log()
+    bench_video()
+    bench_recorder()